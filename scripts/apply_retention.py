@@ -0,0 +1,87 @@
+"""
+Script para aplicar la política de retención de lecturas
+
+Agrega en rollups las lecturas que van a vencer y luego borra, en bloques,
+las lecturas originales y los rollups por minuto/hora vencidos. Es la misma
+tarea que ejecuta el servidor con RETENTION_ENABLED=True. Con
+ARCHIVE_ENABLED=True las lecturas se copian al archivo columnar antes de
+borrarlas de la base de datos.
+
+Uso:
+    python scripts/apply_retention.py
+    python scripts/apply_retention.py --raw-days 30 --minute-days 180
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.infrastructure.persistence.database import DatabaseManager
+from src.infrastructure.persistence.retention import RetentionEngine, RetentionPolicy
+from src.shared.config.settings import settings
+
+
+async def apply(args):
+    """Ejecuta la política de retención una vez"""
+    policy = RetentionPolicy(
+        raw_days=args.raw_days,
+        minute_days=args.minute_days,
+        hour_days=args.hour_days,
+    )
+    print("🧹 Aplicando política de retención...")
+    print(
+        f"   Lecturas: {policy.raw_days or '∞'} días, "
+        f"rollups por minuto: {policy.minute_days or '∞'} días, "
+        f"por hora: {policy.hour_days or '∞'} días, diarios: ∞"
+    )
+
+    db_manager = DatabaseManager(
+        settings.DATABASE_URL,
+        partitioned=settings.FLOW_PARTITIONING_ENABLED,
+        partition_months_ahead=settings.FLOW_PARTITION_MONTHS_AHEAD,
+        archive_dir=settings.ARCHIVE_DIR if settings.ARCHIVE_ENABLED else None,
+    )
+
+    try:
+        await db_manager.create_tables()
+        engine = RetentionEngine(db_manager, policy, chunk_size=args.chunk_size)
+        report = await engine.run()
+
+        if report.devices_downsampled:
+            print(f"📊 Rollups recalculados para {report.devices_downsampled} dispositivos")
+        for name in report.partitions_dropped:
+            print(f"  ✓ Partición eliminada: {name}")
+        if report.segments_written:
+            print(
+                f"📦 {report.raw_rows_archived} lecturas archivadas en "
+                f"{report.segments_written} segmentos ({settings.ARCHIVE_DIR})"
+            )
+        print(f"✅ {report.raw_rows_deleted} lecturas eliminadas")
+        for resolution, rows in report.rollup_rows_deleted.items():
+            print(f"✅ {rows} rollups por {resolution} eliminados")
+        print(
+            f"💾 {report.reclaimed_bytes / 1024 / 1024:.1f} MB recuperados "
+            f"({report.duration_seconds:.1f}s)"
+        )
+
+    except Exception as e:
+        print(f"❌ Error aplicando la retención: {e}")
+        raise
+    finally:
+        await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica la política de retención")
+    parser.add_argument("--raw-days", type=int, default=settings.RETENTION_RAW_DAYS)
+    parser.add_argument(
+        "--minute-days", type=int, default=settings.RETENTION_MINUTE_DAYS
+    )
+    parser.add_argument("--hour-days", type=int, default=settings.RETENTION_HOUR_DAYS)
+    parser.add_argument(
+        "--chunk-size", type=int, default=settings.RETENTION_CHUNK_SIZE
+    )
+    asyncio.run(apply(parser.parse_args()))
@@ -0,0 +1,130 @@
+"""
+Benchmark de lecturas columnares para análisis
+
+Compara, sobre un rango con muchas lecturas, el camino por entidades
+(`get_by_date_range` + DataFrame desde una lista de dicts) con el
+columnar (`get_columns_by_date_range` + `to_dataframe`, sin copias):
+tiempo hasta tener el DataFrame y pico de memoria. Usa una base de datos
+SQLite temporal.
+
+Uso:
+    python scripts/benchmark_columnar_reads.py
+    python scripts/benchmark_columnar_reads.py --rows 200000
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import insert
+from src.infrastructure.persistence.database import DatabaseManager, FlowReadingModel
+from src.infrastructure.persistence.repositories import SQLAlchemyFlowReadingRepository
+
+DEVICE_ID = "bench_001"
+
+
+async def populate(db_manager: DatabaseManager, count: int, start: datetime):
+    """Inserta lecturas sintéticas directamente en la tabla"""
+    table = FlowReadingModel.__table__
+    chunk = 50000
+    for offset in range(0, count, chunk):
+        rows = [
+            {
+                "device_id": DEVICE_ID,
+                "flow_rate": 10.0 + (i % 50) / 10,
+                "total_volume": i * 0.2,
+                "timestamp": start + timedelta(seconds=i),
+                "pulse_count": i,
+                "unit": "L/min",
+            }
+            for i in range(offset, min(offset + chunk, count))
+        ]
+        async with db_manager.engine.begin() as conn:
+            await conn.execute(insert(table), rows)
+
+
+async def entities_dataframe(repo, start: datetime, end: datetime) -> pd.DataFrame:
+    """Camino anterior: entidades y DataFrame desde dicts"""
+    readings = await repo.get_by_date_range(DEVICE_ID, start, end)
+    return pd.DataFrame(
+        [
+            {
+                "id": r.id,
+                "flow_rate": r.flow_rate,
+                "timestamp": r.timestamp,
+                "total_volume": r.total_volume,
+            }
+            for r in readings
+        ]
+    )
+
+
+async def columnar_dataframe(repo, start: datetime, end: datetime) -> pd.DataFrame:
+    """Camino columnar: arrays NumPy y DataFrame sin copias"""
+    columns = await repo.get_columns_by_date_range(DEVICE_ID, start, end)
+    return columns.to_dataframe()
+
+
+async def measure(name: str, load, repo, start: datetime, end: datetime) -> dict:
+    """Mide el tiempo y, en una segunda pasada, el pico de memoria"""
+    started = time.perf_counter()
+    df = await load(repo, start, end)
+    elapsed = time.perf_counter() - started
+    stats = (len(df), round(df["flow_rate"].mean(), 6), round(df["flow_rate"].std(), 6))
+    del df
+
+    tracemalloc.start()
+    df = await load(repo, start, end)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    del df
+
+    print(f"  {name:<10} {elapsed:>7.2f} s   pico de memoria: {peak:>8.1f} MB")
+    return {"seconds": elapsed, "peak_mb": peak, "stats": stats}
+
+
+async def main(args):
+    """Ejecuta el benchmark con ambos caminos"""
+    print("=" * 60)
+    print("Benchmark de lecturas columnares")
+    print("=" * 60)
+    print(f"📊 {args.rows:,} lecturas de un dispositivo")
+
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(seconds=args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        try:
+            await db_manager.create_tables()
+            await populate(db_manager, args.rows, start)
+            repo = SQLAlchemyFlowReadingRepository(db_manager)
+
+            entities = await measure("entidades", entities_dataframe, repo, start, end)
+            columnar = await measure("columnar", columnar_dataframe, repo, start, end)
+        finally:
+            await db_manager.dispose()
+
+    if entities["stats"] != columnar["stats"]:
+        print(f"❌ Resultados distintos: {entities['stats']} != {columnar['stats']}")
+        return
+
+    print("-" * 60)
+    print(
+        f"🚀 Mejora: tiempo x{entities['seconds'] / columnar['seconds']:.1f}, "
+        f"memoria x{entities['peak_mb'] / columnar['peak_mb']:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de lecturas columnares")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""
+Benchmark de ingesta con shards y escritura diferida
+
+Envía lecturas durables de muchos dispositivos a la vez (cada dispositivo
+espera la respuesta de su lectura anterior) a través del
+IngestionDispatcher con el write-behind activo. Compara el comportamiento
+anterior, en el que el shard esperaba el commit de cada lectura, con el
+actual, en el que el shard se libera al encolarla. Usa bases de datos
+SQLite temporales.
+
+Uso:
+    python scripts/benchmark_ingestion.py
+    python scripts/benchmark_ingestion.py --devices 500 --readings 20
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select
+from src.application.dto.flow_reading_dto import CreateFlowReadingDTO
+from src.application.use_cases.record_flow_reading import RecordFlowReadingUseCase
+from src.infrastructure.ingestion.dispatcher import IngestionDispatcher
+from src.infrastructure.persistence.database import DatabaseManager, FlowReadingModel
+from src.infrastructure.persistence.repositories import SQLAlchemyFlowReadingRepository
+
+
+class ShardWaitsForCommit(IngestionDispatcher):
+    """Comportamiento anterior: el shard espera el commit de cada lectura"""
+
+    async def execute(self, dto: CreateFlowReadingDTO, durable: bool = True):
+        return await self._submit(
+            self.record_flow_reading_use_case.execute,
+            (dto, durable),
+            [self.shard_for(dto.device_id)],
+        )
+
+
+async def device(dispatcher, device_id: str, count: int, start: datetime, latencies):
+    """Un dispositivo: envía sus lecturas de a una, esperando cada respuesta"""
+    for i in range(count):
+        dto = CreateFlowReadingDTO(
+            device_id=device_id,
+            flow_rate=10.0 + i % 5,
+            pulse_count=(i + 1) * 15,
+            timestamp=(start + timedelta(seconds=i)).isoformat(),
+        )
+        started = time.perf_counter()
+        await dispatcher.execute(dto)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run(name: str, dispatcher_class, args) -> dict:
+    """Mide el throughput y la latencia con un tipo de despachador"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        try:
+            await db_manager.create_tables()
+            repo = SQLAlchemyFlowReadingRepository(db_manager)
+            buffer = repo.enable_write_behind()
+            dispatcher = dispatcher_class(
+                RecordFlowReadingUseCase(repo), num_shards=args.shards
+            )
+            await buffer.start()
+            await dispatcher.start()
+
+            latencies = []
+            start = datetime(2024, 1, 1)
+            started = time.perf_counter()
+            devices = [f"bench_{d:04d}" for d in range(args.devices)]
+            await asyncio.gather(
+                *[
+                    device(dispatcher, device_id, args.readings, start, latencies)
+                    for device_id in devices
+                ]
+            )
+            elapsed = time.perf_counter() - started
+
+            await dispatcher.stop()
+            await buffer.stop()
+            flushes = buffer.get_metrics()["flush_size"]
+
+            async with db_manager.engine.connect() as conn:
+                rows, volume = (
+                    await conn.execute(
+                        select(func.count(), func.sum(FlowReadingModel.total_volume))
+                    )
+                ).one()
+        finally:
+            await db_manager.dispose()
+
+    latencies.sort()
+    result = {
+        "rate": rows / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "check": (rows, round(volume, 6)),
+    }
+    print(
+        f"  {name:<10} {result['rate']:>9,.0f} filas/s  "
+        f"p50: {result['p50']:>7.1f} ms  p99: {result['p99']:>7.1f} ms  "
+        f"filas por grupo: {flushes['avg']:.1f}"
+    )
+    return result
+
+
+async def main(args):
+    """Ejecuta el benchmark con ambos despachadores"""
+    print("=" * 60)
+    print("Benchmark de ingesta (shards + write-behind)")
+    print("=" * 60)
+    print(
+        f"📊 {args.devices} dispositivos x {args.readings} lecturas, "
+        f"{args.shards} shards"
+    )
+
+    previous = await run("anterior", ShardWaitsForCommit, args)
+    current = await run("actual", IngestionDispatcher, args)
+
+    if previous["check"] != current["check"]:
+        print(f"❌ Resultados distintos: {previous['check']} != {current['check']}")
+        return
+
+    print("-" * 60)
+    print(
+        f"🚀 Mejora: throughput x{current['rate'] / previous['rate']:.1f}, "
+        f"p99 x{previous['p99'] / current['p99']:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=10)
+    parser.add_argument("--shards", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""
+Benchmark del perfil de producción de SQLite
+
+Compara el throughput de inserción de lecturas con la configuración por
+defecto de SQLite y con el perfil de SQLITE_* (WAL, synchronous=NORMAL,
+mmap, caché, temp_store en memoria). Usa bases de datos temporales.
+
+Uso:
+    python scripts/benchmark_sqlite_tuning.py
+    python scripts/benchmark_sqlite_tuning.py --rows 100000 --batch-size 1000
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.domain.entities.flow_reading import FlowReading
+from src.infrastructure.persistence.database import DatabaseManager
+from src.infrastructure.persistence.repositories import SQLAlchemyFlowReadingRepository
+from src.infrastructure.persistence.sqlite_tuning import SQLitePragmas
+from src.shared.config.settings import settings
+
+
+def make_readings(count: int, device_id: str = "bench_001"):
+    """Genera lecturas sintéticas de un dispositivo"""
+    start = datetime.now() - timedelta(seconds=count)
+    return [
+        FlowReading(
+            id=None,
+            device_id=device_id,
+            flow_rate=10.0 + (i % 50) / 10,
+            total_volume=i * 0.2,
+            timestamp=start + timedelta(seconds=i),
+            pulse_count=i,
+            unit="L/min",
+        )
+        for i in range(count)
+    ]
+
+
+async def run_profile(name: str, pragmas, args) -> dict:
+    """Mide inserciones individuales y por lotes con un perfil"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(
+            f"sqlite+aiosqlite:///{tmp}/bench.db", sqlite_pragmas=pragmas
+        )
+        try:
+            await db_manager.create_tables()
+            repo = SQLAlchemyFlowReadingRepository(db_manager)
+
+            # Una transacción por lectura: mide el costo de cada commit
+            single = make_readings(args.single_rows, "bench_single")
+            started = time.perf_counter()
+            for reading in single:
+                await repo.save(reading)
+            single_rate = len(single) / (time.perf_counter() - started)
+
+            # Lotes con save_many (ingesta con write-behind o carga masiva)
+            batched = make_readings(args.rows, "bench_batch")
+            started = time.perf_counter()
+            for offset in range(0, len(batched), args.batch_size):
+                await repo.save_many(batched[offset : offset + args.batch_size])
+            batch_rate = len(batched) / (time.perf_counter() - started)
+
+            async with db_manager.engine.connect() as conn:
+                journal = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+                synchronous = (await conn.exec_driver_sql("PRAGMA synchronous")).scalar()
+        finally:
+            await db_manager.engine.dispose()
+
+    print(
+        f"  {name:<9} journal={journal:<7} synchronous={synchronous}  "
+        f"individual: {single_rate:>9,.0f} filas/s  "
+        f"lotes: {batch_rate:>9,.0f} filas/s"
+    )
+    return {"single": single_rate, "batch": batch_rate}
+
+
+async def main(args):
+    """Ejecuta el benchmark con ambos perfiles"""
+    print("=" * 60)
+    print("Benchmark de inserción en SQLite")
+    print("=" * 60)
+    print(
+        f"📊 {args.single_rows} inserciones individuales, "
+        f"{args.rows} en lotes de {args.batch_size}"
+    )
+
+    tuned = SQLitePragmas(
+        journal_mode=settings.SQLITE_JOURNAL_MODE,
+        synchronous=settings.SQLITE_SYNCHRONOUS,
+        mmap_size=settings.SQLITE_MMAP_SIZE,
+        cache_size_kb=settings.SQLITE_CACHE_SIZE_KB,
+        temp_store=settings.SQLITE_TEMP_STORE,
+        busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+    )
+    default = await run_profile("default", None, args)
+    optimized = await run_profile("tuned", tuned, args)
+
+    print("-" * 60)
+    print(
+        f"🚀 Mejora: individual x{optimized['single'] / default['single']:.1f}, "
+        f"lotes x{optimized['batch'] / default['batch']:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de PRAGMAs de SQLite")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--single-rows", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
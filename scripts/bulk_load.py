@@ -0,0 +1,520 @@
+"""
+Carga masiva de lecturas de flujo y llenados históricos (CSV o Parquet)
+
+Pensado para cargar meses o años de datos sin pasar por el repositorio
+fila a fila:
+
+- PostgreSQL: COPY binario con asyncpg (`copy_records_to_table`) hacia una
+  tabla temporal y luego INSERT ... SELECT a la tabla final.
+- SQLite: `executemany` por bloques, un bloque por transacción.
+
+El avance se guarda en `<archivo>.progress` tras cada bloque confirmado, de
+modo que si la carga falla basta con volver a ejecutar el mismo comando para
+continuar donde quedó. Las lecturas ya existentes se omiten (clave
+device_id, timestamp, pulse_count). Con FLOW_PARTITIONING_ENABLED las
+lecturas se guardan en la partición mensual que les corresponde. Al
+terminar se recalculan los rollups (minuto/hora/día) de los días cargados.
+
+Uso:
+    python scripts/bulk_load.py --readings lecturas.csv
+    python scripts/bulk_load.py --fillings llenados.parquet --chunk-size 50000
+
+Columnas de lecturas: device_id, timestamp, flow_rate y opcionalmente
+total_volume, pulse_count, unit, temperature, pressure. Si falta
+total_volume se calcula desde pulse_count en el orden del archivo, igual que
+en la ingesta en vivo.
+
+Columnas de llenados: device_id, start_time, initial_volume, target_volume,
+status y opcionalmente end_time, final_volume, duration_seconds,
+avg_flow_rate.
+
+Parquet requiere pyarrow (pip install pyarrow).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.domain.entities.filling import FillingStatus
+from src.application.use_cases.record_flow_reading import PULSES_PER_LITER
+from src.infrastructure.persistence.database import (
+    DatabaseManager,
+    FlowReadingModel,
+    FillingModel,
+)
+from src.infrastructure.persistence.partitions import month_key
+from src.infrastructure.persistence.sqlite_tuning import SQLitePragmas
+from src.shared.config.settings import settings
+
+READING_COLUMNS = [
+    "device_id",
+    "flow_rate",
+    "total_volume",
+    "timestamp",
+    "pulse_count",
+    "unit",
+    "temperature",
+    "pressure",
+]
+FILLING_COLUMNS = [
+    "device_id",
+    "start_time",
+    "end_time",
+    "initial_volume",
+    "final_volume",
+    "target_volume",
+    "status",
+    "duration_seconds",
+    "avg_flow_rate",
+]
+READING_KEY = ["device_id", "timestamp", "pulse_count"]
+MAX_REPORTED_ERRORS = 10
+
+
+# ============================================
+# Lectura de archivos
+# ============================================
+
+
+def iter_records(path: Path, skip: int) -> Iterator[Dict[str, Any]]:
+    """Itera los registros de un CSV o Parquet omitiendo los primeros `skip`"""
+    if path.suffix.lower() == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit(
+                "❌ Para leer Parquet instala pyarrow: pip install pyarrow"
+            )
+
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=10000):
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            records = batch.to_pylist()
+            yield from records[skip:]
+            skip = 0
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for index, record in enumerate(csv.DictReader(f)):
+            if index >= skip:
+                yield record
+
+
+def _value(record: Dict[str, Any], key: str) -> Any:
+    """Obtiene un campo, tratando las celdas vacías como ausentes"""
+    value = record.get(key)
+    if value == "":
+        return None
+    return value
+
+
+def _float(
+    record: Dict[str, Any], key: str, required: bool = False
+) -> Optional[float]:
+    value = _value(record, key)
+    if value is None:
+        if required:
+            raise ValueError(f"Falta el campo {key}")
+        return None
+    return float(value)
+
+
+def _int(record: Dict[str, Any], key: str) -> Optional[int]:
+    value = _value(record, key)
+    return None if value is None else int(float(value))
+
+
+def _datetime(record: Dict[str, Any], key: str, required: bool = False):
+    """Parsea un timestamp ISO 8601 (se almacena sin zona horaria)"""
+    value = _value(record, key)
+    if value is None:
+        if required:
+            raise ValueError(f"Falta el campo {key}")
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return value.replace(tzinfo=None)
+
+
+def parse_reading(record: Dict[str, Any], state: Dict[str, List]) -> Dict[str, Any]:
+    """
+    Convierte un registro en una fila de flow_readings
+
+    `state` guarda (pulse_count, total_volume) por dispositivo para calcular
+    el volumen cuando el archivo no lo trae.
+    """
+    device_id = _value(record, "device_id")
+    if not device_id:
+        raise ValueError("Falta el campo device_id")
+
+    flow_rate = _float(record, "flow_rate", required=True)
+    pulse_count = _int(record, "pulse_count")
+    total_volume = _float(record, "total_volume")
+    if flow_rate < 0:
+        raise ValueError("El flujo no puede ser negativo")
+    if pulse_count is not None and pulse_count < 0:
+        raise ValueError("El contador de pulsos no puede ser negativo")
+
+    if total_volume is None and pulse_count is not None:
+        previous = state.get(device_id)
+        if previous and previous[0] is not None:
+            total_volume = previous[1] + (pulse_count - previous[0]) / PULSES_PER_LITER
+        else:
+            total_volume = pulse_count / PULSES_PER_LITER
+    elif total_volume is None:
+        total_volume = 0.0
+    if total_volume < 0:
+        raise ValueError("El volumen total no puede ser negativo")
+    state[device_id] = [pulse_count, total_volume]
+
+    return {
+        "device_id": str(device_id),
+        "flow_rate": flow_rate,
+        "total_volume": total_volume,
+        "timestamp": _datetime(record, "timestamp", required=True),
+        "pulse_count": pulse_count,
+        "unit": _value(record, "unit") or "L/min",
+        "temperature": _float(record, "temperature"),
+        "pressure": _float(record, "pressure"),
+    }
+
+
+def parse_filling(record: Dict[str, Any], state: Dict[str, List]) -> Dict[str, Any]:
+    """Convierte un registro en una fila de fillings"""
+    device_id = _value(record, "device_id")
+    if not device_id:
+        raise ValueError("Falta el campo device_id")
+
+    status = str(_value(record, "status") or "")
+    try:
+        # Se acepta el valor ("completed") o el nombre ("COMPLETED")
+        status = FillingStatus(status.lower())
+    except ValueError:
+        raise ValueError(f"Estado de llenado no válido: {status}")
+
+    return {
+        "device_id": str(device_id),
+        "start_time": _datetime(record, "start_time", required=True),
+        "end_time": _datetime(record, "end_time"),
+        "initial_volume": _float(record, "initial_volume", required=True),
+        "final_volume": _float(record, "final_volume"),
+        "target_volume": _float(record, "target_volume", required=True),
+        "status": status,
+        "duration_seconds": _float(record, "duration_seconds"),
+        "avg_flow_rate": _float(record, "avg_flow_rate"),
+    }
+
+
+# ============================================
+# Escritura por bloques
+# ============================================
+
+
+async def ensure_partitions(db_manager: DatabaseManager, table, rows):
+    """Crea las particiones mensuales que necesita un bloque de lecturas"""
+    partitions = db_manager.partitions
+    if table.name != FlowReadingModel.__tablename__ or not partitions.enabled:
+        return
+    months = partitions.missing(month_key(row["timestamp"]) for row in rows)
+    if months:
+        async with db_manager.engine.begin() as conn:
+            await partitions.ensure(conn, months)
+
+
+async def write_chunk_sqlite(db_manager: DatabaseManager, table, rows) -> int:
+    """Inserta un bloque con executemany en una sola transacción"""
+    is_readings = table.name == FlowReadingModel.__tablename__
+    partitions = db_manager.partitions
+
+    async with db_manager.engine.begin() as conn:
+        if not (is_readings and partitions.routed):
+            statement = sqlite_insert(table)
+            if is_readings:
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=READING_KEY
+                )
+            result = await conn.execute(statement, rows)
+            return result.rowcount
+
+        # Con particionado: IDs de la secuencia común y una tabla por mes
+        first_id = await partitions.allocate_ids(conn, len(rows))
+        rows_by_table = defaultdict(list)
+        for offset, row in enumerate(rows):
+            row_table = partitions.table_for(row["timestamp"])
+            rows_by_table[row_table].append({**row, "id": first_id + offset})
+
+        inserted = 0
+        for month_table, month_rows in rows_by_table.items():
+            statement = sqlite_insert(month_table).on_conflict_do_nothing(
+                index_elements=READING_KEY
+            )
+            result = await conn.execute(statement, month_rows)
+            inserted += result.rowcount
+    return inserted
+
+
+async def write_chunk_postgres(connection, table, columns: List[str], rows) -> int:
+    """Copia un bloque con COPY a una tabla temporal y lo inserta en la final"""
+    stage = f"{table.name}_stage"
+    column_list = ", ".join(columns)
+    records = [
+        tuple(
+            row[column].name if isinstance(row[column], FillingStatus) else row[column]
+            for column in columns
+        )
+        for row in rows
+    ]
+    conflict = ""
+    if table.name == FlowReadingModel.__tablename__:
+        conflict = " ON CONFLICT DO NOTHING"
+
+    async with connection.transaction():
+        await connection.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {stage} AS "
+            f"SELECT {column_list} FROM {table.name} WITH NO DATA"
+        )
+        await connection.copy_records_to_table(stage, records=records, columns=columns)
+        status = await connection.execute(
+            f"INSERT INTO {table.name} ({column_list}) "
+            f"SELECT {column_list} FROM {stage}{conflict}"
+        )
+        await connection.execute(f"TRUNCATE {stage}")
+    # status tiene la forma "INSERT 0 <filas>"
+    return int(status.split()[-1])
+
+
+# ============================================
+# Rollups
+# ============================================
+
+
+def track_rollup_ranges(progress: Dict[str, Any], rows: List[Dict[str, Any]]):
+    """Registra por dispositivo el rango de lecturas cargadas"""
+    ranges = progress.setdefault("rollup_ranges", {})
+    for row in rows:
+        timestamp = row["timestamp"].isoformat()
+        current = ranges.get(row["device_id"])
+        if current is None:
+            ranges[row["device_id"]] = [timestamp, timestamp]
+        else:
+            current[0] = min(current[0], timestamp)
+            current[1] = max(current[1], timestamp)
+
+
+async def rebuild_rollups(db_manager: DatabaseManager, ranges: Dict[str, List[str]]):
+    """Recalcula los rollups de los días con lecturas cargadas"""
+    for device_id, (start, end) in ranges.items():
+        async with db_manager.engine.begin() as conn:
+            await db_manager.rollups.rebuild(
+                conn,
+                device_id,
+                datetime.fromisoformat(start),
+                datetime.fromisoformat(end),
+            )
+    print(f"  ✓ Rollups recalculados para {len(ranges)} dispositivos")
+
+
+# ============================================
+# Progreso
+# ============================================
+
+
+def load_progress(path: Path) -> Dict[str, Any]:
+    """Carga el avance guardado de una carga anterior"""
+    if not path.exists():
+        return {"rows_done": 0, "inserted": 0, "rejected": 0, "state": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_progress(path: Path, progress: Dict[str, Any]):
+    """Guarda el avance de forma atómica"""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    tmp_path.replace(path)
+
+
+# ============================================
+# Carga
+# ============================================
+
+
+async def load_file(
+    db_manager: DatabaseManager,
+    path: Path,
+    table,
+    columns: List[str],
+    parse,
+    chunk_size: int,
+    restart: bool,
+):
+    """Carga un archivo completo por bloques, reanudando si corresponde"""
+    progress_path = path.with_name(path.name + ".progress")
+    if restart and progress_path.exists():
+        progress_path.unlink()
+    progress = load_progress(progress_path)
+
+    print(f"\n📂 {path} → {table.name}")
+    if progress["rows_done"]:
+        print(f"↪️  Reanudando desde la fila {progress['rows_done']}")
+
+    is_postgres = db_manager.engine.dialect.name == "postgresql"
+    is_readings = table.name == FlowReadingModel.__tablename__
+    pg_connection = None
+    sa_connection = None
+    if is_postgres:
+        sa_connection = await db_manager.engine.connect()
+        raw_connection = await sa_connection.get_raw_connection()
+        pg_connection = raw_connection.driver_connection
+
+    started = time.perf_counter()
+    loaded = 0
+    errors = 0
+    rows: List[Dict[str, Any]] = []
+    consumed = 0
+
+    async def flush():
+        nonlocal rows, consumed, loaded
+        if rows:
+            await ensure_partitions(db_manager, table, rows)
+            if is_postgres:
+                inserted = await write_chunk_postgres(
+                    pg_connection, table, columns, rows
+                )
+            else:
+                inserted = await write_chunk_sqlite(db_manager, table, rows)
+            if is_readings:
+                track_rollup_ranges(progress, rows)
+            progress["inserted"] += inserted
+            loaded += len(rows)
+        progress["rows_done"] += consumed
+        save_progress(progress_path, progress)
+
+        elapsed = time.perf_counter() - started
+        rate = loaded / elapsed if elapsed > 0 else 0.0
+        print(
+            f"  ✓ {progress['rows_done']} filas procesadas, "
+            f"{progress['inserted']} insertadas ({rate:,.0f} filas/s)"
+        )
+        rows = []
+        consumed = 0
+
+    try:
+        for record in iter_records(path, progress["rows_done"]):
+            consumed += 1
+            try:
+                rows.append(parse(record, progress["state"]))
+            except (ValueError, TypeError) as e:
+                progress["rejected"] += 1
+                errors += 1
+                if errors <= MAX_REPORTED_ERRORS:
+                    line = progress["rows_done"] + consumed
+                    print(f"  ⚠️  Fila {line} rechazada: {e}")
+            if consumed >= chunk_size:
+                await flush()
+        await flush()
+        # Las filas cargadas por COPY/executemany no pasan por el UPSERT de
+        # la ingesta: los rollups de los días afectados se recalculan aquí
+        if is_readings and progress.get("rollup_ranges"):
+            await rebuild_rollups(db_manager, progress["rollup_ranges"])
+    finally:
+        if sa_connection is not None:
+            await sa_connection.close()
+
+    elapsed = time.perf_counter() - started
+    rate = loaded / elapsed if elapsed > 0 else 0.0
+    print(
+        f"✅ {path.name}: {progress['inserted']} filas insertadas, "
+        f"{progress['rows_done'] - progress['inserted'] - progress['rejected']} "
+        f"duplicadas, {progress['rejected']} rechazadas "
+        f"({elapsed:.1f}s, {rate:,.0f} filas/s)"
+    )
+    progress_path.unlink()
+
+
+async def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Carga masiva de datos históricos")
+    parser.add_argument("--readings", type=Path, help="CSV/Parquet de lecturas")
+    parser.add_argument("--fillings", type=Path, help="CSV/Parquet de llenados")
+    parser.add_argument(
+        "--chunk-size", type=int, default=20000, help="Filas por transacción"
+    )
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignorar el avance guardado y empezar de cero",
+    )
+    args = parser.parse_args()
+
+    if not args.readings and not args.fillings:
+        parser.error("Indica --readings y/o --fillings")
+
+    print("=" * 60)
+    print("Carga masiva de datos históricos")
+    print("=" * 60)
+
+    db_manager = DatabaseManager(
+        args.database_url,
+        partitioned=settings.FLOW_PARTITIONING_ENABLED,
+        partition_months_ahead=settings.FLOW_PARTITION_MONTHS_AHEAD,
+        archive_dir=settings.ARCHIVE_DIR if settings.ARCHIVE_ENABLED else None,
+        sqlite_pragmas=(
+            SQLitePragmas(
+                journal_mode=settings.SQLITE_JOURNAL_MODE,
+                synchronous=settings.SQLITE_SYNCHRONOUS,
+                mmap_size=settings.SQLITE_MMAP_SIZE,
+                cache_size_kb=settings.SQLITE_CACHE_SIZE_KB,
+                temp_store=settings.SQLITE_TEMP_STORE,
+                busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+            )
+            if settings.SQLITE_TUNING_ENABLED
+            else None
+        ),
+    )
+    try:
+        await db_manager.create_tables(check_rollups=False)
+        if args.readings:
+            await load_file(
+                db_manager,
+                args.readings,
+                FlowReadingModel.__table__,
+                READING_COLUMNS,
+                parse_reading,
+                args.chunk_size,
+                args.restart,
+            )
+        if args.fillings:
+            await load_file(
+                db_manager,
+                args.fillings,
+                FillingModel.__table__,
+                FILLING_COLUMNS,
+                parse_filling,
+                args.chunk_size,
+                args.restart,
+            )
+    except Exception as e:
+        print(f"❌ Error durante la carga: {e}")
+        print("ℹ️  Vuelve a ejecutar el mismo comando para continuar")
+        raise
+    finally:
+        await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
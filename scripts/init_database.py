@@ -107,7 +107,11 @@ async def main():
     print("=" * 60)
 
     # Crear gestor de base de datos
-    db_manager = DatabaseManager(settings.DATABASE_URL)
+    db_manager = DatabaseManager(
+        settings.DATABASE_URL,
+        partitioned=settings.FLOW_PARTITIONING_ENABLED,
+        partition_months_ahead=settings.FLOW_PARTITION_MONTHS_AHEAD,
+    )
 
     # Crear tablas
     print("\nCreando tablas...")
@@ -0,0 +1,67 @@
+"""
+Script de migración para agregar la clave de idempotencia a flow_readings
+
+Crea el índice único (device_id, timestamp, pulse_count) que permite
+descartar lecturas reenviadas por el dispositivo. Antes de crearlo elimina
+los duplicados existentes, conservando la lectura con el ID más bajo.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from src.infrastructure.persistence.database import DatabaseManager
+from src.shared.config.settings import settings
+
+
+async def migrate():
+    """Ejecuta la migración"""
+    print("🔄 Iniciando migración de base de datos...")
+
+    db_manager = DatabaseManager(settings.DATABASE_URL)
+
+    try:
+        async with db_manager.engine.begin() as conn:
+            # La misma sintaxis sirve para SQLite y PostgreSQL
+            print("🧹 Eliminando lecturas duplicadas...")
+            result = await conn.execute(
+                text("""
+                    DELETE FROM flow_readings
+                    WHERE pulse_count IS NOT NULL
+                      AND id NOT IN (
+                        SELECT MIN(id)
+                        FROM flow_readings
+                        WHERE pulse_count IS NOT NULL
+                        GROUP BY device_id, timestamp, pulse_count
+                      )
+                """)
+            )
+            print(f"✅ {result.rowcount} lecturas duplicadas eliminadas")
+            if result.rowcount:
+                print(
+                    "ℹ️  El total_volume de lecturas posteriores no se recalcula"
+                )
+
+            print("➕ Creando índice único uq_flow_readings_device_ts_pulse...")
+            await conn.execute(
+                text("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS uq_flow_readings_device_ts_pulse
+                    ON flow_readings (device_id, timestamp, pulse_count)
+                """)
+            )
+            print("✅ Índice creado")
+
+        print("✅ Migración completada exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+    finally:
+        await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
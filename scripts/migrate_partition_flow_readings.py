@@ -0,0 +1,192 @@
+"""
+Script de migración para particionar flow_readings por mes
+
+Ejecutar una vez, con el servidor detenido, antes de activar
+FLOW_PARTITIONING_ENABLED sobre una base de datos existente.
+
+- PostgreSQL: renombra la tabla actual a flow_readings_legacy, crea
+  flow_readings como tabla particionada (RANGE por timestamp), crea las
+  particiones mensuales necesarias y copia las lecturas conservando sus IDs.
+  La tabla legacy se conserva para verificar la copia.
+- SQLite: mueve las lecturas de flow_readings a las tablas mensuales
+  flow_readings_pAAAAMM conservando sus IDs y deja flow_readings vacía
+  (el servidor no inicia con el particionado activo si quedan lecturas).
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import delete, func, insert, select, text
+from src.infrastructure.persistence.database import Base, DatabaseManager
+from src.infrastructure.persistence.partitions import (
+    month_start,
+    months_between,
+    next_month,
+)
+from src.shared.config.settings import settings
+
+COLUMNS = (
+    "id, device_id, flow_rate, total_volume, timestamp, pulse_count, "
+    "unit, temperature, pressure"
+)
+
+
+async def migrate_postgres(db_manager: DatabaseManager):
+    """Convierte flow_readings en una tabla particionada nativa"""
+    partitions = db_manager.partitions
+
+    async with db_manager.engine.begin() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT c.relkind FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relname = 'flow_readings' "
+                "AND n.nspname = current_schema()"
+            )
+        )
+        if result.scalar_one_or_none() != "r":
+            print("ℹ️  flow_readings no existe o ya está particionada")
+            return
+
+        print("📦 Renombrando flow_readings a flow_readings_legacy...")
+        await conn.execute(
+            text("ALTER TABLE flow_readings RENAME TO flow_readings_legacy")
+        )
+        await conn.execute(
+            text(
+                "ALTER TABLE flow_readings_legacy "
+                "RENAME CONSTRAINT flow_readings_pkey TO flow_readings_legacy_pkey"
+            )
+        )
+        for index in (
+            "ix_flow_readings_id",
+            "ix_flow_readings_device_id",
+            "ix_flow_readings_timestamp",
+            "uq_flow_readings_device_ts_pulse",
+        ):
+            await conn.execute(
+                text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy")
+            )
+        await conn.execute(
+            text(
+                "ALTER SEQUENCE IF EXISTS flow_readings_id_seq "
+                "RENAME TO flow_readings_legacy_id_seq"
+            )
+        )
+
+        print("➕ Creando flow_readings particionada...")
+        await partitions.create_parent(conn)
+
+        bounds = await conn.execute(
+            text("SELECT MIN(timestamp), MAX(timestamp) FROM flow_readings_legacy")
+        )
+        first, last = bounds.one()
+        if first is not None:
+            await partitions.ensure(conn, months_between(first, last))
+
+        print("🔄 Copiando lecturas...")
+        result = await conn.execute(
+            text(
+                f"INSERT INTO flow_readings ({COLUMNS}) "
+                f"SELECT {COLUMNS} FROM flow_readings_legacy"
+            )
+        )
+        print(f"✅ {result.rowcount} lecturas copiadas")
+
+        # La nueva secuencia continúa después del mayor ID copiado
+        await conn.execute(
+            text(
+                "SELECT setval(pg_get_serial_sequence('flow_readings', 'id'), "
+                "COALESCE((SELECT MAX(id) FROM flow_readings), 0) + 1, false)"
+            )
+        )
+
+    # Particiones de los próximos meses
+    await db_manager.create_tables(check_rollups=False)
+    print(
+        "ℹ️  Verifique los datos y luego elimine la tabla anterior con: "
+        "DROP TABLE flow_readings_legacy"
+    )
+
+
+async def migrate_sqlite(db_manager: DatabaseManager):
+    """Mueve las lecturas de flow_readings a las tablas mensuales"""
+    partitions = db_manager.partitions
+    legacy = partitions.base_table
+
+    async with db_manager.engine.begin() as conn:
+        # Crea las tablas mensuales próximas y la secuencia de IDs
+        # (create_tables exige que flow_readings ya esté vacía)
+        await conn.run_sync(Base.metadata.create_all)
+        await partitions.prepare(conn)
+
+        bounds = await conn.execute(
+            select(func.min(legacy.c.timestamp), func.max(legacy.c.timestamp))
+        )
+        first, last = bounds.one()
+        if first is None:
+            print("ℹ️  flow_readings no tiene lecturas para mover")
+            return
+
+        months = months_between(first, last)
+        await partitions.ensure(conn, months)
+
+        moved = 0
+        for key in months:
+            start, end = month_start(key), month_start(next_month(key))
+            month_table = partitions.table_for(start)
+            in_month = (legacy.c.timestamp >= start) & (legacy.c.timestamp < end)
+            result = await conn.execute(
+                insert(month_table)
+                .from_select(
+                    [c.name for c in legacy.columns],
+                    select(*legacy.columns).where(in_month),
+                )
+                .prefix_with("OR IGNORE")
+            )
+            await conn.execute(delete(legacy).where(in_month))
+            moved += result.rowcount
+            print(f"  ✓ {month_table.name}: {result.rowcount} lecturas")
+        print(f"✅ {moved} lecturas movidas a particiones mensuales")
+
+        # La secuencia continúa después del mayor ID movido
+        for table in partitions.all_tables():
+            result = await conn.execute(select(func.max(table.c.id)))
+            value = result.scalar() or 0
+            await conn.execute(
+                partitions.id_sequence.update()
+                .where(partitions.id_sequence.c.next_id <= value)
+                .values(next_id=value + 1)
+            )
+
+
+async def migrate():
+    """Ejecuta la migración"""
+    print("🔄 Iniciando migración de base de datos...")
+
+    db_manager = DatabaseManager(
+        settings.DATABASE_URL,
+        partitioned=True,
+        partition_months_ahead=settings.FLOW_PARTITION_MONTHS_AHEAD,
+    )
+
+    try:
+        if db_manager.engine.dialect.name == "postgresql":
+            await migrate_postgres(db_manager)
+        else:
+            await migrate_sqlite(db_manager)
+        print("✅ Migración completada exitosamente")
+        print("ℹ️  Active FLOW_PARTITIONING_ENABLED=True en la configuración")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+    finally:
+        await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,85 @@
+"""
+Script para recalcular los rollups de lecturas (flow_rollups)
+
+Ejecutar una vez tras actualizar una base de datos con lecturas anteriores
+a los rollups, o cuando se modifiquen lecturas por fuera de la API. Las
+lecturas nuevas actualizan sus rollups al insertarse.
+
+Uso:
+    python scripts/rebuild_flow_rollups.py
+    python scripts/rebuild_flow_rollups.py --device-id flowsensor_001
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select
+from src.infrastructure.persistence.database import DatabaseManager
+from src.shared.config.settings import settings
+
+
+async def rebuild(device_id: str = None):
+    """Recalcula los rollups de todos los dispositivos (o de uno)"""
+    print("🔄 Recalculando rollups de lecturas...")
+
+    db_manager = DatabaseManager(
+        settings.DATABASE_URL,
+        partitioned=settings.FLOW_PARTITIONING_ENABLED,
+        partition_months_ahead=settings.FLOW_PARTITION_MONTHS_AHEAD,
+        archive_dir=settings.ARCHIVE_DIR if settings.ARCHIVE_ENABLED else None,
+    )
+
+    try:
+        await db_manager.create_tables(check_rollups=False)
+        partitions = db_manager.partitions
+
+        # Rango de lecturas por dispositivo en todas las particiones
+        ranges = {}
+        async with db_manager.engine.connect() as conn:
+            await partitions.refresh(conn)
+            for table in partitions.all_tables():
+                query = select(
+                    table.c.device_id,
+                    func.min(table.c.timestamp),
+                    func.max(table.c.timestamp),
+                ).group_by(table.c.device_id)
+                if device_id:
+                    query = query.where(table.c.device_id == device_id)
+                for device, first, last in await conn.execute(query):
+                    if device in ranges:
+                        first = min(first, ranges[device][0])
+                        last = max(last, ranges[device][1])
+                    ranges[device] = (first, last)
+
+        if not ranges:
+            print("ℹ️  No hay lecturas para procesar")
+            return
+
+        started = time.perf_counter()
+        total = 0
+        for device, (first, last) in sorted(ranges.items()):
+            async with db_manager.engine.begin() as conn:
+                processed = await db_manager.rollups.rebuild(conn, device, first, last)
+            total += processed
+            print(f"  ✓ {device}: {processed} lecturas ({first:%Y-%m-%d} → {last:%Y-%m-%d})")
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ Rollups recalculados: {total} lecturas en {elapsed:.1f}s")
+
+    except Exception as e:
+        print(f"❌ Error recalculando rollups: {e}")
+        raise
+    finally:
+        await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula los rollups de lecturas")
+    parser.add_argument("--device-id", help="Solo este dispositivo")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.device_id))
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 
 
 @dataclass
@@ -14,14 +14,15 @@ class CreateFlowReadingDTO:
     unit: Optional[str] = None  # Unidad de medida (ej: "L/min")
     temperature: Optional[float] = None
     pressure: Optional[float] = None
-    timestamp: Optional[str] = None  # Timestamp ISO 8601 del dispositivo
+    # Timestamp ISO 8601 del dispositivo (o datetime ya decodificado)
+    timestamp: Optional[Union[str, datetime]] = None
 
 
 @dataclass
 class FlowReadingResponseDTO:
     """DTO de respuesta de lectura de flujo"""
 
-    id: int
+    id: Optional[int]  # None si la lectura fue aceptada pero aún no persistida
     device_id: str
     flow_rate: float
     total_volume: float
@@ -30,9 +31,10 @@ class FlowReadingResponseDTO:
     unit: Optional[str] = None
     temperature: Optional[float] = None
     pressure: Optional[float] = None
+    duplicate: bool = False  # True si la lectura ya se había registrado
 
     @staticmethod
-    def from_entity(entity):
+    def from_entity(entity, duplicate: bool = False):
         """Crea un DTO desde la entidad"""
         return FlowReadingResponseDTO(
             id=entity.id,
@@ -44,4 +46,5 @@ class FlowReadingResponseDTO:
             unit=entity.unit,
             temperature=entity.temperature,
             pressure=entity.pressure,
+            duplicate=duplicate,
         )
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Tuple
+
+# (tipo de agregado, device_id, inicio del día)
+DailyKey = Tuple[str, str, datetime]
+
+
+class DailyAggregateCache:
+    """
+    Caché LRU de agregados parciales por dispositivo y día
+
+    Guarda agregados combinables (FlowAggregate, FillingAggregate) de días
+    completos, para responder rangos largos combinando días en memoria y
+    consultando solo los extremos incompletos. Solo se guardan días
+    cerrados; los repositorios invalidan el día de cada escritura y
+    `ttl_seconds` acota lo desactualizado que puede quedar un día escrito
+    por otro proceso.
+    """
+
+    def __init__(self, max_entries: int = 100000, ttl_seconds: float = 300):
+        if max_entries <= 0:
+            raise ValueError("max_entries debe ser mayor que 0")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[DailyKey, Tuple[float, Any]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_many(
+        self, kind: str, device_id: str, days: Iterable[datetime]
+    ) -> Dict[datetime, Any]:
+        """Obtiene los agregados en caché de los días indicados"""
+        now = time.monotonic()
+        found = {}
+        for day in days:
+            key = (kind, device_id, day)
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                self._misses += 1
+                continue
+            self._hits += 1
+            self._entries.move_to_end(key)
+            found[day] = entry[1]
+        return found
+
+    def put(self, kind: str, device_id: str, day: datetime, aggregate: Any):
+        """Guarda el agregado de un día"""
+        key = (kind, device_id, day)
+        self._entries[key] = (time.monotonic(), aggregate)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, kind: str, device_id: str, day: datetime):
+        """Descarta el agregado de un dispositivo en un día"""
+        if self._entries.pop((kind, device_id, day), None) is not None:
+            self._invalidations += 1
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de la caché"""
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# Clave de idempotencia de una lectura: (timestamp del dispositivo, pulse_count)
+ReadingKey = Tuple[datetime, int]
+
+
+@dataclass
+class DeviceState:
+    """Estado de la última lectura registrada de un dispositivo"""
+
+    pulse_count: Optional[int]
+    total_volume: float
+    # Ventana de claves recientes -> (id, total_volume) de la lectura original
+    recent_keys: "OrderedDict[ReadingKey, Tuple[Optional[int], float]]" = field(
+        default_factory=OrderedDict
+    )
+
+    def lookup(self, key: ReadingKey) -> Optional[Tuple[Optional[int], float]]:
+        """Busca una clave en la ventana de lecturas recientes"""
+        return self.recent_keys.get(key)
+
+    def remember(
+        self,
+        key: ReadingKey,
+        reading_id: Optional[int],
+        total_volume: float,
+        max_keys: int,
+    ):
+        """Agrega una clave a la ventana, descartando la más antigua"""
+        self.recent_keys[key] = (reading_id, total_volume)
+        while len(self.recent_keys) > max_keys:
+            self.recent_keys.popitem(last=False)
+
+
+class DeviceStateCache:
+    """
+    Caché LRU del estado por dispositivo para el cálculo de volumen
+
+    Se hidrata de forma perezosa desde la base de datos y se actualiza tras
+    cada guardado exitoso, de modo que la ingesta en régimen estable no
+    necesita consultar la última lectura. Al superar `max_devices` se
+    descarta el dispositivo usado hace más tiempo.
+
+    Cada estado guarda además las últimas `recent_keys_per_device` claves de
+    idempotencia, para descartar reintentos sin tocar la base de datos.
+    """
+
+    def __init__(self, max_devices: int = 50000, recent_keys_per_device: int = 16):
+        if max_devices <= 0:
+            raise ValueError("max_devices debe ser mayor que 0")
+        self.max_devices = max_devices
+        self.recent_keys_per_device = recent_keys_per_device
+        self._states: "OrderedDict[str, DeviceState]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, device_id: str) -> Optional[DeviceState]:
+        """Obtiene el estado de un dispositivo (None si no está en caché)"""
+        state = self._states.get(device_id)
+        if state is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._states.move_to_end(device_id)
+        return state
+
+    def put(self, device_id: str, state: DeviceState):
+        """Guarda el estado de un dispositivo"""
+        self._states[device_id] = state
+        self._states.move_to_end(device_id)
+
+        while len(self._states) > self.max_devices:
+            self._states.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, device_id: str):
+        """Descarta el estado de un dispositivo"""
+        self._states.pop(device_id, None)
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de la caché"""
+        lookups = self._hits + self._misses
+        return {
+            "devices": len(self._states),
+            "max_devices": self.max_devices,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,294 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from src.domain.services.metrics_service import MetricsService
+from src.domain.value_objects.metrics import (
+    BusinessMetrics,
+    FillingMetrics,
+    FlowMetrics,
+)
+
+# (operación, device_id, inicio, fin, parámetros)
+ResultKey = Tuple[str, str, Optional[datetime], Optional[datetime], Tuple]
+
+ONE_DAY = timedelta(days=1)
+
+# Qué escrituras invalidan cada operación: lecturas ("flow") o llenados ("filling")
+DEPENDENCIES = {
+    "flow_metrics": {"flow"},
+    "filling_metrics": {"filling"},
+    "business_metrics": {"filling"},
+    "efficiency_report": {"flow", "filling"},
+    "anomalies": {"flow"},
+}
+
+
+class _Entry:
+    """Resultado en caché de una operación"""
+
+    __slots__ = ("stored_at", "value", "cost")
+
+    def __init__(self, stored_at: float, value: Any, cost: float):
+        self.stored_at = stored_at
+        self.value = value
+        self.cost = cost  # segundos que tomó calcularlo
+
+
+class CachedMetricsService(MetricsService):
+    """
+    Caché de resultados de otro MetricsService
+
+    Los dashboards repiten las mismas consultas cada pocos segundos: el
+    resultado se guarda por (operación, dispositivo, rango, parámetros) con
+    TTL y desalojo LRU. Las escrituras invalidan solo las entradas del
+    dispositivo cuyo rango incluye el día escrito, y peticiones idénticas
+    simultáneas comparten un único cálculo. Un contador de generación por
+    dispositivo y tipo de escritura evita guardar un resultado calculado
+    antes de una invalidación.
+    """
+
+    def __init__(
+        self,
+        metrics_service: MetricsService,
+        max_entries: int = 10000,
+        ttl_seconds: float = 30,
+    ):
+        if max_entries <= 0:
+            raise ValueError("max_entries debe ser mayor que 0")
+        self.metrics_service = metrics_service
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[ResultKey, _Entry]" = OrderedDict()
+        self._in_flight: Dict[ResultKey, asyncio.Future] = {}
+        self._keys_by_device: Dict[str, Set[ResultKey]] = {}
+        # (tipo de escritura, device_id) -> invalidaciones
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._saved_seconds = 0.0
+
+    # ============================================
+    # MetricsService
+    # ============================================
+
+    async def calculate_flow_metrics(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FlowMetrics:
+        """Métricas de flujo, desde la caché si están vigentes"""
+        return await self._get(
+            self._key("flow_metrics", device_id, start_date, end_date),
+            lambda: self.metrics_service.calculate_flow_metrics(
+                device_id, start_date, end_date
+            ),
+        )
+
+    async def calculate_filling_metrics(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FillingMetrics:
+        """Métricas de llenados, desde la caché si están vigentes"""
+        return await self._get(
+            self._key("filling_metrics", device_id, start_date, end_date),
+            lambda: self.metrics_service.calculate_filling_metrics(
+                device_id, start_date, end_date
+            ),
+        )
+
+    async def calculate_business_metrics(
+        self,
+        device_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        price_per_liter: float = 0.0,
+    ) -> BusinessMetrics:
+        """Métricas de negocio, desde la caché si están vigentes"""
+        return await self._get(
+            self._key(
+                "business_metrics", device_id, start_date, end_date, (price_per_liter,)
+            ),
+            lambda: self.metrics_service.calculate_business_metrics(
+                device_id, start_date, end_date, price_per_liter
+            ),
+        )
+
+    async def get_efficiency_report(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> Dict[str, Any]:
+        """Reporte de eficiencia, desde la caché si está vigente"""
+        return await self._get(
+            self._key("efficiency_report", device_id, start_date, end_date),
+            lambda: self.metrics_service.get_efficiency_report(
+                device_id, start_date, end_date
+            ),
+        )
+
+    async def detect_anomalies(
+        self, device_id: str, threshold: float = 100.0
+    ) -> Dict[str, Any]:
+        """Anomalías de las últimas lecturas (cualquier lectura nueva invalida)"""
+        return await self._get(
+            ("anomalies", device_id, None, None, (threshold,)),
+            lambda: self.metrics_service.detect_anomalies(device_id, threshold),
+        )
+
+    # ============================================
+    # Invalidación (listeners de los repositorios)
+    # ============================================
+
+    def invalidate_flow_day(self, device_id: str, day: datetime):
+        """Descarta los resultados que dependen de las lecturas de ese día"""
+        self._invalidate("flow", device_id, day)
+
+    def invalidate_filling_day(self, device_id: str, day: datetime):
+        """Descarta los resultados que dependen de los llenados de ese día"""
+        self._invalidate("filling", device_id, day)
+
+    def _invalidate(self, kind: str, device_id: str, day: datetime):
+        """Descarta las entradas del dispositivo cuyo rango toca [day, day + 1)"""
+        # Los cálculos en curso ya no pueden guardar su resultado
+        generation = (kind, device_id)
+        self._generations[generation] = self._generations.get(generation, 0) + 1
+
+        for key in [k for k in self._in_flight if k[1] == device_id]:
+            if self._affected(key, kind, day):
+                # Las peticiones nuevas no se suman a un cálculo desactualizado
+                del self._in_flight[key]
+
+        for key in list(self._keys_by_device.get(device_id, ())):
+            if self._affected(key, kind, day):
+                self._remove(key)
+                self._invalidations += 1
+
+    @staticmethod
+    def _affected(key: ResultKey, kind: str, day: datetime) -> bool:
+        """Indica si una escritura de `kind` en `day` cambia el resultado"""
+        operation, _, start, end, _ = key
+        if kind not in DEPENDENCIES[operation]:
+            return False
+        if start is None:
+            return True
+        day_start = day.replace(tzinfo=None)
+        return start < day_start + ONE_DAY and end >= day_start
+
+    # ============================================
+    # Caché
+    # ============================================
+
+    @staticmethod
+    def _key(
+        operation: str,
+        device_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        params: Tuple = (),
+    ) -> ResultKey:
+        """
+        Clave de un rango sin zona horaria y truncado al minuto: los
+        dashboards que piden "hasta ahora" comparten la entrada
+        """
+        start = start_date.replace(second=0, microsecond=0, tzinfo=None)
+        end = end_date.replace(second=0, microsecond=0, tzinfo=None)
+        return (operation, device_id, start, end, params)
+
+    async def _get(self, key: ResultKey, compute: Callable[[], Awaitable[Any]]):
+        """Resultado de `key` desde la caché, un cálculo en curso o uno nuevo"""
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry.stored_at <= self.ttl_seconds:
+                    self._hits += 1
+                    self._saved_seconds += entry.cost
+                    self._entries.move_to_end(key)
+                    return entry.value
+                self._remove(key)
+                self._expirations += 1
+
+            future = self._in_flight.get(key)
+            if future is None:
+                return await self._compute(key, compute)
+
+            self._coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Se canceló la petición que calculaba: reintentar
+
+    async def _compute(self, key: ResultKey, compute: Callable[[], Awaitable[Any]]):
+        """Calcula `key` compartiendo el resultado con peticiones idénticas"""
+        generation = self._generation(key)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self._misses += 1
+        started = time.perf_counter()
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita "Future exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+        future.set_result(value)
+        if self._generation(key) == generation:
+            self._put(key, value, time.perf_counter() - started)
+        return value
+
+    def _generation(self, key: ResultKey) -> Tuple[int, ...]:
+        """Generaciones de las escrituras de las que depende `key`"""
+        operation, device_id = key[0], key[1]
+        return tuple(
+            self._generations.get((kind, device_id), 0)
+            for kind in sorted(DEPENDENCIES[operation])
+        )
+
+    def _put(self, key: ResultKey, value: Any, cost: float):
+        """Guarda un resultado, desalojando el menos usado si no hay lugar"""
+        self._entries[key] = _Entry(time.monotonic(), value, cost)
+        self._entries.move_to_end(key)
+        self._keys_by_device.setdefault(key[1], set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def _remove(self, key: ResultKey):
+        """Quita una entrada y su referencia por dispositivo"""
+        self._entries.pop(key, None)
+        keys = self._keys_by_device.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_device[key[1]]
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de la caché"""
+        lookups = self._hits + self._misses + self._coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._in_flight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "invalidations": self._invalidations,
+            "hit_ratio": (
+                round((self._hits + self._coalesced) / lookups, 4) if lookups else 0.0
+            ),
+            "saved_compute_ms": round(self._saved_seconds * 1000, 1),
+        }
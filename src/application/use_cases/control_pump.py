@@ -1,3 +1,6 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Set
 from src.domain.entities.pump import Pump, PumpStatus
 from src.domain.repositories.pump_repository import PumpRepository
 from src.application.dto.pump_dto import (
@@ -6,6 +9,8 @@ from src.application.dto.pump_dto import (
     PumpResponseDTO,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class UpdatePumpLevelUseCase:
     """Caso de uso para actualizar el nivel de la bomba"""
@@ -27,8 +32,17 @@ class UpdatePumpLevelUseCase:
 class ControlPumpUseCase:
     """Caso de uso para controlar la bomba (encender/apagar)"""
 
-    def __init__(self, pump_repository: PumpRepository):
+    def __init__(
+        self,
+        pump_repository: PumpRepository,
+        on_command: Optional[Callable[[PumpResponseDTO], Awaitable]] = None,
+        command_timeout: float = 5.0,
+    ):
         self.pump_repository = pump_repository
+        # Notifica el comando al dispositivo (ej: por su conexión WebSocket)
+        self.on_command = on_command
+        self.command_timeout = command_timeout
+        self._notifications: Set[asyncio.Task] = set()
 
     async def execute(self, dto: PumpControlDTO) -> PumpResponseDTO:
         """Ejecuta el caso de uso"""
@@ -44,7 +58,22 @@ class ControlPumpUseCase:
             raise ValueError(f"Acción no válida: {dto.action}")
 
         updated_pump = await self.pump_repository.update(pump)
-        return PumpResponseDTO.from_entity(updated_pump)
+        response = PumpResponseDTO.from_entity(updated_pump)
+        if self.on_command:
+            # Un dispositivo lento no retrasa la respuesta de la API
+            task = asyncio.create_task(self._notify(response))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+        return response
+
+    async def _notify(self, response: PumpResponseDTO):
+        """Envía el comando al dispositivo con un tiempo máximo"""
+        try:
+            await asyncio.wait_for(self.on_command(response), self.command_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Tiempo agotado enviando comando a %s", response.device_id)
+        except Exception:
+            logger.exception("Error enviando comando a %s", response.device_id)
 
 
 class CheckPumpThresholdUseCase:
@@ -1,56 +1,371 @@
+import asyncio
+from dataclasses import replace
 from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from src.domain.entities.flow_reading import FlowReading
 from src.domain.repositories.flow_reading_repository import FlowReadingRepository
 from src.application.dto.flow_reading_dto import (
     CreateFlowReadingDTO,
     FlowReadingResponseDTO,
 )
+from src.application.services.device_state_cache import (
+    DeviceState,
+    DeviceStateCache,
+    ReadingKey,
+)
+
+# Calibración típica: ~7.5 pulsos por litro (puede variar según sensor)
+PULSES_PER_LITER = 7.5
 
 
 class RecordFlowReadingUseCase:
-    """Caso de uso para registrar una lectura de flujo"""
+    """
+    Caso de uso para registrar una lectura de flujo
 
-    def __init__(self, flow_reading_repository: FlowReadingRepository):
+    La ingesta es idempotente respecto a (device_id, timestamp del
+    dispositivo, pulse_count): los reintentos recientes se detectan en la
+    ventana de claves del estado en caché y el resto los descarta la
+    restricción única de la base de datos, sin consultas adicionales.
+    """
+
+    def __init__(
+        self,
+        flow_reading_repository: FlowReadingRepository,
+        state_cache: Optional[DeviceStateCache] = None,
+        after_rollback: Optional[Callable[[Callable[[], None]], None]] = None,
+    ):
         self.flow_reading_repository = flow_reading_repository
-        self._last_pulse_count = {}  # Mantener registro por device_id
+        # Estado de la última lectura por device_id
+        self.state_cache = state_cache or DeviceStateCache()
+        # Registra un callback para cuando se revierta la transacción en
+        # curso (ej: DatabaseManager.after_rollback)
+        self.after_rollback = after_rollback
+        self._duplicates_skipped = 0  # detectados en la ventana en memoria
+        self._duplicates_dropped = 0  # descartados por la restricción única
 
     async def execute(
+        self, dto: CreateFlowReadingDTO, durable: bool = True
+    ) -> FlowReadingResponseDTO:
+        """
+        Ejecuta el caso de uso
+
+        Con durable=False la lectura puede confirmarse antes de persistirse
+        si el repositorio tiene activa la escritura diferida.
+        """
+        reading, state, key, duplicate = await self._prepare(dto)
+        if duplicate is not None:
+            return duplicate
+
+        saved_reading = await self.flow_reading_repository.save(reading, durable)
+        if durable and saved_reading.id is None:
+            # La base de datos ya tenía esta lectura
+            self._duplicates_dropped += 1
+            return FlowReadingResponseDTO.from_entity(saved_reading, duplicate=True)
+
+        self._advance_state(state, saved_reading, key)
+        return FlowReadingResponseDTO.from_entity(saved_reading)
+
+    async def enqueue(
         self, dto: CreateFlowReadingDTO
+    ) -> Awaitable[FlowReadingResponseDTO]:
+        """
+        Entrega una lectura durable al repositorio sin esperar su commit
+
+        Calcula el volumen, encola la lectura y avanza el estado en caché,
+        de modo que la siguiente lectura del dispositivo ya puede
+        procesarse. Retorna un awaitable con la respuesta final, que se
+        resuelve cuando la lectura es durable.
+        """
+        reading, state, key, duplicate = await self._prepare(dto)
+        if duplicate is not None:
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(duplicate)
+            return done
+
+        pending = await self.flow_reading_repository.enqueue(reading)
+        state = self._advance_state(state, reading, key)
+        return asyncio.ensure_future(
+            self._complete(pending, state, key, reading.device_id)
+        )
+
+    async def _complete(
+        self,
+        pending: Awaitable[FlowReading],
+        state: DeviceState,
+        key: Optional[ReadingKey],
+        device_id: str,
     ) -> FlowReadingResponseDTO:
-        """Ejecuta el caso de uso"""
+        """Espera el commit de una lectura entregada con `enqueue`"""
+        try:
+            saved = await pending
+        except Exception:
+            # El estado avanzó con una lectura que no se guardó
+            self.state_cache.invalidate(device_id)
+            raise
 
-        # Parsear timestamp del dispositivo si se proporciona
-        if dto.timestamp:
-            try:
-                timestamp = datetime.fromisoformat(dto.timestamp.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                timestamp = datetime.now()
-        else:
-            timestamp = datetime.now()
+        if saved.id is None:
+            # La base de datos ya tenía esta lectura: el estado avanzado con
+            # ella no es confiable, se vuelve a hidratar desde la BD
+            self._duplicates_dropped += 1
+            self.state_cache.invalidate(device_id)
+            return FlowReadingResponseDTO.from_entity(saved, duplicate=True)
+
+        if key is not None:
+            # La ventana ya tenía la clave sin ID: se completa con el asignado
+            state.remember(
+                key,
+                saved.id,
+                saved.total_volume,
+                self.state_cache.recent_keys_per_device,
+            )
+        return FlowReadingResponseDTO.from_entity(saved)
+
+    async def execute_batch(
+        self, dtos: List[CreateFlowReadingDTO]
+    ) -> List[FlowReadingResponseDTO]:
+        """
+        Registra un lote de lecturas en una sola transacción
+
+        Los volúmenes por delta de pulsos se calculan en memoria recorriendo
+        el lote en orden, partiendo del estado en caché de cada dispositivo.
+        Los duplicados (también dentro del mismo lote) se responden marcados
+        como tales, en la posición que ocupan en la entrada.
+        """
+        if not dtos:
+            raise ValueError("El lote de lecturas está vacío")
+
+        results: List[Optional[FlowReadingResponseDTO]] = [None] * len(dtos)
+        # Estado en caché (con su ventana de claves) y estado de trabajo
+        # de la lectura previa por dispositivo dentro del lote
+        states: Dict[str, DeviceState] = {}
+        previous: Dict[str, DeviceState] = {}
+        batch_keys: Dict[Tuple, int] = {}  # clave -> posición de la original
+        repeated: List[Tuple[int, int]] = []
+        pending: List[Tuple[int, FlowReading, Optional[ReadingKey]]] = []
+
+        for index, dto in enumerate(dtos):
+            timestamp = self._parse_timestamp(dto)
+            key = self._idempotency_key(dto, timestamp)
+
+            if dto.pulse_count is not None and dto.device_id not in states:
+                states[dto.device_id] = await self._get_state(dto.device_id)
+
+            if key is not None:
+                original = states[dto.device_id].lookup(key)
+                if original is not None:
+                    self._duplicates_skipped += 1
+                    results[index] = self._duplicate_response(dto, timestamp, original)
+                    continue
+                if (dto.device_id, key) in batch_keys:
+                    self._duplicates_skipped += 1
+                    repeated.append((index, batch_keys[(dto.device_id, key)]))
+                    continue
+                batch_keys[(dto.device_id, key)] = index
+
+            total_volume = dto.total_volume
+            if total_volume is None and dto.pulse_count is not None:
+                if dto.device_id not in previous:
+                    previous[dto.device_id] = states[dto.device_id]
+                total_volume = self._compute_total_volume(
+                    dto, previous[dto.device_id]
+                )
+            elif total_volume is None:
+                total_volume = 0.0
+
+            reading = self._build_reading(dto, timestamp, total_volume)
+            previous[dto.device_id] = DeviceState(
+                reading.pulse_count, reading.total_volume
+            )
+            pending.append((index, reading, key))
+
+        if pending:
+            saved_readings = await self.flow_reading_repository.save_many(
+                [reading for _, reading, _ in pending]
+            )
+            dropped = set()
+            for (index, _, key), saved in zip(pending, saved_readings):
+                if saved.id is None:
+                    self._duplicates_dropped += 1
+                    dropped.add(saved.device_id)
+                    results[index] = FlowReadingResponseDTO.from_entity(
+                        saved, duplicate=True
+                    )
+                else:
+                    self._advance_state(states.get(saved.device_id), saved, key)
+                    results[index] = FlowReadingResponseDTO.from_entity(saved)
+            # Las lecturas siguientes del lote calcularon su volumen desde la
+            # descartada: el estado se vuelve a hidratar desde la BD
+            for device_id in dropped:
+                self.state_cache.invalidate(device_id)
+
+        for index, original_index in repeated:
+            results[index] = replace(results[original_index], duplicate=True)
+        return results
+
+    def get_metrics(self) -> Dict:
+        """Obtiene los contadores de lecturas duplicadas"""
+        return {
+            "duplicates_skipped": self._duplicates_skipped,
+            "duplicates_dropped": self._duplicates_dropped,
+        }
+
+    async def _prepare(
+        self, dto: CreateFlowReadingDTO
+    ) -> Tuple[
+        Optional[FlowReading],
+        Optional[DeviceState],
+        Optional[ReadingKey],
+        Optional[FlowReadingResponseDTO],
+    ]:
+        """
+        Construye la lectura a guardar con su volumen calculado
+
+        Returns:
+            (lectura, estado previo, clave de idempotencia, respuesta de
+            duplicado si la clave ya está en la ventana)
+        """
+        timestamp = self._parse_timestamp(dto)
+        key = self._idempotency_key(dto, timestamp)
+
+        state = None
+        if dto.pulse_count is not None:
+            # Estado de la lectura previa para calcular el volumen incremental
+            state = await self._get_state(dto.device_id)
+            original = state.lookup(key) if key is not None else None
+            if original is not None:
+                self._duplicates_skipped += 1
+                duplicate = self._duplicate_response(dto, timestamp, original)
+                return None, state, key, duplicate
 
         # Calcular total_volume si no se proporciona
         # Se puede calcular desde pulse_count o mantener un acumulador
         total_volume = dto.total_volume
-        if total_volume is None:
-            if dto.pulse_count is not None:
-                # Obtener la última lectura para calcular el volumen incremental
-                last_reading = await self.flow_reading_repository.get_latest(
-                    dto.device_id
+        if total_volume is None and state is not None:
+            total_volume = self._compute_total_volume(dto, state)
+        elif total_volume is None:
+            # Si no hay pulse_count ni total_volume, usar 0
+            total_volume = 0.0
+
+        return self._build_reading(dto, timestamp, total_volume), state, key, None
+
+    async def _get_state(self, device_id: str) -> DeviceState:
+        """Obtiene el estado previo del dispositivo, hidratando desde la BD"""
+        state = self.state_cache.get(device_id)
+        if state is not None:
+            return state
+
+        # Una réplica atrasada haría recalcular el volumen desde una lectura
+        # vieja: el estado de la ingesta se lee siempre del primario
+        last_reading = await self.flow_reading_repository.get_latest(
+            device_id, primary=True
+        )
+        if last_reading:
+            state = DeviceState(last_reading.pulse_count, last_reading.total_volume)
+            if last_reading.pulse_count is not None:
+                # Sembrar la ventana con la última lectura persistida
+                key = (
+                    last_reading.timestamp.replace(tzinfo=None),
+                    last_reading.pulse_count,
                 )
-                if last_reading and last_reading.pulse_count is not None:
-                    # Calcular volumen desde el último pulse_count
-                    pulse_diff = dto.pulse_count - last_reading.pulse_count
-                    # Calibración típica: ~7.5 pulsos por litro (puede variar según sensor)
-                    volume_increment = pulse_diff / 7.5
-                    total_volume = last_reading.total_volume + volume_increment
-                else:
-                    # Primera lectura, calcular desde 0
-                    total_volume = dto.pulse_count / 7.5
-            else:
-                # Si no hay pulse_count ni total_volume, usar 0
-                total_volume = 0.0
+                state.remember(
+                    key,
+                    last_reading.id,
+                    last_reading.total_volume,
+                    self.state_cache.recent_keys_per_device,
+                )
+        else:
+            state = DeviceState(pulse_count=None, total_volume=0.0)
+
+        self.state_cache.put(device_id, state)
+        return state
 
-        reading = FlowReading(
+    def _advance_state(
+        self,
+        state: Optional[DeviceState],
+        reading: FlowReading,
+        key: Optional[ReadingKey],
+    ) -> DeviceState:
+        """Actualiza el estado en caché tras guardar una lectura"""
+        if self.after_rollback is not None:
+            # Dentro de una unidad de trabajo la lectura solo se guardó con
+            # flush: si se revierte, el estado avanzado no es válido
+            device_id = reading.device_id
+            self.after_rollback(lambda: self.state_cache.invalidate(device_id))
+
+        if state is None:
+            state = self.state_cache.get(reading.device_id) or DeviceState(None, 0.0)
+
+        state.pulse_count = reading.pulse_count
+        state.total_volume = reading.total_volume
+        if key is not None:
+            state.remember(
+                key,
+                reading.id,
+                reading.total_volume,
+                self.state_cache.recent_keys_per_device,
+            )
+        self.state_cache.put(reading.device_id, state)
+        return state
+
+    @staticmethod
+    def _idempotency_key(
+        dto: CreateFlowReadingDTO, timestamp: datetime
+    ) -> Optional[ReadingKey]:
+        """
+        Clave de idempotencia de la lectura (None si no aplica)
+
+        Solo las lecturas con timestamp del dispositivo y pulse_count pueden
+        reconocerse como reintentos. El timestamp se normaliza sin zona
+        horaria, tal como queda almacenado.
+        """
+        if dto.timestamp is None or dto.pulse_count is None:
+            return None
+        return timestamp.replace(tzinfo=None), dto.pulse_count
+
+    def _duplicate_response(
+        self,
+        dto: CreateFlowReadingDTO,
+        timestamp: datetime,
+        original: Tuple[Optional[int], float],
+    ) -> FlowReadingResponseDTO:
+        """Respuesta para un reintento: la lectura original ya registrada"""
+        reading_id, total_volume = original
+        reading = self._build_reading(dto, timestamp, total_volume)
+        reading.id = reading_id
+        return FlowReadingResponseDTO.from_entity(reading, duplicate=True)
+
+    @staticmethod
+    def _parse_timestamp(dto: CreateFlowReadingDTO) -> datetime:
+        """Parsea el timestamp del dispositivo si se proporciona"""
+        if isinstance(dto.timestamp, datetime):
+            return dto.timestamp
+        if dto.timestamp:
+            try:
+                return datetime.fromisoformat(dto.timestamp.replace('Z', '+00:00'))
+            except (ValueError, AttributeError):
+                return datetime.now()
+        return datetime.now()
+
+    @staticmethod
+    def _compute_total_volume(
+        dto: CreateFlowReadingDTO, previous: DeviceState
+    ) -> float:
+        """Calcula el volumen acumulado desde el delta de pulsos"""
+        if previous.pulse_count is not None:
+            # Calcular volumen desde el último pulse_count
+            pulse_diff = dto.pulse_count - previous.pulse_count
+            volume_increment = pulse_diff / PULSES_PER_LITER
+            return previous.total_volume + volume_increment
+
+        # Primera lectura, calcular desde 0
+        return dto.pulse_count / PULSES_PER_LITER
+
+    @staticmethod
+    def _build_reading(
+        dto: CreateFlowReadingDTO, timestamp: datetime, total_volume: float
+    ) -> FlowReading:
+        """Construye la entidad de lectura a partir del DTO"""
+        return FlowReading(
             id=None,
             device_id=dto.device_id,
             flow_rate=dto.flow_rate,
@@ -61,6 +376,3 @@ class RecordFlowReadingUseCase:
             temperature=dto.temperature,
             pressure=dto.pressure,
         )
-
-        saved_reading = await self.flow_reading_repository.save(reading)
-        return FlowReadingResponseDTO.from_entity(saved_reading)
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from src.domain.entities.filling import Filling, FillingStatus
+from src.domain.value_objects.metrics import FillingAggregate
 
 
 class FillingRepository(ABC):
@@ -29,6 +30,21 @@ class FillingRepository(ABC):
         """Obtiene llenados por dispositivo"""
         pass
 
+    @abstractmethod
+    async def get_page(
+        self,
+        device_id: str,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None,
+    ) -> List[Filling]:
+        """
+        Obtiene una página de llenados, del más reciente al más antiguo
+
+        `after` es el (start_time, id) del último llenado de la página
+        anterior (paginación por clave, sin OFFSET).
+        """
+        pass
+
     @abstractmethod
     async def get_by_date_range(
         self, device_id: str, start_date: datetime, end_date: datetime
@@ -43,6 +59,27 @@ class FillingRepository(ABC):
         """Obtiene llenados por estado"""
         pass
 
+    @abstractmethod
+    async def get_aggregate(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FillingAggregate:
+        """Obtiene el agregado de los llenados de un rango [start_date, end_date]"""
+        pass
+
+    @abstractmethod
+    async def get_daily_aggregates(
+        self, device_id: str, start_day: datetime, stop_day: datetime
+    ) -> Dict[datetime, FillingAggregate]:
+        """Obtiene el agregado de cada día en [start_day, stop_day) con llenados"""
+        pass
+
+    @abstractmethod
+    async def get_efficiencies(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> List[float]:
+        """Obtiene la eficiencia de cada llenado de [start_date, end_date]"""
+        pass
+
     @abstractmethod
     async def get_active_filling(self, device_id: str) -> Optional[Filling]:
         """Obtiene el llenado activo (en progreso)"""
@@ -1,15 +1,47 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Tuple
 from datetime import datetime
 from src.domain.entities.flow_reading import FlowReading
+from src.domain.value_objects.flow_columns import FlowReadingColumns
+from src.domain.value_objects.metrics import FlowAggregate
 
 
 class FlowReadingRepository(ABC):
     """Interfaz del repositorio de lecturas de flujo"""
 
     @abstractmethod
-    async def save(self, reading: FlowReading) -> FlowReading:
-        """Guarda una lectura de flujo"""
+    async def save(self, reading: FlowReading, durable: bool = True) -> FlowReading:
+        """
+        Guarda una lectura de flujo
+
+        Si durable es False la implementación puede confirmar la lectura
+        antes de persistirla (sin ID asignado). Una lectura durable que se
+        retorna sin ID es un duplicado de (device_id, timestamp, pulse_count).
+        """
+        pass
+
+    async def enqueue(self, reading: FlowReading) -> Awaitable[FlowReading]:
+        """
+        Entrega una lectura para guardarla de forma durable, sin esperar
+        su commit
+
+        Retorna un awaitable con la lectura guardada (sin ID si era un
+        duplicado). Las implementaciones con escritura diferida solo la
+        encolan; por defecto se guarda de inmediato.
+        """
+        saved = asyncio.get_running_loop().create_future()
+        saved.set_result(await self.save(reading))
+        return saved
+
+    @abstractmethod
+    async def save_many(self, readings: List[FlowReading]) -> List[FlowReading]:
+        """
+        Guarda un lote de lecturas de flujo en una sola transacción
+
+        Los duplicados de (device_id, timestamp, pulse_count) se omiten y se
+        retornan sin ID, en el mismo orden que la entrada.
+        """
         pass
 
     @abstractmethod
@@ -24,6 +56,22 @@ class FlowReadingRepository(ABC):
         """Obtiene lecturas por dispositivo"""
         pass
 
+    @abstractmethod
+    async def get_page(
+        self,
+        device_id: str,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None,
+    ) -> List[FlowReading]:
+        """
+        Obtiene una página de lecturas, de la más reciente a la más antigua
+
+        `after` es el (timestamp, id) de la última lectura de la página
+        anterior: la página siguiente se busca por clave, sin OFFSET, así
+        que su costo no depende de la profundidad.
+        """
+        pass
+
     @abstractmethod
     async def get_by_date_range(
         self, device_id: str, start_date: datetime, end_date: datetime
@@ -31,12 +79,72 @@ class FlowReadingRepository(ABC):
         """Obtiene lecturas en un rango de fechas"""
         pass
 
+    @abstractmethod
+    def iter_by_date_range(
+        self,
+        device_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        chunk_size: int = 1000,
+    ) -> AsyncIterator[List[FlowReading]]:
+        """
+        Recorre las lecturas de un rango en bloques de hasta `chunk_size`
+
+        Equivale a `get_by_date_range` sin cargar el rango completo en
+        memoria: cada bloque se lee de la base de datos cuando se pide.
+        """
+        pass
+
+    @abstractmethod
+    def iter_by_device_id(
+        self, device_id: str, limit: Optional[int] = None, chunk_size: int = 1000
+    ) -> AsyncIterator[List[FlowReading]]:
+        """Recorre en bloques las lecturas de un dispositivo, de la más reciente a la más antigua"""
+        pass
+
+    @abstractmethod
+    async def get_columns_by_date_range(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FlowReadingColumns:
+        """Lecturas de un rango como columnas NumPy, ordenadas por timestamp"""
+        pass
+
+    @abstractmethod
+    async def get_latest_columns(
+        self, device_id: str, limit: int = 1000
+    ) -> FlowReadingColumns:
+        """Últimas `limit` lecturas como columnas NumPy (más recientes primero)"""
+        pass
+
+    @abstractmethod
+    async def get_aggregate(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FlowAggregate:
+        """Obtiene el agregado (count, suma, mín, máx, último volumen) de un rango"""
+        pass
+
+    @abstractmethod
+    async def get_daily_aggregates(
+        self, device_id: str, start_day: datetime, end_day: datetime
+    ) -> Dict[datetime, FlowAggregate]:
+        """Obtiene el agregado de cada día completo en [start_day, end_day)"""
+        pass
+
     @abstractmethod
     async def delete(self, reading_id: int) -> bool:
         """Elimina una lectura"""
         pass
 
     @abstractmethod
-    async def get_latest(self, device_id: str) -> Optional[FlowReading]:
-        """Obtiene la lectura más reciente"""
+    async def get_latest(
+        self, device_id: str, primary: bool = False
+    ) -> Optional[FlowReading]:
+        """
+        Obtiene la lectura más reciente
+
+        Args:
+            device_id: ID del dispositivo
+            primary: Leer del primario en lugar de una réplica (estado del
+                que depende la ingesta)
+        """
         pass
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from typing import List
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class FlowReadingColumns:
+    """
+    Lecturas de flujo como columnas NumPy
+
+    Para análisis sobre muchas lecturas: evita crear una entidad por fila y
+    `to_dataframe` construye el DataFrame sobre los mismos arrays.
+    """
+
+    ids: np.ndarray  # int64
+    timestamps: np.ndarray  # datetime64[us], sin zona
+    flow_rates: np.ndarray  # float64
+    total_volumes: np.ndarray  # float64
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls) -> "FlowReadingColumns":
+        """Lote sin lecturas"""
+        return cls(
+            ids=np.empty(0, dtype=np.int64),
+            timestamps=np.empty(0, dtype="datetime64[us]"),
+            flow_rates=np.empty(0, dtype=np.float64),
+            total_volumes=np.empty(0, dtype=np.float64),
+        )
+
+    @classmethod
+    def concat(cls, parts: List["FlowReadingColumns"]) -> "FlowReadingColumns":
+        """Une varios lotes (sin copiar si hay uno solo)"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(
+            ids=np.concatenate([p.ids for p in parts]),
+            timestamps=np.concatenate([p.timestamps for p in parts]),
+            flow_rates=np.concatenate([p.flow_rates for p in parts]),
+            total_volumes=np.concatenate([p.total_volumes for p in parts]),
+        )
+
+    def take(self, mask_or_order: np.ndarray) -> "FlowReadingColumns":
+        """Filas seleccionadas por una máscara o un orden de índices"""
+        return FlowReadingColumns(
+            ids=self.ids[mask_or_order],
+            timestamps=self.timestamps[mask_or_order],
+            flow_rates=self.flow_rates[mask_or_order],
+            total_volumes=self.total_volumes[mask_or_order],
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """DataFrame (id, timestamp, flow_rate, total_volume) sin copiar las columnas"""
+        return pd.DataFrame(
+            {
+                "id": self.ids,
+                "timestamp": self.timestamps,
+                "flow_rate": self.flow_rates,
+                "total_volume": self.total_volumes,
+            },
+            copy=False,
+        )
@@ -1,6 +1,8 @@
-from dataclasses import dataclass
-from typing import List, Dict
+import math
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
 from datetime import datetime
+from src.domain.entities.filling import Filling, FillingStatus
 
 
 @dataclass
@@ -27,6 +29,157 @@ class FlowMetrics:
         }
 
 
+@dataclass
+class FlowAggregate:
+    """
+    Agregado combinable de lecturas de flujo
+
+    Guarda sumas en lugar de promedios para poder combinar agregados de
+    distintos intervalos (rollups y lecturas sueltas) sin perder exactitud.
+    """
+
+    count: int = 0
+    sum_flow: float = 0.0
+    sum_sq_flow: float = 0.0
+    min_flow: Optional[float] = None
+    max_flow: Optional[float] = None
+    last_timestamp: Optional[datetime] = None
+    last_total_volume: Optional[float] = None
+
+    def add(self, flow_rate: float, total_volume: float, timestamp: datetime):
+        """Agrega una lectura"""
+        self.merge(
+            FlowAggregate(
+                count=1,
+                sum_flow=flow_rate,
+                sum_sq_flow=flow_rate * flow_rate,
+                min_flow=flow_rate,
+                max_flow=flow_rate,
+                last_timestamp=timestamp,
+                last_total_volume=total_volume,
+            )
+        )
+
+    def merge(self, other: "FlowAggregate"):
+        """Combina otro agregado con este"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.min_flow, self.max_flow = other.min_flow, other.max_flow
+        else:
+            self.min_flow = min(self.min_flow, other.min_flow)
+            self.max_flow = max(self.max_flow, other.max_flow)
+        self.count += other.count
+        self.sum_flow += other.sum_flow
+        self.sum_sq_flow += other.sum_sq_flow
+        if self.last_timestamp is None or other.last_timestamp >= self.last_timestamp:
+            self.last_timestamp = other.last_timestamp
+            self.last_total_volume = other.last_total_volume
+
+    @property
+    def mean(self) -> float:
+        """Caudal promedio"""
+        return self.sum_flow / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        """Desviación estándar muestral del caudal (NaN con una lectura)"""
+        if self.count < 2:
+            return math.nan
+        variance = (self.sum_sq_flow - self.sum_flow**2 / self.count) / (
+            self.count - 1
+        )
+        return math.sqrt(max(variance, 0.0))
+
+
+@dataclass
+class FillingAggregate:
+    """
+    Agregado combinable de llenados
+
+    Igual que FlowAggregate, guarda sumas y conteos para combinar los
+    agregados de varios días sin volver a leer los llenados.
+    """
+
+    total: int = 0
+    completed: int = 0
+    cancelled: int = 0
+    # Sumas de los llenados completados (promedios de FillingMetrics)
+    completed_duration_sum: float = 0.0
+    completed_volume_sum: float = 0.0
+    completed_efficiency_sum: float = 0.0
+    # Sumas de todos los llenados
+    volume_sum: float = 0.0
+    efficiency_sum: float = 0.0
+    efficiency_sum_sq: float = 0.0
+    efficiency_min: Optional[float] = None
+    efficiency_max: Optional[float] = None
+    by_hour: Dict[int, int] = field(default_factory=dict)
+    by_day: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, filling: Filling):
+        """Agrega un llenado"""
+        volume = filling.get_actual_volume()
+        efficiency = filling.get_efficiency()
+        single = FillingAggregate(
+            total=1,
+            volume_sum=volume,
+            efficiency_sum=efficiency,
+            efficiency_sum_sq=efficiency * efficiency,
+            efficiency_min=efficiency,
+            efficiency_max=efficiency,
+            by_hour={filling.start_time.hour: 1},
+            by_day={str(filling.start_time.date()): 1},
+        )
+        if filling.status == FillingStatus.COMPLETED:
+            single.completed = 1
+            single.completed_duration_sum = filling.duration_seconds or 0
+            single.completed_volume_sum = volume
+            single.completed_efficiency_sum = efficiency
+        elif filling.status == FillingStatus.CANCELLED:
+            single.cancelled = 1
+        self.merge(single)
+
+    def merge(self, other: "FillingAggregate"):
+        """Combina otro agregado con este"""
+        if other.total == 0:
+            return
+        if self.total == 0:
+            self.efficiency_min = other.efficiency_min
+            self.efficiency_max = other.efficiency_max
+        else:
+            self.efficiency_min = min(self.efficiency_min, other.efficiency_min)
+            self.efficiency_max = max(self.efficiency_max, other.efficiency_max)
+        self.total += other.total
+        self.completed += other.completed
+        self.cancelled += other.cancelled
+        self.completed_duration_sum += other.completed_duration_sum
+        self.completed_volume_sum += other.completed_volume_sum
+        self.completed_efficiency_sum += other.completed_efficiency_sum
+        self.volume_sum += other.volume_sum
+        self.efficiency_sum += other.efficiency_sum
+        self.efficiency_sum_sq += other.efficiency_sum_sq
+        for hour, count in other.by_hour.items():
+            self.by_hour[hour] = self.by_hour.get(hour, 0) + count
+        for day, count in other.by_day.items():
+            self.by_day[day] = self.by_day.get(day, 0) + count
+
+    @property
+    def efficiency_mean(self) -> float:
+        """Eficiencia promedio de todos los llenados"""
+        return self.efficiency_sum / self.total if self.total else 0.0
+
+    @property
+    def efficiency_std(self) -> float:
+        """Desviación estándar muestral de la eficiencia (NaN con un llenado)"""
+        if self.total < 2:
+            return math.nan
+        variance = (self.efficiency_sum_sq - self.efficiency_sum**2 / self.total) / (
+            self.total - 1
+        )
+        return math.sqrt(max(variance, 0.0))
+
+
 @dataclass
 class FillingMetrics:
     """Métricas de llenados"""
@@ -0,0 +1,33 @@
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+
+
+class UnitOfWorkExtension(SchemaExtension):
+    """
+    Ejecuta cada operación de GraphQL en una unidad de trabajo
+
+    Todos los resolvers de la operación comparten una sesión: una query usa
+    una réplica de lectura y una mutation el primario, confirmando todas sus
+    escrituras juntas al final. Si algún resolver falla, la mutation se
+    revierte completa.
+    """
+
+    async def on_execute(self):
+        db_manager = getattr(self.execution_context.context, "db_manager", None)
+        if db_manager is None:
+            yield
+            return
+
+        read_only = self.execution_context.operation_type == OperationType.QUERY
+        unit_of_work = db_manager.unit_of_work(read_only=read_only)
+        await unit_of_work.__aenter__()
+        try:
+            yield
+        except BaseException as e:
+            await unit_of_work.__aexit__(type(e), e, e.__traceback__)
+            raise
+        result = self.execution_context.result
+        if result is not None and result.errors:
+            await unit_of_work.__aexit__(RuntimeError, None, None)
+        else:
+            await unit_of_work.__aexit__(None, None, None)
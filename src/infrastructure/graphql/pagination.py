@@ -0,0 +1,35 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Tamaño máximo de página que acepta una conexión
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Cursor opaco de la clave (timestamp, id) de una fila"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    Clave (timestamp, id) de un cursor
+
+    Raises:
+        ValueError: Si el cursor no fue generado por `encode_cursor`
+    """
+    if cursor is None:
+        return None
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor inválido") from None
+
+
+def check_page_size(first: int) -> int:
+    """Valida el tamaño de página pedido"""
+    if not 1 <= first <= MAX_PAGE_SIZE:
+        raise ValueError(f"first debe estar entre 1 y {MAX_PAGE_SIZE}")
+    return first
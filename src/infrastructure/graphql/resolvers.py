@@ -2,6 +2,7 @@ import strawberry
 from typing import List, Optional
 from datetime import datetime
 from strawberry.fastapi import BaseContext
+from src.infrastructure.graphql.extensions import UnitOfWorkExtension
 from src.infrastructure.graphql.schema import (
     FlowReading,
     Filling,
@@ -15,6 +16,16 @@ from src.infrastructure.graphql.schema import (
     UpdatePumpLevelInput,
     PumpControlInput,
     ThresholdStatus,
+    PageInfo,
+    FlowReadingEdge,
+    FlowReadingConnection,
+    FillingEdge,
+    FillingConnection,
+)
+from src.infrastructure.graphql.pagination import (
+    check_page_size,
+    decode_cursor,
+    encode_cursor,
 )
 from src.application.use_cases.record_flow_reading import RecordFlowReadingUseCase
 from src.application.use_cases.manage_filling import (
@@ -48,6 +59,7 @@ class Context(BaseContext):
         filling_repository,
         pump_repository,
         metrics_service,
+        db_manager=None,
     ):
         self.record_flow_reading_use_case = record_flow_reading_use_case
         self.start_filling_use_case = start_filling_use_case
@@ -60,6 +72,41 @@ class Context(BaseContext):
         self.filling_repository = filling_repository
         self.pump_repository = pump_repository
         self.metrics_service = metrics_service
+        # Con db_manager cada operación corre en una unidad de trabajo
+        self.db_manager = db_manager
+
+
+def _to_flow_reading(r) -> FlowReading:
+    """Convierte una lectura del dominio al tipo GraphQL"""
+    return FlowReading(
+        id=r.id,
+        device_id=r.device_id,
+        flow_rate=r.flow_rate,
+        total_volume=r.total_volume,
+        timestamp=r.timestamp,
+        pulse_count=r.pulse_count,
+        unit=r.unit,
+        temperature=r.temperature,
+        pressure=r.pressure,
+    )
+
+
+def _to_filling(f) -> Filling:
+    """Convierte un llenado del dominio al tipo GraphQL"""
+    return Filling(
+        id=f.id,
+        device_id=f.device_id,
+        start_time=f.start_time,
+        end_time=f.end_time,
+        initial_volume=f.initial_volume,
+        final_volume=f.final_volume,
+        target_volume=f.target_volume,
+        status=f.status.value,
+        duration_seconds=f.duration_seconds,
+        avg_flow_rate=f.avg_flow_rate,
+        actual_volume=f.get_actual_volume(),
+        efficiency=f.get_efficiency(),
+    )
 
 
 @strawberry.type
@@ -73,20 +120,40 @@ class Query:
         """Obtiene lecturas de flujo"""
         ctx: Context = info.context
         readings = await ctx.flow_reading_repository.get_by_device_id(device_id, limit)
-        return [
-            FlowReading(
-                id=r.id,
-                device_id=r.device_id,
-                flow_rate=r.flow_rate,
-                total_volume=r.total_volume,
-                timestamp=r.timestamp,
-                pulse_count=r.pulse_count,
-                unit=r.unit,
-                temperature=r.temperature,
-                pressure=r.pressure,
+        return [_to_flow_reading(r) for r in readings]
+
+    @strawberry.field
+    async def flow_readings_connection(
+        self,
+        info: strawberry.Info,
+        device_id: str,
+        first: int = 100,
+        after: Optional[str] = None,
+    ) -> FlowReadingConnection:
+        """
+        Obtiene lecturas de flujo página por página
+
+        Usar `pageInfo.endCursor` como `after` para pedir la página
+        siguiente; el costo de cada página no depende de su profundidad.
+        """
+        ctx: Context = info.context
+        # Pedir una fila de más para saber si hay otra página
+        readings = await ctx.flow_reading_repository.get_page(
+            device_id, check_page_size(first) + 1, decode_cursor(after)
+        )
+        edges = [
+            FlowReadingEdge(
+                cursor=encode_cursor(r.timestamp, r.id), node=_to_flow_reading(r)
             )
-            for r in readings
+            for r in readings[:first]
         ]
+        return FlowReadingConnection(
+            edges=edges,
+            page_info=PageInfo(
+                has_next_page=len(readings) > first,
+                end_cursor=edges[-1].cursor if edges else None,
+            ),
+        )
 
     @strawberry.field
     async def latest_flow_reading(
@@ -116,23 +183,32 @@ class Query:
         """Obtiene llenados"""
         ctx: Context = info.context
         fillings = await ctx.filling_repository.get_by_device_id(device_id, limit)
-        return [
-            Filling(
-                id=f.id,
-                device_id=f.device_id,
-                start_time=f.start_time,
-                end_time=f.end_time,
-                initial_volume=f.initial_volume,
-                final_volume=f.final_volume,
-                target_volume=f.target_volume,
-                status=f.status.value,
-                duration_seconds=f.duration_seconds,
-                avg_flow_rate=f.avg_flow_rate,
-                actual_volume=f.get_actual_volume(),
-                efficiency=f.get_efficiency(),
-            )
-            for f in fillings
+        return [_to_filling(f) for f in fillings]
+
+    @strawberry.field
+    async def fillings_connection(
+        self,
+        info: strawberry.Info,
+        device_id: str,
+        first: int = 100,
+        after: Optional[str] = None,
+    ) -> FillingConnection:
+        """Obtiene llenados página por página (ver `flowReadingsConnection`)"""
+        ctx: Context = info.context
+        fillings = await ctx.filling_repository.get_page(
+            device_id, check_page_size(first) + 1, decode_cursor(after)
+        )
+        edges = [
+            FillingEdge(cursor=encode_cursor(f.start_time, f.id), node=_to_filling(f))
+            for f in fillings[:first]
         ]
+        return FillingConnection(
+            edges=edges,
+            page_info=PageInfo(
+                has_next_page=len(fillings) > first,
+                end_cursor=edges[-1].cursor if edges else None,
+            ),
+        )
 
     @strawberry.field
     async def active_filling(
@@ -385,4 +461,6 @@ class Mutation:
 
 
 # Crear el schema de GraphQL
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(
+    query=Query, mutation=Mutation, extensions=[UnitOfWorkExtension]
+)
@@ -7,7 +7,7 @@ from datetime import datetime
 class FlowReading:
     """Tipo GraphQL para lectura de flujo"""
 
-    id: int
+    id: Optional[int]  # None si la lectura aún está en el buffer de escritura
     device_id: str
     flow_rate: float
     total_volume: float
@@ -36,6 +36,46 @@ class Filling:
     efficiency: float
 
 
+@strawberry.type
+class PageInfo:
+    """Información de paginación (estilo Relay)"""
+
+    has_next_page: bool
+    end_cursor: Optional[str]
+
+
+@strawberry.type
+class FlowReadingEdge:
+    """Lectura de flujo con su cursor"""
+
+    cursor: str
+    node: FlowReading
+
+
+@strawberry.type
+class FlowReadingConnection:
+    """Página de lecturas de flujo, de la más reciente a la más antigua"""
+
+    edges: List[FlowReadingEdge]
+    page_info: PageInfo
+
+
+@strawberry.type
+class FillingEdge:
+    """Llenado con su cursor"""
+
+    cursor: str
+    node: Filling
+
+
+@strawberry.type
+class FillingConnection:
+    """Página de llenados, del más reciente al más antiguo"""
+
+    edges: List[FillingEdge]
+    page_info: PageInfo
+
+
 @strawberry.type
 class Pump:
     """Tipo GraphQL para bomba"""
@@ -9,6 +9,9 @@ from src.infrastructure.persistence.repositories import (
 )
 from src.infrastructure.persistence.database import DatabaseManager
 from src.application.use_cases.record_flow_reading import RecordFlowReadingUseCase
+from src.application.services.device_state_cache import DeviceStateCache
+from src.application.services.daily_aggregate_cache import DailyAggregateCache
+from src.application.services.metrics_result_cache import CachedMetricsService
 from src.application.use_cases.manage_filling import (
     StartFillingUseCase,
     CompleteFillingUseCase,
@@ -20,7 +23,18 @@ from src.application.use_cases.control_pump import (
     CheckPumpThresholdUseCase,
 )
 from src.infrastructure.persistence.metrics_service_impl import MetricsServiceImpl
-from src.infrastructure.rest import create_sensor_router
+from src.infrastructure.persistence.retention import RetentionEngine, RetentionPolicy
+from src.infrastructure.persistence.sqlite_tuning import SQLiteMaintenance, SQLitePragmas
+from src.infrastructure.ingestion.dispatcher import IngestionDispatcher
+from src.infrastructure.ingestion.admission import AdmissionController
+from src.infrastructure.rest import (
+    create_sensor_router,
+    create_export_router,
+    create_monitoring_router,
+    create_stream_router,
+    DeviceConnectionRegistry,
+)
+from src.shared.config.settings import settings
 
 
 class GraphQLServer:
@@ -28,32 +42,177 @@ class GraphQLServer:
 
     def __init__(self, database_url: str):
         self.app = FastAPI(title="Water Dispenser API", version="1.0.0")
-        self.db_manager = DatabaseManager(database_url)
+        self.db_manager = DatabaseManager(
+            database_url,
+            partitioned=settings.FLOW_PARTITIONING_ENABLED,
+            partition_months_ahead=settings.FLOW_PARTITION_MONTHS_AHEAD,
+            archive_dir=settings.ARCHIVE_DIR if settings.ARCHIVE_ENABLED else None,
+            sqlite_pragmas=(
+                SQLitePragmas(
+                    journal_mode=settings.SQLITE_JOURNAL_MODE,
+                    synchronous=settings.SQLITE_SYNCHRONOUS,
+                    mmap_size=settings.SQLITE_MMAP_SIZE,
+                    cache_size_kb=settings.SQLITE_CACHE_SIZE_KB,
+                    temp_store=settings.SQLITE_TEMP_STORE,
+                    busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+                )
+                if settings.SQLITE_TUNING_ENABLED
+                else None
+            ),
+            read_urls=settings.database_read_urls,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            read_pool_size=settings.DATABASE_READ_POOL_SIZE,
+            read_max_overflow=settings.DATABASE_READ_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+            pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        )
 
         # Inicializar repositorios
         self.flow_reading_repo = SQLAlchemyFlowReadingRepository(self.db_manager)
         self.filling_repo = SQLAlchemyFillingRepository(self.db_manager)
-        self.pump_repo = SQLAlchemyPumpRepository(self.db_manager)
+        self.pump_repo = SQLAlchemyPumpRepository(
+            self.db_manager, read_your_writes=settings.PUMP_READ_YOUR_WRITES
+        )
+
+        # Métricas internas expuestas en /api/v1/monitoring/metrics
+        self.metrics_providers = {
+            "database_pools": self.db_manager.get_pool_metrics,
+        }
+
+        # Checkpoint del WAL y PRAGMA optimize periódicos (solo SQLite)
+        self.sqlite_maintenance = None
+        is_sqlite = self.db_manager.engine.dialect.name == "sqlite"
+        if settings.SQLITE_TUNING_ENABLED and is_sqlite:
+            self.sqlite_maintenance = SQLiteMaintenance(
+                self.db_manager.engine,
+                interval_seconds=settings.SQLITE_MAINTENANCE_INTERVAL_SECONDS,
+            )
+            self.metrics_providers["sqlite"] = self.sqlite_maintenance.get_metrics
+
+        # Escritura diferida de lecturas (group commit)
+        if settings.FLOW_WRITE_BEHIND_ENABLED:
+            write_buffer = self.flow_reading_repo.enable_write_behind(
+                max_queue_size=settings.FLOW_WRITE_BEHIND_MAX_QUEUE,
+                flush_size=settings.FLOW_WRITE_BEHIND_FLUSH_SIZE,
+                flush_interval_ms=settings.FLOW_WRITE_BEHIND_FLUSH_INTERVAL_MS,
+                max_retries=settings.FLOW_WRITE_BEHIND_MAX_RETRIES,
+                retry_backoff_ms=settings.FLOW_WRITE_BEHIND_RETRY_BACKOFF_MS,
+            )
+            self.metrics_providers["flow_write_buffer"] = write_buffer.get_metrics
+
+        # Retención y downsampling de lecturas
+        self.retention = RetentionEngine(
+            self.db_manager,
+            RetentionPolicy(
+                raw_days=settings.RETENTION_RAW_DAYS,
+                minute_days=settings.RETENTION_MINUTE_DAYS,
+                hour_days=settings.RETENTION_HOUR_DAYS,
+            ),
+            chunk_size=settings.RETENTION_CHUNK_SIZE,
+            interval_seconds=settings.RETENTION_INTERVAL_SECONDS,
+        )
+        self.metrics_providers["retention"] = self.retention.get_metrics
+        if self.db_manager.archive is not None:
+            self.metrics_providers["archive"] = self.db_manager.archive.get_metrics
 
         # Inicializar servicios
+        self.daily_aggregate_cache = DailyAggregateCache(
+            max_entries=settings.METRICS_DAILY_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.METRICS_DAILY_CACHE_TTL_SECONDS,
+        )
+        self.metrics_providers["daily_aggregate_cache"] = (
+            self.daily_aggregate_cache.get_metrics
+        )
         self.metrics_service = MetricsServiceImpl(
-            self.flow_reading_repo, self.filling_repo
+            self.flow_reading_repo, self.filling_repo, self.daily_aggregate_cache
         )
+        # Las escrituras invalidan el agregado del día que modifican
+        self.flow_reading_repo.add_listener(self.metrics_service.invalidate_flow_day)
+        self.filling_repo.add_listener(self.metrics_service.invalidate_filling_day)
+        if settings.METRICS_RESULT_CACHE_ENABLED:
+            # Los dashboards repiten las mismas consultas: se reutiliza el
+            # resultado hasta que una escritura toque su rango
+            self.metrics_service = CachedMetricsService(
+                self.metrics_service,
+                max_entries=settings.METRICS_RESULT_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.METRICS_RESULT_CACHE_TTL_SECONDS,
+            )
+            self.flow_reading_repo.add_listener(
+                self.metrics_service.invalidate_flow_day
+            )
+            self.filling_repo.add_listener(self.metrics_service.invalidate_filling_day)
+            self.metrics_providers["metrics_result_cache"] = (
+                self.metrics_service.get_metrics
+            )
 
         # Inicializar casos de uso
+        self.device_state_cache = DeviceStateCache(
+            max_devices=settings.DEVICE_STATE_CACHE_MAX_DEVICES,
+            recent_keys_per_device=settings.DEVICE_RECENT_KEYS,
+        )
+        self.metrics_providers["device_state_cache"] = (
+            self.device_state_cache.get_metrics
+        )
+        if self.flow_reading_repo.write_buffer is not None:
+            # Lecturas fire-and-ack descartadas: el estado en caché ya no vale
+            self.flow_reading_repo.write_buffer.add_drop_listener(
+                self.device_state_cache.invalidate
+            )
         self.record_flow_reading_use_case = RecordFlowReadingUseCase(
-            self.flow_reading_repo
+            self.flow_reading_repo,
+            self.device_state_cache,
+            after_rollback=self.db_manager.after_rollback,
+        )
+        self.metrics_providers["record_flow_reading"] = (
+            self.record_flow_reading_use_case.get_metrics
+        )
+
+        # Ingesta ordenada por dispositivo con workers por shard
+        self.ingestion = self.record_flow_reading_use_case
+        self.ingestion_dispatcher = None
+        if settings.INGEST_SHARDS > 0:
+            self.ingestion_dispatcher = IngestionDispatcher(
+                self.record_flow_reading_use_case,
+                num_shards=settings.INGEST_SHARDS,
+                max_queue_size=settings.INGEST_SHARD_QUEUE_SIZE,
+                unit_of_work=(
+                    self.db_manager.unit_of_work
+                    if settings.UNIT_OF_WORK_ENABLED
+                    else None
+                ),
+            )
+            self.ingestion = self.ingestion_dispatcher
+            self.metrics_providers["ingestion_dispatcher"] = (
+                self.ingestion_dispatcher.get_metrics
+            )
+
+        # Admisión de la ingesta: protege la latencia del resto de la API
+        self.admission = AdmissionController(
+            max_in_flight=settings.INGEST_MAX_IN_FLIGHT,
+            max_wait_ms=settings.INGEST_MAX_WAIT_MS,
+            device_rate=settings.INGEST_DEVICE_RATE,
+            device_burst=settings.INGEST_DEVICE_BURST,
+            max_devices=settings.DEVICE_STATE_CACHE_MAX_DEVICES,
         )
+        self.metrics_providers["ingest_admission"] = self.admission.get_metrics
+
         self.start_filling_use_case = StartFillingUseCase(self.filling_repo)
         self.complete_filling_use_case = CompleteFillingUseCase(self.filling_repo)
         self.cancel_filling_use_case = CancelFillingUseCase(self.filling_repo)
         self.update_pump_level_use_case = UpdatePumpLevelUseCase(self.pump_repo)
-        self.control_pump_use_case = ControlPumpUseCase(self.pump_repo)
+        # Conexiones WebSocket de los dispositivos (lecturas y comandos)
+        self.device_connections = DeviceConnectionRegistry()
+        self.metrics_providers["sensor_stream"] = self.device_connections.get_metrics
+        self.control_pump_use_case = ControlPumpUseCase(
+            self.pump_repo, on_command=self.device_connections.push_pump_command
+        )
         self.check_pump_threshold_use_case = CheckPumpThresholdUseCase(self.pump_repo)
 
         # Configurar contexto
         self.context = Context(
-            record_flow_reading_use_case=self.record_flow_reading_use_case,
+            record_flow_reading_use_case=self.ingestion,
             start_filling_use_case=self.start_filling_use_case,
             complete_filling_use_case=self.complete_filling_use_case,
             cancel_filling_use_case=self.cancel_filling_use_case,
@@ -64,6 +223,7 @@ class GraphQLServer:
             filling_repository=self.filling_repo,
             pump_repository=self.pump_repo,
             metrics_service=self.metrics_service,
+            db_manager=self.db_manager if settings.UNIT_OF_WORK_ENABLED else None,
         )
 
         # Configurar CORS
@@ -82,13 +242,49 @@ class GraphQLServer:
         self.app.include_router(graphql_router)
 
         # Crear y agregar router REST
-        rest_router = create_sensor_router(self.record_flow_reading_use_case)
+        rest_router = create_sensor_router(
+            self.ingestion,
+            self.admission,
+            unit_of_work=(
+                self.db_manager.unit_of_work if settings.UNIT_OF_WORK_ENABLED else None
+            ),
+        )
         self.app.include_router(rest_router)
+        self.app.include_router(
+            create_stream_router(
+                self.ingestion,
+                self.device_connections,
+                ack_max_frames=settings.STREAM_ACK_MAX_FRAMES,
+                ack_interval_ms=settings.STREAM_ACK_INTERVAL_MS,
+                admission=self.admission,
+            )
+        )
+        self.app.include_router(create_export_router(self.flow_reading_repo))
+        self.app.include_router(create_monitoring_router(self.metrics_providers))
 
         # Evento de inicio
         @self.app.on_event("startup")
         async def startup():
             await self.db_manager.create_tables()
+            if self.flow_reading_repo.write_buffer is not None:
+                await self.flow_reading_repo.write_buffer.start()
+            if self.ingestion_dispatcher is not None:
+                await self.ingestion_dispatcher.start()
+            if settings.RETENTION_ENABLED:
+                await self.retention.start()
+            if self.sqlite_maintenance is not None:
+                await self.sqlite_maintenance.start()
+
+        # Evento de cierre: persistir lo pendiente antes de salir
+        @self.app.on_event("shutdown")
+        async def shutdown():
+            await self.retention.stop()
+            if self.sqlite_maintenance is not None:
+                await self.sqlite_maintenance.stop()
+            if self.ingestion_dispatcher is not None:
+                await self.ingestion_dispatcher.stop()
+            if self.flow_reading_repo.write_buffer is not None:
+                await self.flow_reading_repo.write_buffer.stop()
 
     async def get_context(self):
         """Obtiene el contexto para GraphQL"""
@@ -100,7 +296,5 @@ class GraphQLServer:
 
 
 # Crear instancia de la aplicación para uvicorn
-from src.shared.config.settings import settings
-
 _server = GraphQLServer(settings.DATABASE_URL)
 app = _server.get_app()
@@ -0,0 +1,146 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from src.shared.exceptions.exceptions import AdmissionRejectedException
+from src.shared.utils.metrics import Histogram
+
+
+class AdmissionController:
+    """
+    Control de admisión para la ingesta de lecturas
+
+    Aplica dos límites antes de tocar la base de datos:
+
+    - Un token bucket por dispositivo (`device_rate` lecturas/s con ráfagas
+      de hasta `device_burst`): un sensor que envía de más recibe 429.
+    - Un máximo de peticiones de ingesta en curso (`max_in_flight`): si no
+      hay cupo en `max_wait_ms`, se responde 503 en lugar de encolar sin
+      límite.
+
+    Así una ráfaga de sensores no agota las conexiones de la base de datos
+    que necesitan el control de la bomba y las consultas GraphQL. Un límite
+    en 0 lo desactiva; con ambos en 0 (por defecto) todo se admite.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 0,
+        max_wait_ms: int = 250,
+        device_rate: float = 0.0,
+        device_burst: int = 0,
+        max_devices: int = 50000,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait_ms / 1000
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.max_devices = max_devices
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+        # device_id -> (tokens disponibles, instante de la última recarga)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._in_flight = 0
+        self._admitted = 0
+        self._rate_limited = 0
+        self._overloaded = 0
+        self.queue_time_ms = Histogram()
+
+    @asynccontextmanager
+    async def admit(
+        self, devices: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[None]:
+        """
+        Admite una petición de ingesta o la rechaza de inmediato
+
+        Args:
+            devices: Lecturas por device_id que trae la petición (None para
+                aplicar solo el límite de peticiones en curso)
+
+        Raises:
+            AdmissionRejectedException: 429 si un dispositivo excede su
+                tasa, 503 si el servidor está saturado
+        """
+        taken = self._take_tokens(devices) if devices else []
+
+        if self._slots is not None:
+            started = time.perf_counter()
+            try:
+                if self._slots.locked():
+                    await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+                else:
+                    await self._slots.acquire()
+            except asyncio.TimeoutError:
+                self._refund_tokens(taken)
+                self._overloaded += 1
+                raise AdmissionRejectedException(
+                    "Servidor saturado, reintente más tarde",
+                    status_code=503,
+                    retry_after=1,
+                )
+            self.queue_time_ms.record((time.perf_counter() - started) * 1000)
+
+        self._admitted += 1
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def _take_tokens(self, devices: Dict[str, int]) -> List[Tuple[str, float]]:
+        """Consume tokens de cada dispositivo (todo o nada)"""
+        if self.device_rate <= 0 or self.device_burst <= 0:
+            return []
+
+        now = time.monotonic()
+        requests = []
+        for device_id, count in devices.items():
+            tokens, last = self._buckets.get(device_id, (self.device_burst, now))
+            tokens = min(self.device_burst, tokens + (now - last) * self.device_rate)
+            # Un lote mayor que la ráfaga se admite con el bucket lleno
+            needed = min(count, self.device_burst)
+            if tokens < needed:
+                self._rate_limited += 1
+                retry_after = math.ceil((needed - tokens) / self.device_rate)
+                raise AdmissionRejectedException(
+                    f"Límite de lecturas excedido para el dispositivo {device_id}",
+                    status_code=429,
+                    retry_after=max(1, retry_after),
+                )
+            requests.append((device_id, tokens, needed))
+
+        taken = []
+        for device_id, tokens, needed in requests:
+            self._buckets[device_id] = (tokens - needed, now)
+            self._buckets.move_to_end(device_id)
+            taken.append((device_id, needed))
+
+        while len(self._buckets) > self.max_devices:
+            self._buckets.popitem(last=False)
+        return taken
+
+    def _refund_tokens(self, taken: List[Tuple[str, float]]):
+        """Devuelve los tokens de una petición que no fue admitida"""
+        for device_id, needed in taken:
+            bucket = self._buckets.get(device_id)
+            if bucket is not None:
+                tokens, last = bucket
+                self._buckets[device_id] = (
+                    min(self.device_burst, tokens + needed),
+                    last,
+                )
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de admisión"""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "admitted": self._admitted,
+            "rejected_rate_limited": self._rate_limited,
+            "rejected_overloaded": self._overloaded,
+            "tracked_devices": len(self._buckets),
+            "queue_time_ms": self.queue_time_ms.to_dict(),
+        }
@@ -0,0 +1,133 @@
+"""
+Formato binario compacto para lecturas del ESP32
+
+Cada frame (little-endian) tiene la forma:
+
+    cabecera   <2sBBH  magic b"FS", versión, largo del device_id, n° de muestras
+    device_id  bytes UTF-8 (1..255)
+    muestras   n × <IfIff  epoch (s), flow_rate, pulse_count, temperatura, presión
+
+La temperatura y la presión son opcionales: NaN indica ausencia. Un cuerpo
+puede contener varios frames concatenados. Una muestra ocupa 20 bytes,
+frente a ~130 bytes del JSON equivalente.
+"""
+import math
+import struct
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+from src.application.dto.flow_reading_dto import CreateFlowReadingDTO
+
+MAGIC = b"FS"
+VERSION = 1
+HEADER = struct.Struct("<2sBBH")
+SAMPLE = struct.Struct("<IfIff")
+
+# (epoch, flow_rate, pulse_count, temperature, pressure)
+Sample = Tuple[int, float, int, Optional[float], Optional[float]]
+
+
+def _optional(value: float) -> Optional[float]:
+    """Convierte NaN (campo ausente) a None"""
+    if math.isnan(value):
+        return None
+    return round(value, 4)
+
+
+def decode_frames(data: bytes, unit: str = "L/min") -> List[CreateFlowReadingDTO]:
+    """
+    Decodifica uno o más frames binarios a DTOs de lectura
+
+    Args:
+        data: Cuerpo de la petición
+        unit: Unidad de medida asignada a las lecturas
+
+    Returns:
+        Lecturas en el orden en que aparecen en los frames
+
+    Raises:
+        ValueError: Si algún frame está mal formado
+    """
+    view = memoryview(data)
+    size = len(view)
+    offset = 0
+    dtos = []
+
+    if size == 0:
+        raise ValueError("El cuerpo binario está vacío")
+
+    while offset < size:
+        if size - offset < HEADER.size:
+            raise ValueError(f"Cabecera truncada en el byte {offset}")
+
+        magic, version, id_length, count = HEADER.unpack_from(view, offset)
+        if magic != MAGIC:
+            raise ValueError(f"Magic inválido en el byte {offset}")
+        if version != VERSION:
+            raise ValueError(f"Versión de frame no soportada: {version}")
+        if id_length == 0:
+            raise ValueError("El device_id no puede estar vacío")
+        offset += HEADER.size
+
+        samples_start = offset + id_length
+        samples_end = samples_start + count * SAMPLE.size
+        if samples_end > size:
+            raise ValueError(f"Frame truncado: se esperaban {count} muestras")
+
+        try:
+            device_id = bytes(view[offset:samples_start]).decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError("device_id no es UTF-8 válido")
+
+        for epoch, flow_rate, pulse_count, temperature, pressure in SAMPLE.iter_unpack(
+            view[samples_start:samples_end]
+        ):
+            if math.isnan(flow_rate):
+                raise ValueError("flow_rate no puede ser NaN")
+            dtos.append(
+                CreateFlowReadingDTO(
+                    device_id=device_id,
+                    flow_rate=round(flow_rate, 4),
+                    pulse_count=pulse_count,
+                    unit=unit,
+                    temperature=_optional(temperature),
+                    pressure=_optional(pressure),
+                    timestamp=datetime.fromtimestamp(epoch, tz=timezone.utc),
+                )
+            )
+
+        offset = samples_end
+
+    return dtos
+
+
+def encode_frame(device_id: str, samples: Iterable[Sample]) -> bytes:
+    """
+    Codifica un frame binario (útil para simuladores y pruebas)
+
+    Args:
+        device_id: ID del dispositivo
+        samples: Muestras (epoch, flow_rate, pulse_count, temperatura, presión)
+
+    Returns:
+        Frame listo para enviar
+    """
+    device_bytes = device_id.encode("utf-8")
+    if not 0 < len(device_bytes) <= 255:
+        raise ValueError("El device_id debe tener entre 1 y 255 bytes")
+
+    body = bytearray()
+    count = 0
+    for epoch, flow_rate, pulse_count, temperature, pressure in samples:
+        body += SAMPLE.pack(
+            int(epoch),
+            flow_rate,
+            pulse_count,
+            math.nan if temperature is None else temperature,
+            math.nan if pressure is None else pressure,
+        )
+        count += 1
+
+    if count > 0xFFFF:
+        raise ValueError("Un frame admite como máximo 65535 muestras")
+
+    return HEADER.pack(MAGIC, VERSION, len(device_bytes), count) + device_bytes + body
@@ -0,0 +1,197 @@
+import asyncio
+import zlib
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from src.application.use_cases.record_flow_reading import RecordFlowReadingUseCase
+from src.application.dto.flow_reading_dto import (
+    CreateFlowReadingDTO,
+    FlowReadingResponseDTO,
+)
+
+
+@dataclass
+class _IngestJob:
+    """Trabajo encolado en uno o más shards"""
+
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    future: asyncio.Future
+    arrivals: int = 1  # shards que deben alcanzar el trabajo antes de ejecutarlo
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class IngestionDispatcher:
+    """
+    Despachador de ingesta con colas por shard
+
+    Las lecturas se asignan a un shard según un hash estable del device_id,
+    y cada shard tiene un worker que las procesa de una en una. Así las
+    lecturas de un mismo dispositivo se procesan en orden estricto (sin
+    carreras en el cálculo de total_volume) mientras que dispositivos de
+    shards distintos avanzan en paralelo.
+
+    El orden solo se necesita hasta que la lectura queda entregada al
+    repositorio: una lectura durable ocupa el shard mientras se calcula su
+    volumen y se encola, y su commit se espera fuera del worker. Con la
+    escritura diferida, el buffer agrupa así lecturas de todos los
+    dispositivos en lugar de una por shard.
+
+    Expone la misma interfaz que RecordFlowReadingUseCase (`execute` y
+    `execute_batch`), por lo que puede usarse en su lugar.
+
+    Los workers no heredan el contexto de la petición que encoló el
+    trabajo: con `unit_of_work` cada trabajo se ejecuta en su propia
+    unidad de trabajo, que se confirma antes de responder.
+    """
+
+    def __init__(
+        self,
+        record_flow_reading_use_case: RecordFlowReadingUseCase,
+        num_shards: int = 8,
+        max_queue_size: int = 1000,
+        unit_of_work: Optional[Callable[[], Any]] = None,
+    ):
+        if num_shards <= 0:
+            raise ValueError("num_shards debe ser mayor que 0")
+        self.record_flow_reading_use_case = record_flow_reading_use_case
+        self.unit_of_work = unit_of_work
+        self.num_shards = num_shards
+        self.max_queue_size = max_queue_size
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max_queue_size) for _ in range(num_shards)
+        ]
+        self._workers: List[asyncio.Task] = []
+        # Los trabajos multi-shard se encolan atómicamente para que todos
+        # los shards los vean en el mismo orden
+        self._enqueue_lock = asyncio.Lock()
+        self._processed = [0] * num_shards
+        self._failed = [0] * num_shards
+
+    @property
+    def is_running(self) -> bool:
+        """Indica si los workers están activos"""
+        return bool(self._workers)
+
+    def shard_for(self, device_id: str) -> int:
+        """Obtiene el shard asignado a un dispositivo"""
+        return zlib.crc32(device_id.encode("utf-8")) % self.num_shards
+
+    async def start(self):
+        """Inicia un worker por shard"""
+        if self.is_running:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(shard)) for shard in range(self.num_shards)
+        ]
+
+    async def stop(self):
+        """Procesa los trabajos pendientes y detiene los workers"""
+        if not self.is_running:
+            return
+        for queue in self._queues:
+            await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def execute(
+        self, dto: CreateFlowReadingDTO, durable: bool = True
+    ) -> FlowReadingResponseDTO:
+        """Registra una lectura en el shard de su dispositivo"""
+        if not self.is_running:
+            return await self.record_flow_reading_use_case.execute(dto, durable)
+
+        shards = [self.shard_for(dto.device_id)]
+        if not durable:
+            return await self._submit(
+                self.record_flow_reading_use_case.execute, (dto, False), shards
+            )
+
+        # El shard se libera al encolar la lectura; el commit se espera aquí
+        committed = await self._submit(
+            self.record_flow_reading_use_case.enqueue, (dto,), shards
+        )
+        return await committed
+
+    async def execute_batch(
+        self, dtos: List[CreateFlowReadingDTO]
+    ) -> List[FlowReadingResponseDTO]:
+        """
+        Registra un lote de lecturas
+
+        Si el lote abarca varios shards, el trabajo espera a ser el siguiente
+        en todos ellos antes de ejecutarse, conservando el orden por
+        dispositivo y la transacción única del lote.
+        """
+        if not self.is_running or not dtos:
+            return await self.record_flow_reading_use_case.execute_batch(dtos)
+
+        shards = sorted({self.shard_for(dto.device_id) for dto in dtos})
+        return await self._submit(
+            self.record_flow_reading_use_case.execute_batch, (dtos,), shards
+        )
+
+    async def _submit(
+        self, func: Callable[..., Awaitable[Any]], args: tuple, shards: List[int]
+    ) -> Any:
+        """Encola un trabajo en los shards indicados y espera su resultado"""
+        job = _IngestJob(
+            func=func,
+            args=args,
+            future=asyncio.get_running_loop().create_future(),
+            arrivals=len(shards),
+        )
+
+        if len(shards) == 1:
+            await self._queues[shards[0]].put(job)
+        else:
+            async with self._enqueue_lock:
+                for shard in shards:
+                    await self._queues[shard].put(job)
+
+        return await job.future
+
+    async def _worker(self, shard: int):
+        """Worker de un shard: procesa sus trabajos en orden"""
+        queue = self._queues[shard]
+        while True:
+            job = await queue.get()
+            try:
+                await self._run_job(job, shard)
+            finally:
+                queue.task_done()
+
+    async def _run_job(self, job: _IngestJob, shard: int):
+        """Ejecuta el trabajo cuando todos sus shards lo han alcanzado"""
+        job.arrivals -= 1
+        if job.arrivals > 0:
+            await job.done.wait()
+            return
+
+        unit_of_work = self.unit_of_work() if self.unit_of_work else nullcontext()
+        try:
+            async with unit_of_work:
+                result = await job.func(*job.args)
+        except Exception as e:
+            self._failed[shard] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._processed[shard] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            job.done.set()
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de los shards"""
+        return {
+            "running": self.is_running,
+            "num_shards": self.num_shards,
+            "queue_capacity": self.max_queue_size,
+            "queue_lengths": [queue.qsize() for queue in self._queues],
+            "processed": list(self._processed),
+            "failed": list(self._failed),
+        }
@@ -0,0 +1,193 @@
+import json
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from src.application.dto.flow_reading_dto import CreateFlowReadingDTO
+
+GZIP_MAGIC = b"\x1f\x8b"
+MAX_LINE_BYTES = 64 * 1024
+MAX_REPORTED_ERRORS = 20
+
+
+@dataclass
+class ImportStats:
+    """Contadores de una importación NDJSON"""
+
+    bytes_received: int = 0
+    lines: int = 0
+    accepted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, line_number: int, reason: str, count: int = 1):
+        """Registra líneas rechazadas"""
+        self.rejected += count
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Línea {line_number}: {reason}")
+
+
+def _number(record: Dict[str, Any], key: str, required: bool = True):
+    """Obtiene un campo numérico validando su tipo"""
+    value = record.get(key)
+    if value is None:
+        if required:
+            raise ValueError(f"Falta el campo {key}")
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"El campo {key} debe ser numérico")
+    return value
+
+
+def record_to_dto(record: Any) -> CreateFlowReadingDTO:
+    """
+    Valida un registro JSON (mismo formato que SensorDataInput) y lo
+    convierte al DTO interno
+
+    Raises:
+        ValueError: Si el registro no es válido
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+
+    device_id = record.get("device_id")
+    if not isinstance(device_id, str) or not device_id:
+        raise ValueError("Falta el campo device_id")
+
+    timestamp = record.get("timestamp")
+    if not isinstance(timestamp, str) or not timestamp:
+        raise ValueError("Falta el campo timestamp")
+
+    flow_rate = _number(record, "flow_rate")
+    if flow_rate < 0:
+        raise ValueError("El flujo no puede ser negativo")
+
+    pulse_count = _number(record, "pulse_count")
+    if not isinstance(pulse_count, int) or pulse_count < 0:
+        raise ValueError("pulse_count debe ser un entero no negativo")
+
+    unit = record.get("unit", "L/min")
+    if not isinstance(unit, str):
+        raise ValueError("El campo unit debe ser texto")
+
+    return CreateFlowReadingDTO(
+        device_id=device_id,
+        flow_rate=float(flow_rate),
+        pulse_count=pulse_count,
+        unit=unit,
+        temperature=_number(record, "temperature", required=False),
+        pressure=_number(record, "pressure", required=False),
+        timestamp=timestamp,
+        total_volume=None,  # Se calculará automáticamente
+    )
+
+
+async def iter_reading_batches(
+    chunks: AsyncIterator[bytes],
+    stats: ImportStats,
+    batch_size: int = 500,
+    compressed: bool = False,
+) -> AsyncIterator[List[CreateFlowReadingDTO]]:
+    """
+    Parsea incrementalmente un cuerpo NDJSON (opcionalmente gzip) y produce
+    lotes de lecturas válidas de tamaño fijo
+
+    Solo se mantiene en memoria la línea incompleta actual y el lote en
+    construcción: el gzip se descomprime en pasos de a lo sumo
+    MAX_LINE_BYTES, así que un cuerpo muy comprimido no se expande de una
+    vez. Las líneas inválidas se cuentan en `stats` y se omiten.
+
+    Args:
+        chunks: Fragmentos del cuerpo tal como llegan
+        stats: Contadores a actualizar
+        batch_size: Lecturas por lote
+        compressed: Si el cuerpo viene en gzip (también se detecta por magic)
+
+    Raises:
+        ValueError: Si el gzip está corrupto o una línea excede el máximo
+    """
+    decompressor = None
+    first_chunk = True
+    pending = b""
+    batch: List[CreateFlowReadingDTO] = []
+
+    def inflate(data: bytes) -> Iterator[bytes]:
+        nonlocal decompressor
+        while True:
+            if decompressor.eof:
+                if not data:
+                    return
+                # gzip multi-miembro: los bytes que siguen son otro miembro
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                output = decompressor.decompress(data, MAX_LINE_BYTES)
+            except zlib.error as e:
+                raise ValueError(f"Contenido gzip inválido: {e}")
+            if output:
+                yield output
+            if decompressor.eof:
+                data = decompressor.unused_data
+            else:
+                data = decompressor.unconsumed_tail
+            # Una salida completa puede dejar más datos dentro de zlib
+            if not data and len(output) < MAX_LINE_BYTES:
+                return
+
+    def parse_lines(data: bytes):
+        nonlocal pending
+        # El largo de la línea incompleta se verifica antes de concatenar
+        first_end = data.find(b"\n")
+        line_bytes = len(pending) + (len(data) if first_end < 0 else first_end)
+        if line_bytes > MAX_LINE_BYTES:
+            raise ValueError(
+                f"La línea {stats.lines + 1} excede {MAX_LINE_BYTES} bytes"
+            )
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            parse_line(line)
+        if len(pending) > MAX_LINE_BYTES:
+            raise ValueError(
+                f"La línea {stats.lines + 1} excede {MAX_LINE_BYTES} bytes"
+            )
+
+    def parse_line(line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        stats.lines += 1
+        try:
+            batch.append(record_to_dto(json.loads(line)))
+        except (ValueError, UnicodeDecodeError) as e:
+            stats.reject(stats.lines, str(e))
+        except RecursionError:
+            stats.reject(stats.lines, "JSON con demasiados niveles de anidamiento")
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        stats.bytes_received += len(chunk)
+
+        if first_chunk:
+            first_chunk = False
+            if compressed or chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        for data in inflate(chunk) if decompressor is not None else [chunk]:
+            parse_lines(data)
+
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                del batch[:batch_size]
+
+    if decompressor is not None:
+        for data in inflate(b""):
+            parse_lines(data)
+        if not decompressor.eof:
+            raise ValueError("Contenido gzip truncado")
+    parse_line(pending)
+    pending = b""
+
+    while batch:
+        yield batch[:batch_size]
+        del batch[:batch_size]
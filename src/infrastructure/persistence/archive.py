@@ -0,0 +1,376 @@
+import json
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote
+import numpy as np
+from src.domain.entities.flow_reading import FlowReading
+from src.domain.value_objects.metrics import FlowAggregate
+
+# Columnas de un segmento y su tipo en disco
+COLUMNS = {
+    "id": np.int64,
+    "timestamp": np.int64,  # microsegundos desde 1970-01-01 (sin zona)
+    "flow_rate": np.float32,
+    "total_volume": np.float64,
+    "pulse_count": np.int64,  # -1 = sin contador
+    "temperature": np.float32,  # NaN = sin dato
+    "pressure": np.float32,  # NaN = sin dato
+    "unit": np.uint8,  # índice en meta.json["units"]
+}
+_NO_PULSE = -1
+# Directorio de un segmento: AAAAMMDD.versión
+_SEGMENT_NAME = re.compile(r"^(\d{8})\.(\d+)$")
+
+
+def to_epoch_us(timestamp: datetime) -> int:
+    """Timestamp (sin zona) en microsegundos desde 1970-01-01"""
+    return int(np.datetime64(timestamp.replace(tzinfo=None), "us").astype(np.int64))
+
+
+def _day_start(timestamp: datetime) -> datetime:
+    """Inicio del día de un timestamp"""
+    return datetime.combine(timestamp.date(), datetime.min.time())
+
+
+def _fsync_dir(path: Path):
+    """Persiste las entradas de un directorio (archivos nuevos y renames)"""
+    if os.name == "nt":
+        return  # Windows no permite abrir directorios
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _make_dirs(path: Path):
+    """Crea `path` y los padres que falten, persistiendo cada entrada nueva"""
+    missing = []
+    while not path.is_dir():
+        missing.append(path)
+        path = path.parent
+    for directory in reversed(missing):
+        directory.mkdir(exist_ok=True)
+        _fsync_dir(directory.parent)
+
+
+@dataclass
+class ArchiveSegment:
+    """
+    Lecturas de un dispositivo en un día, como columnas NumPy
+
+    Las columnas cargadas desde disco son vistas memory-mapped de solo
+    lectura: recortarlas o agregarlas no copia datos.
+    """
+
+    device_id: str
+    day: datetime
+    columns: Dict[str, np.ndarray]
+    units: List[Optional[str]]
+
+    def __len__(self) -> int:
+        return len(self.columns["timestamp"])
+
+    def between(self, lo: int, hi: int) -> "ArchiveSegment":
+        """Lecturas con timestamp en [lo, hi) (microsegundos epoch)"""
+        timestamps = self.columns["timestamp"]
+        first, last = np.searchsorted(timestamps, [lo, hi], side="left")
+        return ArchiveSegment(
+            self.device_id,
+            self.day,
+            {name: column[first:last] for name, column in self.columns.items()},
+            self.units,
+        )
+
+    def chunks(self, size: int) -> Iterator["ArchiveSegment"]:
+        """Divide el segmento en trozos de hasta `size` lecturas (vistas, sin copiar)"""
+        for first in range(0, len(self), size):
+            yield ArchiveSegment(
+                self.device_id,
+                self.day,
+                {
+                    name: column[first : first + size]
+                    for name, column in self.columns.items()
+                },
+                self.units,
+            )
+
+    def aggregate(self) -> FlowAggregate:
+        """Agregado de las lecturas con operaciones vectorizadas"""
+        if len(self) == 0:
+            return FlowAggregate()
+        flow = self.columns["flow_rate"].astype(np.float64)
+        return FlowAggregate(
+            count=len(flow),
+            sum_flow=float(flow.sum()),
+            sum_sq_flow=float(np.dot(flow, flow)),
+            min_flow=float(flow.min()),
+            max_flow=float(flow.max()),
+            last_timestamp=self.columns["timestamp"][-1:]
+            .astype("datetime64[us]")
+            .tolist()[0],
+            last_total_volume=float(self.columns["total_volume"][-1]),
+        )
+
+    def to_entities(self) -> List[FlowReading]:
+        """Materializa las lecturas como entidades"""
+        c = self.columns
+        columns = zip(
+            c["id"].tolist(),
+            c["flow_rate"].astype(np.float64).tolist(),
+            c["total_volume"].tolist(),
+            c["timestamp"].astype("datetime64[us]").tolist(),
+            c["pulse_count"].tolist(),
+            c["unit"].tolist(),
+            c["temperature"].astype(np.float64).tolist(),
+            c["pressure"].astype(np.float64).tolist(),
+        )
+        readings = []
+        for reading_id, flow, volume, timestamp, pulses, unit, temp, press in columns:
+            readings.append(
+                FlowReading(
+                    id=reading_id,
+                    device_id=self.device_id,
+                    flow_rate=flow,
+                    total_volume=volume,
+                    timestamp=timestamp,
+                    pulse_count=None if pulses == _NO_PULSE else pulses,
+                    unit=self.units[unit],
+                    # NaN marca los valores ausentes
+                    temperature=None if temp != temp else temp,
+                    pressure=None if press != press else press,
+                )
+            )
+        return readings
+
+
+class FlowReadingArchive:
+    """
+    Archivo columnar en disco de lecturas antiguas
+
+    Cada dispositivo y día es un segmento: un directorio con un `.npy` por
+    columna (flow_rate en float32, timestamps en int64) ordenado por
+    timestamp, más un `meta.json`:
+
+        <raíz>/<device_id>/<AAAA>/<AAAAMMDD>.<versión>/flow_rate.npy
+
+    Los segmentos no se modifican: agregar lecturas a un día ya archivado
+    escribe una versión nueva y borra la anterior, y los lectores usan
+    siempre la versión más alta. Al consultar, las columnas se abren con
+    memory-map, así que recorrer un rango largo no materializa filas.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._segments_written = 0
+        self._rows_archived = 0
+        self._segments_read = 0
+        self._rows_read = 0
+
+    # ============================================
+    # Escritura
+    # ============================================
+
+    def write(self, device_id: str, day: datetime, readings: Iterable) -> int:
+        """
+        Archiva lecturas (entidades o filas) de un dispositivo en un día
+
+        Si el día ya tiene un segmento, se combinan; las lecturas cuyo ID ya
+        está archivado se omiten, de modo que repetir la operación tras una
+        interrupción no duplica datos. Los archivos se sincronizan a disco
+        antes de retornar.
+
+        Returns:
+            Cantidad de lecturas nuevas archivadas
+        """
+        readings = list(readings)
+        existing = self._load_latest(device_id, day)
+        version = 0
+        if existing is not None:
+            version = existing[1]
+            known = set(existing[0].columns["id"].tolist())
+            readings = [r for r in readings if r.id not in known]
+        if not readings:
+            return 0
+
+        units = list(existing[0].units) if existing else []
+        columns = self._to_columns(readings, units)
+        if existing is not None:
+            columns = {
+                name: np.concatenate([existing[0].columns[name], column])
+                for name, column in columns.items()
+            }
+        order = np.argsort(columns["timestamp"], kind="stable")
+        columns = {name: column[order] for name, column in columns.items()}
+
+        year_dir = self._device_dir(device_id) / f"{day:%Y}"
+        _make_dirs(year_dir)
+        tmp = year_dir / f".tmp-{day:%Y%m%d}-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        for name, column in columns.items():
+            with open(tmp / f"{name}.npy", "wb") as f:
+                np.save(f, column.astype(COLUMNS[name], copy=False))
+                f.flush()
+                os.fsync(f.fileno())
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"device_id": device_id, "rows": len(order), "units": units}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(tmp)
+
+        # Publicar la versión nueva con un rename atómico y borrar las viejas;
+        # el rename es durable recién tras el fsync del directorio
+        os.replace(tmp, year_dir / f"{day:%Y%m%d}.{version + 1}")
+        _fsync_dir(year_dir)
+        for old in self._versions(year_dir, day)[:-1]:
+            shutil.rmtree(old, ignore_errors=True)
+
+        self._segments_written += 1
+        self._rows_archived += len(readings)
+        return len(readings)
+
+    @staticmethod
+    def _to_columns(readings: List, units: List[Optional[str]]) -> Dict[str, np.ndarray]:
+        """Convierte lecturas a columnas; agrega a `units` las unidades nuevas"""
+        count = len(readings)
+        unit_codes = []
+        for r in readings:
+            if r.unit not in units:
+                units.append(r.unit)
+            unit_codes.append(units.index(r.unit))
+        return {
+            "id": np.fromiter((r.id for r in readings), np.int64, count),
+            "timestamp": np.array(
+                [r.timestamp.replace(tzinfo=None) for r in readings],
+                dtype="datetime64[us]",
+            ).astype(np.int64),
+            "flow_rate": np.fromiter((r.flow_rate for r in readings), np.float32, count),
+            "total_volume": np.fromiter(
+                (r.total_volume for r in readings), np.float64, count
+            ),
+            "pulse_count": np.fromiter(
+                (_NO_PULSE if r.pulse_count is None else r.pulse_count for r in readings),
+                np.int64,
+                count,
+            ),
+            "temperature": np.fromiter(
+                (np.nan if r.temperature is None else r.temperature for r in readings),
+                np.float32,
+                count,
+            ),
+            "pressure": np.fromiter(
+                (np.nan if r.pressure is None else r.pressure for r in readings),
+                np.float32,
+                count,
+            ),
+            "unit": np.array(unit_codes, dtype=np.uint8),
+        }
+
+    # ============================================
+    # Lectura
+    # ============================================
+
+    def scan(self, device_id: str, start: datetime, stop: datetime) -> List[ArchiveSegment]:
+        """Segmentos (recortados) con las lecturas de [start, stop)"""
+        start = start.replace(tzinfo=None)
+        stop = stop.replace(tzinfo=None)
+        lo, hi = to_epoch_us(start), to_epoch_us(stop)
+        segments = []
+        for day in self.days(device_id, start, stop):
+            loaded = self._load_latest(device_id, day)
+            if loaded is None:
+                continue
+            segment = loaded[0].between(lo, hi)
+            if len(segment):
+                segments.append(segment)
+                self._segments_read += 1
+                self._rows_read += len(segment)
+        return segments
+
+    def get_readings(
+        self, device_id: str, start: datetime, stop: datetime
+    ) -> List[FlowReading]:
+        """Lecturas archivadas de [start, stop), ordenadas por timestamp"""
+        readings = []
+        for segment in self.scan(device_id, start, stop):
+            readings.extend(segment.to_entities())
+        return readings
+
+    def aggregate(self, device_id: str, start: datetime, stop: datetime) -> FlowAggregate:
+        """Agregado de las lecturas archivadas de [start, stop) sin materializarlas"""
+        aggregate = FlowAggregate()
+        for segment in self.scan(device_id, start, stop):
+            aggregate.merge(segment.aggregate())
+        return aggregate
+
+    def days(self, device_id: str, start: datetime, stop: datetime) -> List[datetime]:
+        """Días archivados de un dispositivo que se solapan con [start, stop)"""
+        device_dir = self._device_dir(device_id)
+        first_day = _day_start(start)
+        days = set()
+        for year in range(start.year, stop.year + 1):
+            year_dir = device_dir / str(year)
+            if not year_dir.is_dir():
+                continue
+            for name in os.listdir(year_dir):
+                match = _SEGMENT_NAME.match(name)
+                if match:
+                    day = datetime.strptime(match.group(1), "%Y%m%d")
+                    if first_day <= day < stop:
+                        days.add(day)
+        return sorted(days)
+
+    def _load_latest(self, device_id: str, day: datetime):
+        """(segmento, versión) de la versión más reciente de un día, o None"""
+        year_dir = self._device_dir(device_id) / f"{day:%Y}"
+        # Un escritor puede reemplazar la versión mientras se abre: reintentar
+        for _ in range(3):
+            versions = self._versions(year_dir, day)
+            if not versions:
+                return None
+            path = versions[-1]
+            try:
+                with open(path / "meta.json", encoding="utf-8") as f:
+                    meta = json.load(f)
+                columns = {
+                    name: np.load(path / f"{name}.npy", mmap_mode="r")
+                    for name in COLUMNS
+                }
+            except FileNotFoundError:
+                continue
+            segment = ArchiveSegment(device_id, day, columns, meta["units"])
+            return segment, int(path.name.split(".")[1])
+        return None
+
+    @staticmethod
+    def _versions(year_dir: Path, day: datetime) -> List[Path]:
+        """Versiones existentes del segmento de un día, de la más vieja a la más nueva"""
+        if not year_dir.is_dir():
+            return []
+        prefix = f"{day:%Y%m%d}"
+        versions = []
+        for name in os.listdir(year_dir):
+            match = _SEGMENT_NAME.match(name)
+            if match and match.group(1) == prefix:
+                versions.append((int(match.group(2)), year_dir / name))
+        return [path for _, path in sorted(versions)]
+
+    def _device_dir(self, device_id: str) -> Path:
+        """Directorio de un dispositivo (el ID se escapa para usarlo como nombre)"""
+        return self.root / quote(device_id, safe="")
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas del archivo"""
+        return {
+            "root": str(self.root),
+            "segments_written": self._segments_written,
+            "rows_archived": self._rows_archived,
+            "segments_read": self._segments_read,
+            "rows_read": self._rows_read,
+        }
@@ -1,12 +1,29 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+)
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, Enum as SQLEnum
+from sqlalchemy import inspect
 from datetime import datetime
+from typing import Callable, Dict, List, Optional
 from src.domain.entities.filling import FillingStatus
 from src.domain.entities.pump import PumpStatus
+from src.infrastructure.persistence.archive import FlowReadingArchive
+from src.infrastructure.persistence.partitions import FlowReadingPartitions
+from src.infrastructure.persistence.pool_telemetry import MonitoredQueuePool, PoolTelemetry
+from src.infrastructure.persistence.rollups import FlowRollups
+from src.infrastructure.persistence.sqlite_tuning import SQLitePragmas
+from src.infrastructure.persistence.unit_of_work import UnitOfWork, current_unit_of_work
 
 Base = declarative_base()
 
+IDEMPOTENCY_INDEX = "uq_flow_readings_device_ts_pulse"
+
 
 class FlowReadingModel(Base):
     """Modelo de base de datos para lecturas de flujo"""
@@ -23,6 +40,39 @@ class FlowReadingModel(Base):
     temperature = Column(Float, nullable=True)
     pressure = Column(Float, nullable=True)
 
+    __table_args__ = (
+        # Clave de idempotencia: los reintentos del dispositivo se descartan
+        Index(
+            IDEMPOTENCY_INDEX,
+            "device_id",
+            "timestamp",
+            "pulse_count",
+            unique=True,
+        ),
+    )
+
+
+class FlowRollupModel(Base):
+    """Agregados de lecturas por dispositivo e intervalo (minuto/hora/día)"""
+
+    __tablename__ = "flow_rollups"
+
+    device_id = Column(String, primary_key=True)
+    resolution = Column(String, primary_key=True)  # "minute", "hour" o "day"
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum_flow = Column(Float, nullable=False)
+    sum_sq_flow = Column(Float, nullable=False)
+    min_flow = Column(Float, nullable=False)
+    max_flow = Column(Float, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    last_total_volume = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Retención: borrar los rollups de una resolución anteriores a una fecha
+        Index("ix_flow_rollups_resolution_bucket", "resolution", "bucket_start"),
+    )
+
 
 class FillingModel(Base):
     """Modelo de base de datos para llenados"""
@@ -40,6 +90,11 @@ class FillingModel(Base):
     duration_seconds = Column(Float, nullable=True)
     avg_flow_rate = Column(Float, nullable=True)
 
+    __table_args__ = (
+        # Paginación por clave: llenados de un dispositivo por (start_time, id)
+        Index("ix_fillings_device_start", "device_id", "start_time", "id"),
+    )
+
 
 class PumpModel(Base):
     """Modelo de base de datos para bombas"""
@@ -58,19 +113,126 @@ class PumpModel(Base):
 
 
 class DatabaseManager:
-    """Gestor de base de datos"""
+    """
+    Gestor de base de datos
+
+    `engine` es el primario: recibe todas las escrituras. Con `read_urls`
+    se crea además un engine por réplica, cada uno con su propio pool, y
+    `get_read_session` reparte las lecturas entre ellas (round-robin), de
+    modo que las consultas pesadas no compiten por conexiones con la
+    ingesta. Sin réplicas, las lecturas usan el primario.
 
-    def __init__(self, database_url: str):
+    Dentro de una unidad de trabajo (`unit_of_work`) las sesiones que
+    entrega son la sesión compartida de la petición.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        partitioned: bool = False,
+        partition_months_ahead: int = 2,
+        archive_dir: Optional[str] = None,
+        sqlite_pragmas: Optional[SQLitePragmas] = None,
+        read_urls: Optional[List[str]] = None,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        read_pool_size: Optional[int] = None,
+        read_max_overflow: Optional[int] = None,
+        pool_timeout: Optional[float] = None,
+        pool_pre_ping: bool = False,
+        pool_recycle: Optional[int] = None,
+    ):
         self.database_url = database_url
-        self.engine = create_async_engine(database_url, echo=False)
+        # Opciones comunes a los pools del primario y de las réplicas
+        self.pool_timeout = pool_timeout
+        self.pool_pre_ping = pool_pre_ping
+        self.pool_recycle = pool_recycle
+        self.pool_telemetry: Dict[str, PoolTelemetry] = {}
+        self.engine = self._create_engine(
+            database_url, sqlite_pragmas, pool_size, max_overflow
+        )
         self.async_session = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        # Réplicas de lectura (opcional)
+        self.read_engines = [
+            self._create_engine(url, sqlite_pragmas, read_pool_size, read_max_overflow)
+            for url in read_urls or []
+        ]
+        self._read_sessions = [
+            async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for engine in self.read_engines
+        ]
+        self._next_reader = 0
+        # Particionado mensual de flow_readings (opcional)
+        self.partitions = FlowReadingPartitions(
+            FlowReadingModel.__table__,
+            self.engine.dialect.name,
+            enabled=partitioned,
+            months_ahead=partition_months_ahead,
+        )
+        # Agregados por minuto/hora/día mantenidos en la ingesta
+        self.rollups = FlowRollups(
+            FlowRollupModel.__table__, self.partitions, self.engine.dialect.name
+        )
+        # Archivo columnar de lecturas antiguas (opcional)
+        self.archive = FlowReadingArchive(archive_dir) if archive_dir else None
+        self.rollups.archive = self.archive
 
-    async def create_tables(self):
-        """Crea las tablas en la base de datos"""
+    async def create_tables(self, check_rollups: bool = True):
+        """
+        Crea las tablas en la base de datos y las particiones próximas
+
+        Args:
+            check_rollups: Verificar que flow_rollups cubra las lecturas
+                existentes (los scripts que los recalculan lo omiten)
+        """
         async with self.engine.begin() as conn:
+            if self.partitions.native:
+                await self.partitions.create_parent(conn)
             await conn.run_sync(Base.metadata.create_all)
+            await self._check_idempotency_index(conn)
+            if self.partitions.enabled:
+                await self.partitions.check_migrated(conn)
+                await self.partitions.prepare(conn)
+            if check_rollups:
+                await self._check_rollup_coverage(conn)
+
+    async def _check_idempotency_index(self, conn: AsyncConnection):
+        """
+        Verifica que flow_readings tenga la clave de idempotencia
+
+        create_all no agrega índices a tablas existentes, y sin el índice
+        único cada INSERT ... ON CONFLICT de la ingesta falla.
+        """
+        indexes = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).get_indexes(
+                FlowReadingModel.__tablename__
+            )
+        )
+        if not any(index["name"] == IDEMPOTENCY_INDEX for index in indexes):
+            raise RuntimeError(
+                f"flow_readings no tiene el índice único {IDEMPOTENCY_INDEX}; "
+                "ejecute scripts/migrate_add_reading_idempotency_key.py"
+            )
+
+    async def _check_rollup_coverage(self, conn: AsyncConnection):
+        """
+        Verifica que flow_rollups cubra las lecturas de flow_readings
+
+        Las métricas de flujo salen solo de los rollups: una base de datos
+        con lecturas anteriores a ellos reportaría volúmenes nulos o
+        parciales hasta recalcularlos.
+        """
+        uncovered = await self.rollups.uncovered_devices(conn)
+        if uncovered:
+            raise RuntimeError(
+                "flow_rollups no cubre las lecturas de "
+                f"{', '.join(uncovered[:5])}"
+                f"{' y otros' if len(uncovered) > 5 else ''}; "
+                "ejecute scripts/rebuild_flow_rollups.py"
+            )
+        self.rollups.verified = True
 
     async def drop_tables(self):
         """Elimina las tablas de la base de datos"""
@@ -78,5 +240,112 @@ class DatabaseManager:
             await conn.run_sync(Base.metadata.drop_all)
 
     def get_session(self) -> AsyncSession:
-        """Obtiene una sesión de base de datos"""
+        """Obtiene una sesión de base de datos (primario)"""
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None and not unit_of_work.read_only:
+            return unit_of_work.borrow()
         return self.async_session()
+
+    def get_read_session(self, primary: bool = False) -> AsyncSession:
+        """
+        Obtiene una sesión de solo lectura en la siguiente réplica
+
+        Args:
+            primary: Leer del primario (read-your-writes): para estado que
+                se acaba de escribir y que una réplica puede no tener aún
+        """
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None and not (unit_of_work.read_only and primary):
+            return unit_of_work.borrow()
+        return self.new_session(read_only=not primary)
+
+    def new_session(self, read_only: bool = False) -> AsyncSession:
+        """Sesión nueva, fuera de cualquier unidad de trabajo"""
+        if not read_only or not self._read_sessions:
+            return self.async_session()
+        sessionmaker = self._read_sessions[self._next_reader]
+        self._next_reader = (self._next_reader + 1) % len(self._read_sessions)
+        return sessionmaker()
+
+    def unit_of_work(self, read_only: bool = False) -> UnitOfWork:
+        """
+        Unidad de trabajo: una sesión y una transacción para toda la petición
+
+        Args:
+            read_only: Compartir una sesión de réplica en lugar del primario
+        """
+        return UnitOfWork(self, read_only=read_only)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Ejecuta `callback` tras confirmar la unidad de trabajo actual (o ya)"""
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None and not unit_of_work.read_only:
+            unit_of_work.after_commit(callback)
+        else:
+            callback()
+
+    def after_rollback(self, callback: Callable[[], None]):
+        """
+        Ejecuta `callback` si se revierte la unidad de trabajo actual
+
+        Sin unidad de trabajo cada escritura se confirma al instante y no
+        hay nada que revertir: no hace nada.
+        """
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None and not unit_of_work.read_only:
+            unit_of_work.after_rollback(callback)
+
+    async def dispose(self):
+        """Cierra las conexiones del primario y de las réplicas"""
+        await self.engine.dispose()
+        for engine in self.read_engines:
+            await engine.dispose()
+
+    def _create_engine(
+        self,
+        url: str,
+        sqlite_pragmas: Optional[SQLitePragmas],
+        pool_size: Optional[int],
+        max_overflow: Optional[int],
+    ) -> AsyncEngine:
+        """Crea un engine con su pool y, en SQLite, el perfil de PRAGMAs"""
+        options = {"pool_pre_ping": self.pool_pre_ping}
+        if self.pool_recycle is not None:
+            options["pool_recycle"] = self.pool_recycle
+
+        # SQLite en memoria usa un pool de una sola conexión sin tamaño
+        queued = ":memory:" not in url
+        if make_url(url).get_backend_name() == "sqlite":
+            # aiosqlite abre una conexión por sesión (NullPool) salvo que se
+            # pida un pool; con pool los PRAGMAs y la caché de páginas se
+            # conservan entre sesiones
+            queued = queued and (pool_size is not None or max_overflow is not None)
+        if queued:
+            options["poolclass"] = MonitoredQueuePool
+            for name, value in (
+                ("pool_size", pool_size),
+                ("max_overflow", max_overflow),
+                ("pool_timeout", self.pool_timeout),
+            ):
+                if value is not None:
+                    options[name] = value
+
+        engine = create_async_engine(url, echo=False, **options)
+        telemetry = PoolTelemetry(engine)
+        if queued:
+            engine.sync_engine.pool.telemetry = telemetry
+        # El primer engine es el primario; los siguientes, réplicas
+        index = len(self.pool_telemetry)
+        self.pool_telemetry["primary" if index == 0 else f"replica_{index}"] = telemetry
+
+        # PRAGMAs de producción en cada conexión (solo SQLite)
+        if sqlite_pragmas is not None and engine.dialect.name == "sqlite":
+            sqlite_pragmas.install(engine)
+        return engine
+
+    def get_pool_metrics(self) -> Dict:
+        """Obtiene la telemetría de los pools del primario y de las réplicas"""
+        return {
+            name: telemetry.get_metrics()
+            for name, telemetry in self.pool_telemetry.items()
+        }
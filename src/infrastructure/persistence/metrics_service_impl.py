@@ -1,34 +1,82 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from typing import Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Dict, Any, Awaitable, Callable, List, Optional
 from src.domain.services.metrics_service import MetricsService
-from src.domain.value_objects.metrics import FlowMetrics, FillingMetrics, BusinessMetrics
+from src.domain.value_objects.metrics import (
+    FlowMetrics,
+    FillingMetrics,
+    BusinessMetrics,
+    FlowAggregate,
+    FillingAggregate,
+)
 from src.domain.repositories.flow_reading_repository import FlowReadingRepository
 from src.domain.repositories.filling_repository import FillingRepository
-from src.domain.entities.filling import FillingStatus
+from src.application.services.daily_aggregate_cache import DailyAggregateCache
+
+ONE_DAY = timedelta(days=1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# Tramos del reporte de eficiencia: [-inf, 70), [70, 85), [85, 95], (95, inf]
+EFFICIENCY_BINS = [-np.inf, 70.0, 85.0, np.nextafter(95.0, np.inf), np.inf]
+# Etiquetas en el orden del reporte (del tramo más alto al más bajo)
+EFFICIENCY_LABELS = [
+    "excellent (>95%)",
+    "good (85-95%)",
+    "fair (70-85%)",
+    "poor (<70%)",
+]
+
+
+def _day_start(timestamp: datetime) -> datetime:
+    """Inicio del día de un timestamp"""
+    return datetime.combine(timestamp.date(), datetime.min.time())
 
 
 class MetricsServiceImpl(MetricsService):
-    """Implementación del servicio de métricas usando pandas"""
+    """
+    Implementación del servicio de métricas
+
+    Las métricas de flujo y de llenados se calculan combinando agregados
+    parciales por día (FlowAggregate, FillingAggregate): los días completos
+    salen de la caché diaria y solo se consultan los días que faltan y los
+    extremos incompletos del rango, de modo que el costo casi no depende
+    del largo del período.
+    """
 
     def __init__(
         self,
         flow_reading_repository: FlowReadingRepository,
         filling_repository: FillingRepository,
+        daily_cache: Optional[DailyAggregateCache] = None,
     ):
         self.flow_reading_repository = flow_reading_repository
         self.filling_repository = filling_repository
+        self.daily_cache = daily_cache or DailyAggregateCache()
+
+    def invalidate_flow_day(self, device_id: str, day: datetime):
+        """Descarta el agregado de lecturas de un día (listener del repositorio)"""
+        self.daily_cache.invalidate("flow", device_id, day)
+
+    def invalidate_filling_day(self, device_id: str, day: datetime):
+        """Descarta el agregado de llenados de un día (listener del repositorio)"""
+        self.daily_cache.invalidate("filling", device_id, day)
 
     async def calculate_flow_metrics(
         self, device_id: str, start_date: datetime, end_date: datetime
     ) -> FlowMetrics:
-        """Calcula métricas de flujo usando pandas"""
-        readings = await self.flow_reading_repository.get_by_date_range(
-            device_id, start_date, end_date
+        """Calcula métricas de flujo combinando agregados por día"""
+        aggregate = await self._merge_days(
+            "flow",
+            device_id,
+            start_date,
+            end_date,
+            FlowAggregate,
+            self._load_flow_days,
+            self.flow_reading_repository.get_aggregate,
         )
 
-        if not readings:
+        if aggregate.count == 0:
             return FlowMetrics(
                 avg_flow_rate=0.0,
                 min_flow_rate=0.0,
@@ -39,26 +87,14 @@ class MetricsServiceImpl(MetricsService):
                 period_end=end_date,
             )
 
-        # Convertir a DataFrame
-        df = pd.DataFrame(
-            [
-                {
-                    "flow_rate": r.flow_rate,
-                    "total_volume": r.total_volume,
-                    "timestamp": r.timestamp,
-                }
-                for r in readings
-            ]
-        )
-
         # Calcular métricas
-        avg_flow = df["flow_rate"].mean()
-        min_flow = df["flow_rate"].min()
-        max_flow = df["flow_rate"].max()
-        total_vol = df["total_volume"].iloc[-1] if len(df) > 0 else 0.0
+        avg_flow = aggregate.mean
+        min_flow = aggregate.min_flow
+        max_flow = aggregate.max_flow
+        total_vol = aggregate.last_total_volume
 
         # Calcular eficiencia (basado en estabilidad del flujo)
-        flow_std = df["flow_rate"].std()
+        flow_std = aggregate.std
         efficiency = max(0, 100 - (flow_std / avg_flow * 100)) if avg_flow > 0 else 0
 
         return FlowMetrics(
@@ -74,65 +110,29 @@ class MetricsServiceImpl(MetricsService):
     async def calculate_filling_metrics(
         self, device_id: str, start_date: datetime, end_date: datetime
     ) -> FillingMetrics:
-        """Calcula métricas de llenados usando pandas"""
-        fillings = await self.filling_repository.get_by_date_range(
-            device_id, start_date, end_date
-        )
-
-        if not fillings:
-            return FillingMetrics(
-                total_fillings=0,
-                completed_fillings=0,
-                cancelled_fillings=0,
-                avg_duration_seconds=0.0,
-                avg_volume=0.0,
-                avg_efficiency=0.0,
-                total_volume_dispensed=0.0,
-                period_start=start_date,
-                period_end=end_date,
-            )
+        """Calcula métricas de llenados combinando agregados por día"""
+        aggregate = await self._filling_aggregate(device_id, start_date, end_date)
+        return self._filling_metrics(aggregate, start_date, end_date)
 
-        # Convertir a DataFrame
-        df = pd.DataFrame(
-            [
-                {
-                    "status": f.status.value,
-                    "duration_seconds": f.duration_seconds or 0,
-                    "actual_volume": f.get_actual_volume(),
-                    "efficiency": f.get_efficiency(),
-                    "start_time": f.start_time,
-                }
-                for f in fillings
-            ]
-        )
-
-        # Calcular métricas
-        total = len(df)
-        completed = len(df[df["status"] == FillingStatus.COMPLETED.value])
-        cancelled = len(df[df["status"] == FillingStatus.CANCELLED.value])
-
-        # Filtrar solo completados para promedios
-        completed_df = df[df["status"] == FillingStatus.COMPLETED.value]
-
-        avg_duration = (
-            completed_df["duration_seconds"].mean() if len(completed_df) > 0 else 0.0
-        )
-        avg_volume = (
-            completed_df["actual_volume"].mean() if len(completed_df) > 0 else 0.0
-        )
-        avg_efficiency = (
-            completed_df["efficiency"].mean() if len(completed_df) > 0 else 0.0
-        )
-        total_volume = df["actual_volume"].sum()
+    def _filling_metrics(
+        self, aggregate: FillingAggregate, start_date: datetime, end_date: datetime
+    ) -> FillingMetrics:
+        """Construye las métricas de llenados desde un agregado"""
+        completed = aggregate.completed
 
         return FillingMetrics(
-            total_fillings=total,
+            total_fillings=aggregate.total,
             completed_fillings=completed,
-            cancelled_fillings=cancelled,
-            avg_duration_seconds=float(avg_duration),
-            avg_volume=float(avg_volume),
-            avg_efficiency=float(avg_efficiency),
-            total_volume_dispensed=float(total_volume),
+            cancelled_fillings=aggregate.cancelled,
+            # Promedios solo de los completados
+            avg_duration_seconds=(
+                aggregate.completed_duration_sum / completed if completed else 0.0
+            ),
+            avg_volume=aggregate.completed_volume_sum / completed if completed else 0.0,
+            avg_efficiency=(
+                aggregate.completed_efficiency_sum / completed if completed else 0.0
+            ),
+            total_volume_dispensed=float(aggregate.volume_sum),
             period_start=start_date,
             period_end=end_date,
         )
@@ -144,12 +144,10 @@ class MetricsServiceImpl(MetricsService):
         end_date: datetime,
         price_per_liter: float = 0.0,
     ) -> BusinessMetrics:
-        """Calcula métricas de negocio usando pandas"""
-        fillings = await self.filling_repository.get_by_date_range(
-            device_id, start_date, end_date
-        )
+        """Calcula métricas de negocio combinando agregados por día"""
+        aggregate = await self._filling_aggregate(device_id, start_date, end_date)
 
-        if not fillings:
+        if aggregate.total == 0:
             return BusinessMetrics(
                 revenue=0.0,
                 fillings_by_hour={},
@@ -159,44 +157,24 @@ class MetricsServiceImpl(MetricsService):
                 water_efficiency=0.0,
             )
 
-        # Convertir a DataFrame
-        df = pd.DataFrame(
-            [
-                {
-                    "start_time": f.start_time,
-                    "actual_volume": f.get_actual_volume(),
-                    "efficiency": f.get_efficiency(),
-                }
-                for f in fillings
-            ]
-        )
-
-        # Agregar columnas de tiempo
-        df["hour"] = pd.to_datetime(df["start_time"]).dt.hour
-        df["date"] = pd.to_datetime(df["start_time"]).dt.date
-
         # Calcular ingresos
-        total_volume = df["actual_volume"].sum()
-        revenue = total_volume * price_per_liter
-
-        # Llenados por hora
-        fillings_by_hour = df.groupby("hour").size().to_dict()
-        fillings_by_hour = {int(k): int(v) for k, v in fillings_by_hour.items()}
-
-        # Llenados por día
-        fillings_by_day = df.groupby("date").size().to_dict()
-        fillings_by_day = {str(k): int(v) for k, v in fillings_by_day.items()}
-
-        # Horas pico (top 3)
-        peak_hours_series = df.groupby("hour").size().nlargest(3)
-        peak_hours = [int(h) for h in peak_hours_series.index.tolist()]
+        revenue = aggregate.volume_sum * price_per_liter
+
+        # Llenados por hora y por día
+        fillings_by_hour = dict(sorted(aggregate.by_hour.items()))
+        fillings_by_day = dict(sorted(aggregate.by_day.items()))
+
+        # Horas pico (top 3; en empate, la hora más temprana)
+        peak_hours = [
+            hour
+            for hour, _ in sorted(
+                fillings_by_hour.items(), key=lambda item: (-item[1], item[0])
+            )[:3]
+        ]
 
         # Promedio de llenados por día
         num_days = (end_date - start_date).days + 1
-        avg_fillings_per_day = len(df) / num_days if num_days > 0 else 0
-
-        # Eficiencia promedio
-        water_efficiency = df["efficiency"].mean()
+        avg_fillings_per_day = aggregate.total / num_days if num_days > 0 else 0
 
         return BusinessMetrics(
             revenue=float(revenue),
@@ -204,7 +182,7 @@ class MetricsServiceImpl(MetricsService):
             fillings_by_day=fillings_by_day,
             peak_hours=peak_hours,
             avg_fillings_per_day=float(avg_fillings_per_day),
-            water_efficiency=float(water_efficiency),
+            water_efficiency=float(aggregate.efficiency_mean),
         )
 
     async def get_efficiency_report(
@@ -212,45 +190,36 @@ class MetricsServiceImpl(MetricsService):
     ) -> Dict[str, Any]:
         """Genera un reporte de eficiencia completo"""
         flow_metrics = await self.calculate_flow_metrics(device_id, start_date, end_date)
-        filling_metrics = await self.calculate_filling_metrics(
-            device_id, start_date, end_date
-        )
-
-        fillings = await self.filling_repository.get_by_date_range(
-            device_id, start_date, end_date
-        )
-
-        if fillings:
-            df = pd.DataFrame(
-                [
-                    {
-                        "efficiency": f.get_efficiency(),
-                        "actual_volume": f.get_actual_volume(),
-                        "target_volume": f.target_volume,
-                    }
-                    for f in fillings
-                ]
+        aggregate = await self._filling_aggregate(device_id, start_date, end_date)
+        filling_metrics = self._filling_metrics(aggregate, start_date, end_date)
+
+        if aggregate.total:
+            # Las eficiencias individuales solo hacen falta aquí: se leen
+            # aparte y no se guardan en los agregados diarios en caché.
+            # Mediana y distribución salen del mismo array
+            efficiencies = np.asarray(
+                await self.filling_repository.get_efficiencies(
+                    device_id,
+                    start_date.replace(tzinfo=None),
+                    end_date.replace(tzinfo=None),
+                ),
+                dtype=np.float64,
             )
 
             # Estadísticas de eficiencia
             efficiency_stats = {
-                "mean": float(df["efficiency"].mean()),
-                "median": float(df["efficiency"].median()),
-                "std": float(df["efficiency"].std()),
-                "min": float(df["efficiency"].min()),
-                "max": float(df["efficiency"].max()),
+                "mean": float(aggregate.efficiency_mean),
+                "median": float(np.median(efficiencies)),
+                "std": float(aggregate.efficiency_std),
+                "min": float(aggregate.efficiency_min),
+                "max": float(aggregate.efficiency_max),
             }
 
-            # Distribución de eficiencia
+            # Distribución de eficiencia (un solo histograma)
+            counts, _ = np.histogram(efficiencies, bins=EFFICIENCY_BINS)
             efficiency_distribution = {
-                "excellent (>95%)": len(df[df["efficiency"] > 95]),
-                "good (85-95%)": len(
-                    df[(df["efficiency"] >= 85) & (df["efficiency"] <= 95)]
-                ),
-                "fair (70-85%)": len(
-                    df[(df["efficiency"] >= 70) & (df["efficiency"] < 85)]
-                ),
-                "poor (<70%)": len(df[df["efficiency"] < 70]),
+                label: int(count)
+                for label, count in zip(EFFICIENCY_LABELS, counts[::-1])
             }
         else:
             efficiency_stats = {}
@@ -263,27 +232,123 @@ class MetricsServiceImpl(MetricsService):
             "efficiency_distribution": efficiency_distribution,
         }
 
+    # ============================================
+    # Agregados por día
+    # ============================================
+
+    async def _merge_days(
+        self,
+        kind: str,
+        device_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        empty: Callable[[], Any],
+        load_days: Callable[[str, datetime, datetime], Awaitable[Dict[datetime, Any]]],
+        load_range: Callable[[str, datetime, datetime], Awaitable[Any]],
+    ):
+        """
+        Agregado de [start_date, end_date] combinando días completos
+
+        Args:
+            kind: Tipo de agregado en la caché ("flow" o "filling")
+            empty: Crea un agregado vacío
+            load_days: Carga los agregados de los días completos [desde, hasta)
+            load_range: Carga el agregado de un rango [desde, hasta]
+        """
+        start = start_date.replace(tzinfo=None)
+        end = end_date.replace(tzinfo=None)
+        first_day = _day_start(start)
+        if first_day < start:
+            first_day += ONE_DAY
+        # Días completos: [first_day, stop_day)
+        stop_day = _day_start(end + ONE_MICROSECOND)
+
+        if first_day >= stop_day:
+            return await load_range(device_id, start, end)
+
+        aggregate = empty()
+        if start < first_day:
+            aggregate.merge(
+                await load_range(device_id, start, first_day - ONE_MICROSECOND)
+            )
+
+        days = []
+        day = first_day
+        while day < stop_day:
+            days.append(day)
+            day += ONE_DAY
+
+        # Los días de lecturas salen de los rollups diarios solo si
+        # create_tables verificó que cubren las lecturas (FlowRollups.verified)
+        cached = self.daily_cache.get_many(kind, device_id, days)
+        missing = [day for day in days if day not in cached]
+        if missing:
+            # Una sola consulta para todos los días que faltan
+            loaded = await load_days(device_id, missing[0], missing[-1] + ONE_DAY)
+            # El día en curso todavía cambia: no se guarda en caché
+            today = _day_start(datetime.now())
+            for day in missing:
+                day_aggregate = loaded.get(day) or empty()
+                if day < today:
+                    self.daily_cache.put(kind, device_id, day, day_aggregate)
+                cached[day] = day_aggregate
+
+        for day in days:
+            aggregate.merge(cached[day])
+
+        if stop_day <= end:
+            aggregate.merge(await load_range(device_id, stop_day, end))
+        return aggregate
+
+    async def _load_flow_days(
+        self, device_id: str, start_day: datetime, stop_day: datetime
+    ) -> Dict[datetime, FlowAggregate]:
+        """Agregados de lecturas por día desde los rollups diarios"""
+        return await self.flow_reading_repository.get_daily_aggregates(
+            device_id, start_day, stop_day
+        )
+
+    async def _filling_aggregate(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FillingAggregate:
+        """Agregado de llenados de un rango"""
+        return await self._merge_days(
+            "filling",
+            device_id,
+            start_date,
+            end_date,
+            FillingAggregate,
+            self._load_filling_days,
+            self._load_filling_range,
+        )
+
+    async def _load_filling_days(
+        self, device_id: str, start_day: datetime, stop_day: datetime
+    ) -> Dict[datetime, FillingAggregate]:
+        """Agregados de llenados por día, calculados en la base de datos"""
+        return await self.filling_repository.get_daily_aggregates(
+            device_id, start_day, stop_day
+        )
+
+    async def _load_filling_range(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FillingAggregate:
+        """Agregado de los llenados de un rango [start_date, end_date]"""
+        return await self.filling_repository.get_aggregate(
+            device_id, start_date, end_date
+        )
+
     async def detect_anomalies(
         self, device_id: str, threshold: float = 100.0
     ) -> Dict[str, Any]:
         """Detecta anomalías en las lecturas usando pandas"""
-        # Obtener últimas 1000 lecturas
-        readings = await self.flow_reading_repository.get_by_device_id(device_id, 1000)
+        # Obtener últimas 1000 lecturas como columnas (sin entidades)
+        columns = await self.flow_reading_repository.get_latest_columns(device_id, 1000)
 
-        if not readings:
+        if not len(columns):
             return {"anomalies": [], "total_anomalies": 0}
 
-        df = pd.DataFrame(
-            [
-                {
-                    "id": r.id,
-                    "flow_rate": r.flow_rate,
-                    "timestamp": r.timestamp,
-                    "total_volume": r.total_volume,
-                }
-                for r in readings
-            ]
-        )
+        df = columns.to_dataframe()
 
         # Detectar anomalías usando desviación estándar
         mean = df["flow_rate"].mean()
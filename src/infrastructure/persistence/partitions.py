@@ -0,0 +1,381 @@
+import re
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Set
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+PARTITION_PREFIX = "flow_readings_p"
+_PARTITION_NAME = re.compile(r"^flow_readings_p(\d{6})$")
+
+
+def month_key(timestamp: datetime) -> int:
+    """Clave de partición (AAAAMM) de un timestamp"""
+    return timestamp.year * 100 + timestamp.month
+
+
+def month_start(key: int) -> datetime:
+    """Inicio del mes de una clave de partición"""
+    return datetime(key // 100, key % 100, 1)
+
+
+def next_month(key: int) -> int:
+    """Clave del mes siguiente"""
+    year, month = divmod(key, 100)
+    return (year + 1) * 100 + 1 if month == 12 else key + 1
+
+
+def months_between(start: datetime, end: datetime) -> List[int]:
+    """Claves de los meses que abarca el rango [start, end]"""
+    keys = []
+    key, last = month_key(start), month_key(end)
+    while key <= last:
+        keys.append(key)
+        key = next_month(key)
+    return keys
+
+
+def _columns(timestamp_primary_key: bool = False) -> List[Column]:
+    """Columnas de flow_readings salvo el ID (sin índices)"""
+    return [
+        Column("device_id", String, nullable=False),
+        Column("flow_rate", Float, nullable=False),
+        Column("total_volume", Float, nullable=False),
+        Column(
+            "timestamp",
+            DateTime,
+            primary_key=timestamp_primary_key,
+            nullable=False,
+        ),
+        Column("pulse_count", Integer, nullable=True),
+        Column("unit", String, nullable=True),
+        Column("temperature", Float, nullable=True),
+        Column("pressure", Float, nullable=True),
+    ]
+
+
+class FlowReadingPartitions:
+    """
+    Particionado mensual de flow_readings
+
+    - PostgreSQL: flow_readings es una tabla particionada nativa
+      (PARTITION BY RANGE (timestamp)) y cada mes es una partición
+      `flow_readings_pAAAAMM`. El planner descarta las particiones fuera
+      del rango consultado.
+    - SQLite: cada mes es una tabla `flow_readings_pAAAAMM` y este objeto
+      enruta escrituras y lecturas. Los IDs se asignan desde
+      `flow_readings_id_seq` para que sean únicos entre tablas. El índice
+      único de idempotencia es por tabla mensual, así que flow_readings
+      debe quedar vacía (la migración mueve sus lecturas); se sigue
+      incluyendo en las lecturas como partición histórica.
+
+    Las particiones se crean por adelantado en `create_tables` y, si llega
+    una lectura de otro mes, al escribirla. La retención elimina
+    particiones completas con `drop_before`.
+
+    Con el particionado desactivado todas las operaciones usan
+    flow_readings tal como está.
+    """
+
+    # Cada cuánto se vuelve a consultar el catálogo (otros procesos
+    # pueden haber creado particiones)
+    REFRESH_SECONDS = 60
+
+    def __init__(
+        self,
+        base_table: Table,
+        dialect: str,
+        enabled: bool = False,
+        months_ahead: int = 2,
+    ):
+        self.base_table = base_table
+        self.enabled = enabled
+        self.months_ahead = months_ahead
+        self.native = enabled and dialect == "postgresql"
+        self.routed = enabled and dialect != "postgresql"
+        self._metadata = MetaData()
+        self._tables: Dict[int, Table] = {}
+        self._known: Set[int] = set()
+        self._refreshed_at = 0.0
+        self.id_sequence = Table(
+            "flow_readings_id_seq",
+            self._metadata,
+            Column("next_id", Integer, nullable=False),
+        )
+
+    # ============================================
+    # Creación
+    # ============================================
+
+    async def create_parent(self, conn: AsyncConnection):
+        """Crea flow_readings como tabla particionada (solo PostgreSQL)"""
+        result = await conn.execute(
+            text(
+                "SELECT c.relkind FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relname = :name AND n.nspname = current_schema()"
+            ),
+            {"name": self.base_table.name},
+        )
+        relkind = result.scalar_one_or_none()
+        if relkind == "r":
+            raise RuntimeError(
+                "flow_readings existe sin particionar; ejecute "
+                "scripts/migrate_partition_flow_readings.py"
+            )
+        if relkind is not None:
+            return
+
+        # La clave primaria de una tabla particionada debe incluir timestamp
+        parent = Table(
+            self.base_table.name,
+            MetaData(),
+            Column("id", Integer, primary_key=True, autoincrement=True),
+            *_columns(timestamp_primary_key=True),
+            Index("ix_flow_readings_timestamp", "timestamp"),
+            Index(
+                "uq_flow_readings_device_ts_pulse",
+                "device_id",
+                "timestamp",
+                "pulse_count",
+                unique=True,
+            ),
+            postgresql_partition_by="RANGE (timestamp)",
+        )
+        await conn.run_sync(parent.create)
+
+    async def prepare(self, conn: AsyncConnection):
+        """Carga las particiones existentes y crea las de los próximos meses"""
+        await self.refresh(conn)
+
+        if self.routed:
+            await conn.run_sync(self.id_sequence.create, checkfirst=True)
+            seeded = await conn.execute(
+                select(func.count()).select_from(self.id_sequence)
+            )
+            if seeded.scalar() == 0:
+                max_id = 0
+                for table in self.all_tables():
+                    result = await conn.execute(select(func.max(table.c.id)))
+                    max_id = max(max_id, result.scalar() or 0)
+                await conn.execute(
+                    insert(self.id_sequence).values(next_id=max_id + 1)
+                )
+
+        current = month_key(datetime.now())
+        keys = [current]
+        for _ in range(self.months_ahead):
+            keys.append(next_month(keys[-1]))
+        await self.ensure(conn, keys)
+
+    async def check_migrated(self, conn: AsyncConnection):
+        """
+        Verifica que flow_readings no tenga lecturas sin mover (solo SQLite)
+
+        Un reenvío de una lectura que siguiera en flow_readings se
+        insertaría en la tabla del mes sin detectarse como duplicado.
+        """
+        if not self.routed:
+            return
+        result = await conn.execute(select(self.base_table.c.id).limit(1))
+        if result.first() is not None:
+            raise RuntimeError(
+                "flow_readings tiene lecturas sin particionar; ejecute "
+                "scripts/migrate_partition_flow_readings.py"
+            )
+
+    def missing(self, keys: Iterable[int]) -> Set[int]:
+        """Meses sin partición conocida"""
+        if not self.enabled:
+            return set()
+        return set(keys) - self._known
+
+    async def ensure(
+        self, conn: AsyncConnection, keys: Iterable[int], remember: bool = True
+    ):
+        """
+        Crea las particiones que falten para los meses indicados
+
+        Con remember=False no se registran como existentes hasta llamar a
+        `mark_created` (tras confirmar la transacción que las crea).
+        """
+        if not self.enabled:
+            return
+
+        for key in sorted(set(keys) - self._known):
+            name = f"{PARTITION_PREFIX}{key}"
+            if self.native:
+                start = month_start(key).isoformat(sep=" ")
+                end = month_start(next_month(key)).isoformat(sep=" ")
+                await conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {name} "
+                        f"PARTITION OF {self.base_table.name} "
+                        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                    )
+                )
+            else:
+                table = self._month_table(key)
+                await conn.run_sync(table.create, checkfirst=True)
+            if remember:
+                self._known.add(key)
+
+    def mark_created(self, keys: Iterable[int]):
+        """Registra particiones creadas con `ensure(..., remember=False)`"""
+        self._known.update(keys)
+
+    async def refresh(self, conn: AsyncConnection):
+        """Vuelve a leer del catálogo las particiones existentes"""
+        if not self.enabled:
+            return
+
+        if self.native:
+            result = await conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = :name"
+                ),
+                {"name": self.base_table.name},
+            )
+        else:
+            result = await conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table'")
+            )
+
+        self._known = set()
+        for (name,) in result:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                self._known.add(int(match.group(1)))
+        self._refreshed_at = time.monotonic()
+
+    async def maybe_refresh(self, conn: AsyncConnection):
+        """Refresca las particiones conocidas si la lista es antigua"""
+        elapsed = time.monotonic() - self._refreshed_at
+        if self.enabled and elapsed > self.REFRESH_SECONDS:
+            await self.refresh(conn)
+
+    # ============================================
+    # Enrutamiento
+    # ============================================
+
+    def table_for(self, timestamp: datetime) -> Table:
+        """Tabla en la que se inserta una lectura"""
+        if not self.routed:
+            return self.base_table
+        return self._month_table(month_key(timestamp))
+
+    async def allocate_ids(self, conn: AsyncConnection, count: int) -> int:
+        """
+        Reserva `count` IDs consecutivos (solo SQLite)
+
+        Returns:
+            El primer ID reservado
+        """
+        result = await conn.execute(
+            self.id_sequence.update()
+            .values(next_id=self.id_sequence.c.next_id + count)
+            .returning(self.id_sequence.c.next_id)
+        )
+        return result.scalar_one() - count
+
+    def tables_for_range(self, start: datetime, end: datetime) -> List[Table]:
+        """Tablas que pueden contener lecturas del rango (la histórica primero)"""
+        if not self.routed:
+            return [self.base_table]
+        keys = [key for key in months_between(start, end) if key in self._known]
+        return [self.base_table] + [self._month_table(key) for key in keys]
+
+    def tables_newest_first(self) -> List[Table]:
+        """Todas las tablas, de la partición más reciente a la histórica"""
+        if not self.routed:
+            return [self.base_table]
+        keys = sorted(self._known, reverse=True)
+        return [self._month_table(key) for key in keys] + [self.base_table]
+
+    def tables_before(self, cutoff: datetime) -> List[Table]:
+        """Tablas que pueden contener lecturas anteriores a `cutoff`"""
+        if not self.routed:
+            return [self.base_table]
+        keys = [key for key in sorted(self._known) if month_start(key) < cutoff]
+        return [self.base_table] + [self._month_table(key) for key in keys]
+
+    def expired(self, cutoff: datetime) -> List[str]:
+        """Particiones cuyo mes completo es anterior a `cutoff`"""
+        return [
+            f"{PARTITION_PREFIX}{key}"
+            for key in sorted(self._known)
+            if month_start(next_month(key)) <= cutoff
+        ]
+
+    def all_tables(self) -> List[Table]:
+        """Todas las tablas con lecturas"""
+        return self.tables_newest_first()
+
+    def partition_names(self) -> List[str]:
+        """Nombres de las particiones existentes, en orden cronológico"""
+        return [f"{PARTITION_PREFIX}{key}" for key in sorted(self._known)]
+
+    # ============================================
+    # Retención
+    # ============================================
+
+    async def drop_before(
+        self, conn: AsyncConnection, cutoff: datetime
+    ) -> List[str]:
+        """
+        Elimina las particiones cuyo mes termina antes de `cutoff`
+
+        Returns:
+            Nombres de las particiones eliminadas
+        """
+        if not self.enabled:
+            return []
+
+        await self.refresh(conn)
+        dropped = self.expired(cutoff)
+        for name in dropped:
+            key = int(_PARTITION_NAME.match(name).group(1))
+            await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            self._known.discard(key)
+            table = self._tables.pop(key, None)
+            if table is not None:
+                self._metadata.remove(table)
+        return dropped
+
+    def _month_table(self, key: int) -> Table:
+        """Definición de la tabla de un mes (SQLite)"""
+        table = self._tables.get(key)
+        if table is None:
+            name = f"{PARTITION_PREFIX}{key}"
+            table = Table(
+                name,
+                self._metadata,
+                Column("id", Integer, primary_key=True, autoincrement=False),
+                *_columns(),
+                Index(f"ix_{name}_timestamp", "timestamp"),
+                Index(
+                    f"uq_{name}_device_ts_pulse",
+                    "device_id",
+                    "timestamp",
+                    "pulse_count",
+                    unique=True,
+                ),
+            )
+            self._tables[key] = table
+        return table
@@ -0,0 +1,137 @@
+import time
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from src.shared.utils.metrics import Histogram
+
+# Buckets de espera por una conexión, en milisegundos
+WAIT_BUCKETS_MS = (0.1, 1, 5, 10, 50, 100, 500, 1000, 5000, 30000)
+
+
+class PoolTelemetry:
+    """
+    Telemetría del pool de conexiones de un engine
+
+    Registra cuánto espera cada checkout por una conexión, cuántos tuvieron
+    que esperar porque el pool estaba agotado, cuántas conexiones de
+    overflow se abrieron y cuántos checkouts fallaron por timeout. El uso
+    actual (en uso, libres, overflow) se lee del pool al pedir las
+    métricas. Solo usa eventos y accesores públicos del pool.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.checkouts = 0
+        self.waited_checkouts = 0
+        self.overflow_connections = 0
+        self.timeouts = 0
+        self.connections_opened = 0
+        self.connections_invalidated = 0
+        # Conexiones abiertas que siguen en el pool (libres o en uso)
+        self._open_connections = 0
+
+        event.listen(engine.sync_engine, "connect", self._on_connect)
+        event.listen(engine.sync_engine, "close", self._on_close)
+        event.listen(engine.sync_engine, "detach", self._on_close)
+        event.listen(engine.sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, _dbapi_connection, _connection_record):
+        self.connections_opened += 1
+        self._open_connections += 1
+        # La conexión nueva quedó por encima de `size`
+        pool = self.engine.sync_engine.pool
+        if (
+            isinstance(pool, AsyncAdaptedQueuePool)
+            and self._open_connections > pool.size()
+        ):
+            self.overflow_connections += 1
+
+    def _on_close(self, _dbapi_connection, _connection_record):
+        self._open_connections = max(self._open_connections - 1, 0)
+
+    def _on_invalidate(self, _dbapi_connection, _connection_record, _exception):
+        self.connections_invalidated += 1
+
+    def record_checkout(self, wait_ms: float, waited: bool):
+        """Registra un checkout exitoso"""
+        self.checkouts += 1
+        self.wait_ms.record(wait_ms)
+        if waited:
+            self.waited_checkouts += 1
+
+    def record_timeout(self, wait_ms: float):
+        """Registra un checkout que agotó `pool_timeout`"""
+        self.timeouts += 1
+        self.wait_ms.record(wait_ms)
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas del pool"""
+        pool = self.engine.sync_engine.pool
+        metrics = {
+            "pool": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "waited_checkouts": self.waited_checkouts,
+            "overflow_connections": self.overflow_connections,
+            "timeouts": self.timeouts,
+            "connections_opened": self.connections_opened,
+            "connections_invalidated": self.connections_invalidated,
+            "checkout_wait_ms": self.wait_ms.to_dict(),
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            metrics.update(
+                {
+                    "size": pool.size(),
+                    "in_use": pool.checkedout(),
+                    "idle": pool.checkedin(),
+                    # Conexiones abiertas por encima de `size`
+                    "overflow": max(pool.overflow(), 0),
+                    "max_overflow": getattr(pool, "max_overflow", None),
+                    "timeout_seconds": pool.timeout(),
+                }
+            )
+        return metrics
+
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool que mide la espera de cada checkout
+
+    La espera incluye crear la conexión o el pre-ping, si corresponde: es
+    el tiempo que la petición pasa sin poder ejecutar su consulta.
+    """
+
+    telemetry: Optional[PoolTelemetry] = None
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+
+    def connect(self):
+        telemetry = self.telemetry
+        if telemetry is None:
+            return super().connect()
+
+        # Sin conexiones libres ni overflow disponible el checkout espera
+        waited = self.checkedin() == 0 and (
+            self.max_overflow > -1 and self.overflow() >= self.max_overflow
+        )
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            telemetry.record_timeout((time.perf_counter() - started) * 1000)
+            raise
+        telemetry.record_checkout(
+            (time.perf_counter() - started) * 1000,
+            waited,
+        )
+        return connection
+
+    def recreate(self) -> "MonitoredQueuePool":
+        # engine.dispose() reemplaza el pool: conservar la telemetría
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
@@ -1,9 +1,38 @@
-from typing import List, Optional
-from datetime import datetime
-from sqlalchemy import select, and_
+import asyncio
+from collections import defaultdict, deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import (
+    BigInteger,
+    String,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    type_coerce,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from src.domain.entities.flow_reading import FlowReading
 from src.domain.entities.filling import Filling, FillingStatus
 from src.domain.entities.pump import Pump
+from src.domain.value_objects.flow_columns import FlowReadingColumns
+from src.domain.value_objects.metrics import FillingAggregate, FlowAggregate
 from src.domain.repositories.flow_reading_repository import FlowReadingRepository
 from src.domain.repositories.filling_repository import FillingRepository
 from src.domain.repositories.pump_repository import PumpRepository
@@ -13,6 +42,41 @@ from src.infrastructure.persistence.database import (
     FillingModel,
     PumpModel,
 )
+from src.infrastructure.persistence.partitions import month_key
+from src.infrastructure.persistence.write_buffer import FlowReadingWriteBuffer
+
+
+# Recibe (device_id, inicio del día) de cada día modificado
+ChangeListener = Callable[[str, datetime], None]
+
+
+def _notify_days(
+    listeners: List[ChangeListener], changes: Iterable[Tuple[str, datetime]]
+):
+    """Avisa a los listeners de cada (dispositivo, día) modificado"""
+    if not listeners:
+        return
+    days = {
+        (device_id, datetime.combine(timestamp.date(), datetime.min.time()))
+        for device_id, timestamp in changes
+    }
+    for device_id, day in days:
+        for listener in listeners:
+            listener(device_id, day)
+
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def _keyset_before(timestamp_column, id_column, after: Tuple[datetime, int]):
+    """Filas anteriores a `after` en el orden (timestamp, id) descendente"""
+    timestamp, row_id = after
+    # El primer término acota el rango del índice por timestamp
+    return and_(
+        timestamp_column <= timestamp,
+        or_(timestamp_column < timestamp, id_column < row_id),
+    )
 
 
 class SQLAlchemyFlowReadingRepository(FlowReadingRepository):
@@ -20,167 +84,636 @@ class SQLAlchemyFlowReadingRepository(FlowReadingRepository):
 
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
+        self.write_buffer: Optional[FlowReadingWriteBuffer] = None
+        self._listeners: List[ChangeListener] = []
+
+    def add_listener(self, listener: "ChangeListener"):
+        """
+        Registra una función que se llama con (device_id, inicio del día)
+        por cada día con lecturas insertadas o eliminadas
+        """
+        self._listeners.append(listener)
+
+    def enable_write_behind(
+        self,
+        max_queue_size: int = 10000,
+        flush_size: int = 500,
+        flush_interval_ms: int = 50,
+        max_retries: int = 3,
+        retry_backoff_ms: int = 100,
+    ) -> FlowReadingWriteBuffer:
+        """
+        Activa la escritura diferida: `save` encola las lecturas y un
+        buffer en segundo plano las persiste en grupos con `save_many`
+        """
+        self.write_buffer = FlowReadingWriteBuffer(
+            self.save_many,
+            max_queue_size=max_queue_size,
+            flush_size=flush_size,
+            flush_interval_ms=flush_interval_ms,
+            max_retries=max_retries,
+            retry_backoff_ms=retry_backoff_ms,
+        )
+        return self.write_buffer
 
-    async def save(self, reading: FlowReading) -> FlowReading:
+    async def save(self, reading: FlowReading, durable: bool = True) -> FlowReading:
         """Guarda una lectura de flujo"""
+        if self.write_buffer is not None and self.write_buffer.is_running:
+            return await self.write_buffer.submit(reading, durable)
+
+        # INSERT ... RETURNING: evita el SELECT extra de session.refresh
+        saved = await self.save_many([reading])
+        return saved[0]
+
+    async def enqueue(self, reading: FlowReading) -> Awaitable[FlowReading]:
+        """Con escritura diferida solo encola la lectura; si no, la guarda"""
+        if self.write_buffer is not None and self.write_buffer.is_running:
+            return await self.write_buffer.enqueue(reading)
+        return await super().enqueue(reading)
+
+    async def save_many(self, readings: List[FlowReading]) -> List[FlowReading]:
+        """
+        Guarda un lote de lecturas con un INSERT multi-fila y un solo commit
+
+        Las lecturas que violan la clave de idempotencia (device_id,
+        timestamp, pulse_count) se descartan sin error y se retornan sin ID.
+        Con particionado, cada lectura se guarda en la partición de su mes.
+        Los rollups de las lecturas insertadas se actualizan en la misma
+        transacción.
+        """
+        if not readings:
+            return []
+
+        partitions = self.db_manager.partitions
+        rows = [
+            {
+                "device_id": r.device_id,
+                "flow_rate": r.flow_rate,
+                "total_volume": r.total_volume,
+                "timestamp": r.timestamp,
+                "pulse_count": r.pulse_count,
+                "unit": r.unit,
+                "temperature": r.temperature,
+                "pressure": r.pressure,
+            }
+            for r in readings
+        ]
+
+        months = partitions.missing(month_key(r.timestamp) for r in readings)
+
         async with self.db_manager.get_session() as session:
-            model = FlowReadingModel(
-                device_id=reading.device_id,
-                flow_rate=reading.flow_rate,
-                total_volume=reading.total_volume,
-                timestamp=reading.timestamp,
-                pulse_count=reading.pulse_count,
-                unit=reading.unit,
-                temperature=reading.temperature,
-                pressure=reading.pressure,
+            if months:
+                # En la transacción de las lecturas (la de la unidad de trabajo,
+                # si hay): se registran como existentes recién tras el commit
+                await partitions.ensure(
+                    await session.connection(), months, remember=False
+                )
+
+            if partitions.routed:
+                # IDs únicos entre las tablas mensuales
+                conn = await session.connection()
+                first_id = await partitions.allocate_ids(conn, len(rows))
+                for offset, row in enumerate(rows):
+                    row["id"] = first_id + offset
+
+            rows_by_table = defaultdict(list)
+            for row in rows:
+                rows_by_table[partitions.table_for(row["timestamp"])].append(row)
+
+            inserted = []
+            for table, table_rows in rows_by_table.items():
+                statement = self._insert_ignoring_duplicates(table).returning(
+                    table.c.id,
+                    table.c.device_id,
+                    table.c.timestamp,
+                    table.c.pulse_count,
+                )
+                result = await session.execute(statement, table_rows)
+                inserted.extend(result.all())
+
+            # Asociar los IDs insertados a las lecturas por su clave
+            ids_by_key = defaultdict(deque)
+            for row in inserted:
+                key = self._reading_key(row.device_id, row.timestamp, row.pulse_count)
+                ids_by_key[key].append(row.id)
+
+            saved = []
+            for r in readings:
+                key = self._reading_key(r.device_id, r.timestamp, r.pulse_count)
+                ids = ids_by_key.get(key)
+                saved.append(
+                    FlowReading(
+                        id=ids.popleft() if ids else None,
+                        device_id=r.device_id,
+                        flow_rate=r.flow_rate,
+                        total_volume=r.total_volume,
+                        timestamp=r.timestamp,
+                        pulse_count=r.pulse_count,
+                        unit=r.unit,
+                        temperature=r.temperature,
+                        pressure=r.pressure,
+                    )
+                )
+
+            # Los duplicados omitidos no se suman a los rollups
+            await self.db_manager.rollups.apply(
+                await session.connection(), [s for s in saved if s.id is not None]
             )
-            session.add(model)
             await session.commit()
-            await session.refresh(model)
 
-            return FlowReading(
-                id=model.id,
-                device_id=model.device_id,
-                flow_rate=model.flow_rate,
-                total_volume=model.total_volume,
-                timestamp=model.timestamp,
-                pulse_count=model.pulse_count,
-                unit=model.unit,
-                temperature=model.temperature,
-                pressure=model.pressure,
-            )
+        if months:
+            self.db_manager.after_commit(lambda: partitions.mark_created(months))
+        changes = [(s.device_id, s.timestamp) for s in saved if s.id]
+        self.db_manager.after_commit(lambda: _notify_days(self._listeners, changes))
+        return saved
 
-    async def get_by_id(self, reading_id: int) -> Optional[FlowReading]:
-        """Obtiene una lectura por ID"""
-        async with self.db_manager.get_session() as session:
-            result = await session.execute(
-                select(FlowReadingModel).where(FlowReadingModel.id == reading_id)
+    def _insert_ignoring_duplicates(self, table):
+        """INSERT que omite las filas que ya existen (ON CONFLICT DO NOTHING)"""
+        dialect = self.db_manager.engine.dialect.name
+        if dialect == "postgresql":
+            return pg_insert(table).on_conflict_do_nothing(
+                index_elements=["device_id", "timestamp", "pulse_count"]
             )
-            model = result.scalar_one_or_none()
+        if dialect == "sqlite":
+            return sqlite_insert(table).on_conflict_do_nothing(
+                index_elements=["device_id", "timestamp", "pulse_count"]
+            )
+        return insert(table)
 
-            if not model:
-                return None
+    @staticmethod
+    def _reading_key(device_id: str, timestamp: datetime, pulse_count: Optional[int]):
+        """Clave de idempotencia tal como queda almacenada (timestamp sin zona)"""
+        return device_id, timestamp.replace(tzinfo=None), pulse_count
 
-            return FlowReading(
-                id=model.id,
-                device_id=model.device_id,
-                flow_rate=model.flow_rate,
-                total_volume=model.total_volume,
-                timestamp=model.timestamp,
-                pulse_count=model.pulse_count,
-                unit=model.unit,
-                temperature=model.temperature,
-                pressure=model.pressure,
-            )
+    @staticmethod
+    def _to_entity(row) -> FlowReading:
+        """Construye la entidad desde una fila de cualquier partición"""
+        return FlowReading(
+            id=row.id,
+            device_id=row.device_id,
+            flow_rate=row.flow_rate,
+            total_volume=row.total_volume,
+            timestamp=row.timestamp,
+            pulse_count=row.pulse_count,
+            unit=row.unit,
+            temperature=row.temperature,
+            pressure=row.pressure,
+        )
+
+    async def get_by_id(self, reading_id: int) -> Optional[FlowReading]:
+        """Obtiene una lectura por ID"""
+        partitions = self.db_manager.partitions
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            for table in partitions.tables_newest_first():
+                result = await session.execute(
+                    select(table).where(table.c.id == reading_id)
+                )
+                row = result.first()
+                if row:
+                    return self._to_entity(row)
+            return None
 
     async def get_by_device_id(
         self, device_id: str, limit: int = 100
     ) -> List[FlowReading]:
         """Obtiene lecturas por dispositivo"""
-        async with self.db_manager.get_session() as session:
-            result = await session.execute(
-                select(FlowReadingModel)
-                .where(FlowReadingModel.device_id == device_id)
-                .order_by(FlowReadingModel.timestamp.desc())
-                .limit(limit)
-            )
-            models = result.scalars().all()
+        partitions = self.db_manager.partitions
+        rows = []
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            # Recorrer de la partición más reciente hacia atrás hasta
+            # completar el límite
+            for table in partitions.tables_newest_first():
+                result = await session.execute(
+                    select(table)
+                    .where(table.c.device_id == device_id)
+                    .order_by(table.c.timestamp.desc())
+                    .limit(limit - len(rows))
+                )
+                rows.extend(result.all())
+                if len(rows) >= limit:
+                    break
 
-            return [
-                FlowReading(
-                    id=m.id,
-                    device_id=m.device_id,
-                    flow_rate=m.flow_rate,
-                    total_volume=m.total_volume,
-                    timestamp=m.timestamp,
-                    pulse_count=m.pulse_count,
-                    unit=m.unit,
-                    temperature=m.temperature,
-                    pressure=m.pressure,
+        rows.sort(key=lambda row: row.timestamp, reverse=True)
+        return [self._to_entity(row) for row in rows]
+
+    async def get_page(
+        self,
+        device_id: str,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None,
+    ) -> List[FlowReading]:
+        """Obtiene una página de lecturas por clave (timestamp, id)"""
+        partitions = self.db_manager.partitions
+        rows = []
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            if after is None:
+                tables = partitions.tables_newest_first()
+            else:
+                # Las particiones posteriores al cursor no tienen filas de la página
+                tables = partitions.tables_before(
+                    after[0] + timedelta(microseconds=1)
+                )[::-1]
+            for table in tables:
+                statement = select(table).where(table.c.device_id == device_id)
+                if after is not None:
+                    statement = statement.where(
+                        _keyset_before(table.c.timestamp, table.c.id, after)
+                    )
+                result = await session.execute(
+                    statement.order_by(table.c.timestamp.desc(), table.c.id.desc())
+                    .limit(limit - len(rows))
                 )
-                for m in models
-            ]
+                rows.extend(result.all())
+                if len(rows) >= limit:
+                    break
+
+        rows.sort(key=lambda row: (row.timestamp, row.id), reverse=True)
+        return [self._to_entity(row) for row in rows[:limit]]
 
     async def get_by_date_range(
         self, device_id: str, start_date: datetime, end_date: datetime
     ) -> List[FlowReading]:
-        """Obtiene lecturas en un rango de fechas"""
-        async with self.db_manager.get_session() as session:
-            result = await session.execute(
-                select(FlowReadingModel)
-                .where(
-                    and_(
-                        FlowReadingModel.device_id == device_id,
-                        FlowReadingModel.timestamp >= start_date,
-                        FlowReadingModel.timestamp <= end_date,
+        """Obtiene lecturas en un rango de fechas, incluidas las archivadas"""
+        partitions = self.db_manager.partitions
+        rows = []
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            # Solo se consultan las particiones que abarca el rango
+            tables = partitions.tables_for_range(start_date, end_date)
+            for table in tables:
+                result = await session.execute(
+                    select(table)
+                    .where(
+                        and_(
+                            table.c.device_id == device_id,
+                            table.c.timestamp >= start_date,
+                            table.c.timestamp <= end_date,
+                        )
                     )
+                    .order_by(table.c.timestamp.asc())
                 )
-                .order_by(FlowReadingModel.timestamp.asc())
+                rows.extend(result.all())
+
+        if len(tables) > 1:
+            rows.sort(key=lambda row: row.timestamp)
+        readings = [self._to_entity(row) for row in rows]
+
+        archive = self.db_manager.archive
+        if archive is not None:
+            archived = archive.get_readings(
+                device_id, start_date, end_date + timedelta(microseconds=1)
             )
-            models = result.scalars().all()
+            if archived:
+                ids = {r.id for r in readings}
+                readings.extend(r for r in archived if r.id not in ids)
+                readings.sort(key=lambda r: r.timestamp)
+        return readings
 
-            return [
-                FlowReading(
-                    id=m.id,
-                    device_id=m.device_id,
-                    flow_rate=m.flow_rate,
-                    total_volume=m.total_volume,
-                    timestamp=m.timestamp,
-                    pulse_count=m.pulse_count,
-                    unit=m.unit,
-                    temperature=m.temperature,
-                    pressure=m.pressure,
+    async def iter_by_date_range(
+        self,
+        device_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        chunk_size: int = 1000,
+    ) -> AsyncIterator[List[FlowReading]]:
+        """
+        Recorre las lecturas de un rango en bloques, incluidas las archivadas
+
+        Primero se entregan las lecturas archivadas (más antiguas) y luego
+        las de la base de datos, leídas con un cursor del lado del servidor
+        (`yield_per`): en memoria solo hay un bloque a la vez. Dentro de cada
+        origen el orden es por timestamp.
+        """
+        archived_ids = {}
+        archive = self.db_manager.archive
+        if archive is not None:
+            segments = await asyncio.to_thread(
+                archive.scan,
+                device_id,
+                start_date,
+                end_date + timedelta(microseconds=1),
+            )
+            for segment in segments:
+                # Las columnas son memory-mapped: guardar los IDs no los copia
+                archived_ids[segment.day] = segment.columns["id"]
+                for chunk in segment.chunks(chunk_size):
+                    yield chunk.to_entities()
+
+        partitions = self.db_manager.partitions
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            # La tabla histórica y las mensuales no se solapan: recorrerlas en
+            # orden mantiene el orden por timestamp
+            for table in partitions.tables_for_range(start_date, end_date):
+                result = await session.stream(
+                    select(table)
+                    .where(
+                        and_(
+                            table.c.device_id == device_id,
+                            table.c.timestamp >= start_date,
+                            table.c.timestamp <= end_date,
+                        )
+                    )
+                    .order_by(table.c.timestamp.asc())
+                    .execution_options(yield_per=chunk_size)
                 )
-                for m in models
+                async for rows in result.partitions():
+                    readings = [self._to_entity(row) for row in rows]
+                    if archived_ids:
+                        readings = self._skip_archived(readings, archived_ids)
+                    if readings:
+                        yield readings
+
+    @staticmethod
+    def _skip_archived(
+        readings: List[FlowReading], archived_ids: Dict[datetime, np.ndarray]
+    ) -> List[FlowReading]:
+        """Omite las lecturas que ya se entregaron desde el archivo"""
+        positions_by_day = defaultdict(list)
+        for position, reading in enumerate(readings):
+            day = datetime.combine(reading.timestamp.date(), datetime.min.time())
+            if day in archived_ids:
+                positions_by_day[day].append(position)
+        if not positions_by_day:
+            return readings
+
+        skipped = set()
+        for day, positions in positions_by_day.items():
+            ids = np.fromiter(
+                (readings[p].id for p in positions), np.int64, len(positions)
+            )
+            archived = np.isin(ids, archived_ids[day]).tolist()
+            skipped.update(p for p, found in zip(positions, archived) if found)
+        return [r for p, r in enumerate(readings) if p not in skipped]
+
+    async def iter_by_device_id(
+        self, device_id: str, limit: Optional[int] = None, chunk_size: int = 1000
+    ) -> AsyncIterator[List[FlowReading]]:
+        """Recorre en bloques las lecturas de un dispositivo (más recientes primero)"""
+        partitions = self.db_manager.partitions
+        remaining = limit
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            for table in partitions.tables_newest_first():
+                statement = (
+                    select(table)
+                    .where(table.c.device_id == device_id)
+                    .order_by(table.c.timestamp.desc())
+                    .execution_options(yield_per=chunk_size)
+                )
+                if remaining is not None:
+                    statement = statement.limit(remaining)
+                result = await session.stream(statement)
+                async for rows in result.partitions():
+                    if remaining is not None:
+                        remaining -= len(rows)
+                    yield [self._to_entity(row) for row in rows]
+                if remaining is not None and remaining <= 0:
+                    return
+
+    async def get_columns_by_date_range(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FlowReadingColumns:
+        """
+        Lecturas de un rango como columnas NumPy, incluidas las archivadas
+
+        Solo se leen las cuatro columnas del análisis, con Core y sin crear
+        entidades; los timestamps se convierten en bloque (ver
+        `_timestamp_column`).
+        """
+        partitions = self.db_manager.partitions
+        parts = []
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            for table in partitions.tables_for_range(start_date, end_date):
+                statement = (
+                    select(
+                        table.c.id,
+                        self._timestamp_column(table),
+                        table.c.flow_rate,
+                        table.c.total_volume,
+                    )
+                    .where(
+                        and_(
+                            table.c.device_id == device_id,
+                            table.c.timestamp >= start_date,
+                            table.c.timestamp <= end_date,
+                        )
+                    )
+                    .order_by(table.c.timestamp.asc())
+                )
+                parts.extend(await self._read_columns(session, statement))
+        columns = FlowReadingColumns.concat(parts)
+
+        archive = self.db_manager.archive
+        if archive is None:
+            return columns
+        segments = await asyncio.to_thread(
+            archive.scan, device_id, start_date, end_date + ONE_MICROSECOND
+        )
+        if not segments:
+            return columns
+        archived = FlowReadingColumns.concat(
+            [
+                FlowReadingColumns(
+                    ids=segment.columns["id"],
+                    timestamps=segment.columns["timestamp"].view("datetime64[us]"),
+                    flow_rates=segment.columns["flow_rate"].astype(np.float64),
+                    total_volumes=segment.columns["total_volume"],
+                )
+                for segment in segments
             ]
+        )
+        # Las filas archivadas que siguen en la base de datos no se repiten
+        columns = columns.take(~np.isin(columns.ids, archived.ids))
+        merged = FlowReadingColumns.concat([archived, columns])
+        return merged.take(np.argsort(merged.timestamps, kind="stable"))
+
+    async def get_latest_columns(
+        self, device_id: str, limit: int = 1000
+    ) -> FlowReadingColumns:
+        """Últimas `limit` lecturas como columnas NumPy (más recientes primero)"""
+        partitions = self.db_manager.partitions
+        parts = []
+        remaining = limit
+        async with self.db_manager.get_read_session() as session:
+            await partitions.maybe_refresh(await session.connection())
+            for table in partitions.tables_newest_first():
+                chunks = await self._read_columns(
+                    session,
+                    select(
+                        table.c.id,
+                        self._timestamp_column(table),
+                        table.c.flow_rate,
+                        table.c.total_volume,
+                    )
+                    .where(table.c.device_id == device_id)
+                    .order_by(table.c.timestamp.desc())
+                    .limit(remaining),
+                )
+                parts.extend(chunks)
+                remaining -= sum(len(chunk) for chunk in chunks)
+                if remaining <= 0:
+                    break
+        return FlowReadingColumns.concat(parts)
+
+    def _timestamp_column(self, table):
+        """
+        Columna timestamp en la forma más barata de convertir a NumPy
+
+        SQLite guarda texto ISO que NumPy parsea en bloque, y PostgreSQL
+        puede entregar los microsegundos desde epoch; así no se crea un
+        datetime por fila.
+        """
+        dialect = self.db_manager.engine.dialect.name
+        if dialect == "sqlite":
+            return type_coerce(table.c.timestamp, String)
+        if dialect == "postgresql":
+            return cast(func.extract("epoch", table.c.timestamp) * 1_000_000, BigInteger)
+        return table.c.timestamp
+
+    async def _read_columns(
+        self, session, statement, chunk_size: int = 50000
+    ) -> List[FlowReadingColumns]:
+        """
+        Ejecuta la consulta y convierte el resultado a columnas por bloques
+
+        Con un cursor del lado del servidor solo hay `chunk_size` filas de
+        Python en memoria a la vez.
+        """
+        result = await session.stream(
+            statement.execution_options(yield_per=chunk_size)
+        )
+        return [self._to_columns(rows) async for rows in result.partitions()]
+
+    @staticmethod
+    def _to_columns(rows) -> FlowReadingColumns:
+        """Convierte filas (id, timestamp, flow_rate, total_volume) a columnas"""
+        if not rows:
+            return FlowReadingColumns.empty()
+        ids, timestamps, flow_rates, total_volumes = zip(*rows)
+        if isinstance(timestamps[0], str):
+            timestamps = np.array(timestamps, dtype="datetime64[us]")
+        elif isinstance(timestamps[0], int):
+            timestamps = np.array(timestamps, dtype=np.int64).view("datetime64[us]")
+        else:
+            timestamps = np.fromiter(
+                ((t.replace(tzinfo=None) - EPOCH) // ONE_MICROSECOND for t in timestamps),
+                np.int64,
+                len(timestamps),
+            ).view("datetime64[us]")
+        return FlowReadingColumns(
+            ids=np.array(ids, dtype=np.int64),
+            timestamps=timestamps,
+            flow_rates=np.array(flow_rates, dtype=np.float64),
+            total_volumes=np.array(total_volumes, dtype=np.float64),
+        )
 
     async def delete(self, reading_id: int) -> bool:
         """Elimina una lectura"""
+        partitions = self.db_manager.partitions
         async with self.db_manager.get_session() as session:
-            result = await session.execute(
-                select(FlowReadingModel).where(FlowReadingModel.id == reading_id)
-            )
-            model = result.scalar_one_or_none()
+            for table in partitions.tables_newest_first():
+                result = await session.execute(
+                    delete(table)
+                    .where(table.c.id == reading_id)
+                    .returning(table.c.device_id, table.c.timestamp)
+                )
+                row = result.first()
+                if row:
+                    # Los mínimos y máximos no se pueden descontar: se
+                    # recalculan los rollups del día de la lectura
+                    await self.db_manager.rollups.rebuild(
+                        await session.connection(),
+                        row.device_id,
+                        row.timestamp,
+                        row.timestamp,
+                    )
+                    await session.commit()
+                    changes = [(row.device_id, row.timestamp)]
+                    self.db_manager.after_commit(
+                        lambda: _notify_days(self._listeners, changes)
+                    )
+                    return True
+            return False
 
-            if not model:
-                return False
+    async def get_latest(
+        self, device_id: str, primary: bool = False
+    ) -> Optional[FlowReading]:
+        """Obtiene la lectura más reciente (de una réplica salvo `primary`)"""
+        # Una lectura encolada en el buffer es más reciente que la de la BD
+        if self.write_buffer is not None:
+            pending = self.write_buffer.get_pending_latest(device_id)
+            if pending is not None:
+                return pending
 
-            await session.delete(model)
-            await session.commit()
-            return True
+        partitions = self.db_manager.partitions
+        async with self.db_manager.get_read_session(primary=primary) as session:
+            await partitions.maybe_refresh(await session.connection())
+            for table in partitions.tables_newest_first():
+                result = await session.execute(
+                    select(table)
+                    .where(table.c.device_id == device_id)
+                    .order_by(table.c.timestamp.desc())
+                    .limit(1)
+                )
+                row = result.first()
+                if row:
+                    return self._to_entity(row)
+            return None
 
-    async def get_latest(self, device_id: str) -> Optional[FlowReading]:
-        """Obtiene la lectura más reciente"""
-        async with self.db_manager.get_session() as session:
-            result = await session.execute(
-                select(FlowReadingModel)
-                .where(FlowReadingModel.device_id == device_id)
-                .order_by(FlowReadingModel.timestamp.desc())
-                .limit(1)
+    async def get_daily_aggregates(
+        self, device_id: str, start_day: datetime, end_day: datetime
+    ) -> Dict[datetime, FlowAggregate]:
+        """Obtiene los agregados por día de [start_day, end_day) desde los rollups"""
+        async with self.db_manager.get_read_session() as session:
+            conn = await session.connection()
+            await self.db_manager.partitions.maybe_refresh(conn)
+            return await self.db_manager.rollups.read_days(
+                conn, device_id, start_day, end_day
             )
-            model = result.scalar_one_or_none()
 
-            if not model:
-                return None
-
-            return FlowReading(
-                id=model.id,
-                device_id=model.device_id,
-                flow_rate=model.flow_rate,
-                total_volume=model.total_volume,
-                timestamp=model.timestamp,
-                pulse_count=model.pulse_count,
-                unit=model.unit,
-                temperature=model.temperature,
-                pressure=model.pressure,
+    async def get_aggregate(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FlowAggregate:
+        """Obtiene el agregado de lecturas de un rango desde los rollups"""
+        async with self.db_manager.get_read_session() as session:
+            conn = await session.connection()
+            await self.db_manager.partitions.maybe_refresh(conn)
+            return await self.db_manager.rollups.read(
+                conn, device_id, start_date, end_date
             )
 
+    async def drop_partitions_before(self, cutoff: datetime) -> List[str]:
+        """
+        Elimina las particiones mensuales anteriores a `cutoff`
+
+        Es la forma económica de aplicar retención: un DROP TABLE por mes
+        en lugar de un DELETE fila a fila.
+
+        Returns:
+            Nombres de las particiones eliminadas
+        """
+        async with self.db_manager.engine.begin() as conn:
+            return await self.db_manager.partitions.drop_before(conn, cutoff)
+
 
 class SQLAlchemyFillingRepository(FillingRepository):
     """Implementación de repositorio de llenados con SQLAlchemy"""
 
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
+        self._listeners: List[ChangeListener] = []
+
+    def add_listener(self, listener: ChangeListener):
+        """
+        Registra una función que se llama con (device_id, inicio del día)
+        por cada llenado guardado, actualizado o eliminado
+        """
+        self._listeners.append(listener)
 
     async def save(self, filling: Filling) -> Filling:
         """Guarda un llenado"""
@@ -199,6 +732,8 @@ class SQLAlchemyFillingRepository(FillingRepository):
             session.add(model)
             await session.commit()
             await session.refresh(model)
+            changes = [(model.device_id, model.start_time)]
+            self.db_manager.after_commit(lambda: _notify_days(self._listeners, changes))
 
             return Filling(
                 id=model.id,
@@ -232,6 +767,8 @@ class SQLAlchemyFillingRepository(FillingRepository):
 
             await session.commit()
             await session.refresh(model)
+            changes = [(model.device_id, model.start_time)]
+            self.db_manager.after_commit(lambda: _notify_days(self._listeners, changes))
 
             return Filling(
                 id=model.id,
@@ -248,7 +785,7 @@ class SQLAlchemyFillingRepository(FillingRepository):
 
     async def get_by_id(self, filling_id: int) -> Optional[Filling]:
         """Obtiene un llenado por ID"""
-        async with self.db_manager.get_session() as session:
+        async with self.db_manager.get_read_session() as session:
             result = await session.execute(
                 select(FillingModel).where(FillingModel.id == filling_id)
             )
@@ -274,7 +811,7 @@ class SQLAlchemyFillingRepository(FillingRepository):
         self, device_id: str, limit: int = 100
     ) -> List[Filling]:
         """Obtiene llenados por dispositivo"""
-        async with self.db_manager.get_session() as session:
+        async with self.db_manager.get_read_session() as session:
             result = await session.execute(
                 select(FillingModel)
                 .where(FillingModel.device_id == device_id)
@@ -299,11 +836,47 @@ class SQLAlchemyFillingRepository(FillingRepository):
                 for m in models
             ]
 
+    async def get_page(
+        self,
+        device_id: str,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None,
+    ) -> List[Filling]:
+        """Obtiene una página de llenados por clave (start_time, id)"""
+        statement = select(FillingModel).where(FillingModel.device_id == device_id)
+        if after is not None:
+            statement = statement.where(
+                _keyset_before(FillingModel.start_time, FillingModel.id, after)
+            )
+        async with self.db_manager.get_read_session() as session:
+            result = await session.execute(
+                statement.order_by(
+                    FillingModel.start_time.desc(), FillingModel.id.desc()
+                ).limit(limit)
+            )
+            models = result.scalars().all()
+
+            return [
+                Filling(
+                    id=m.id,
+                    device_id=m.device_id,
+                    start_time=m.start_time,
+                    end_time=m.end_time,
+                    initial_volume=m.initial_volume,
+                    final_volume=m.final_volume,
+                    target_volume=m.target_volume,
+                    status=m.status,
+                    duration_seconds=m.duration_seconds,
+                    avg_flow_rate=m.avg_flow_rate,
+                )
+                for m in models
+            ]
+
     async def get_by_date_range(
         self, device_id: str, start_date: datetime, end_date: datetime
     ) -> List[Filling]:
         """Obtiene llenados en un rango de fechas"""
-        async with self.db_manager.get_session() as session:
+        async with self.db_manager.get_read_session() as session:
             result = await session.execute(
                 select(FillingModel)
                 .where(
@@ -337,7 +910,7 @@ class SQLAlchemyFillingRepository(FillingRepository):
         self, device_id: str, status: FillingStatus
     ) -> List[Filling]:
         """Obtiene llenados por estado"""
-        async with self.db_manager.get_session() as session:
+        async with self.db_manager.get_read_session() as session:
             result = await session.execute(
                 select(FillingModel)
                 .where(
@@ -366,9 +939,147 @@ class SQLAlchemyFillingRepository(FillingRepository):
                 for m in models
             ]
 
+    async def get_aggregate(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> FillingAggregate:
+        """Agregado de los llenados de [start_date, end_date], calculado en SQL"""
+        aggregate = FillingAggregate()
+        for day_aggregate in (
+            await self._aggregate_by_day(
+                device_id, start_date, end_date + timedelta(microseconds=1)
+            )
+        ).values():
+            aggregate.merge(day_aggregate)
+        return aggregate
+
+    async def get_daily_aggregates(
+        self, device_id: str, start_day: datetime, stop_day: datetime
+    ) -> Dict[datetime, FillingAggregate]:
+        """Agregados por día de [start_day, stop_day), calculados en SQL"""
+        return await self._aggregate_by_day(device_id, start_day, stop_day)
+
+    async def _aggregate_by_day(
+        self, device_id: str, lo: datetime, hi: datetime
+    ) -> Dict[datetime, FillingAggregate]:
+        """
+        Agregados por día de los llenados con start_time en [lo, hi)
+
+        Una consulta agrupada por (día, hora) calcula conteos y sumas con las
+        mismas reglas que Filling.get_actual_volume/get_efficiency, así que
+        no se transfieren los llenados.
+        """
+        m = FillingModel
+        volume, efficiency = self._volume_and_efficiency()
+        completed = m.status == FillingStatus.COMPLETED
+        day = func.date(m.start_time)
+        if self.db_manager.engine.dialect.name == "sqlite":
+            hour = func.strftime("%H", m.start_time)
+        else:
+            hour = func.extract("hour", m.start_time)
+        where = and_(m.device_id == device_id, m.start_time >= lo, m.start_time < hi)
+
+        async with self.db_manager.get_read_session() as session:
+            groups = await session.execute(
+                select(
+                    day.label("day"),
+                    hour.label("hour"),
+                    func.count().label("total"),
+                    func.sum(case((completed, 1), else_=0)).label("completed"),
+                    func.sum(
+                        case((m.status == FillingStatus.CANCELLED, 1), else_=0)
+                    ).label("cancelled"),
+                    func.sum(
+                        case(
+                            (completed, func.coalesce(m.duration_seconds, 0.0)),
+                            else_=0.0,
+                        )
+                    ).label("completed_duration_sum"),
+                    func.sum(case((completed, volume), else_=0.0)).label(
+                        "completed_volume_sum"
+                    ),
+                    func.sum(case((completed, efficiency), else_=0.0)).label(
+                        "completed_efficiency_sum"
+                    ),
+                    func.sum(volume).label("volume_sum"),
+                    func.sum(efficiency).label("efficiency_sum"),
+                    func.sum(efficiency * efficiency).label("efficiency_sum_sq"),
+                    func.min(efficiency).label("efficiency_min"),
+                    func.max(efficiency).label("efficiency_max"),
+                )
+                .where(where)
+                .group_by(day, hour)
+            )
+            days: Dict[datetime, FillingAggregate] = {}
+            # Valor de DATE() tal como llega -> agregado de ese día
+            by_raw_day: Dict[Any, FillingAggregate] = {}
+            for row in groups:
+                day_start = self._day_start(row.day)
+                by_raw_day[row.day] = days.setdefault(day_start, FillingAggregate())
+                by_raw_day[row.day].merge(
+                    FillingAggregate(
+                        total=row.total,
+                        completed=row.completed,
+                        cancelled=row.cancelled,
+                        completed_duration_sum=float(row.completed_duration_sum),
+                        completed_volume_sum=float(row.completed_volume_sum),
+                        completed_efficiency_sum=float(row.completed_efficiency_sum),
+                        volume_sum=float(row.volume_sum),
+                        efficiency_sum=float(row.efficiency_sum),
+                        efficiency_sum_sq=float(row.efficiency_sum_sq),
+                        efficiency_min=float(row.efficiency_min),
+                        efficiency_max=float(row.efficiency_max),
+                        by_hour={int(row.hour): row.total},
+                        by_day={str(day_start.date()): row.total},
+                    )
+                )
+        return days
+
+    async def get_efficiencies(
+        self, device_id: str, start_date: datetime, end_date: datetime
+    ) -> List[float]:
+        """Eficiencia de cada llenado de [start_date, end_date], una columna"""
+        m = FillingModel
+        _, efficiency = self._volume_and_efficiency()
+        async with self.db_manager.get_read_session() as session:
+            result = await session.execute(
+                select(efficiency).where(
+                    and_(
+                        m.device_id == device_id,
+                        m.start_time >= start_date,
+                        m.start_time <= end_date,
+                    )
+                )
+            )
+            return [float(value) for value in result.scalars()]
+
+    @staticmethod
+    def _volume_and_efficiency():
+        """Volumen y eficiencia de un llenado como expresiones SQL"""
+        m = FillingModel
+        volume = case(
+            (m.final_volume.is_(None), 0.0),
+            else_=m.final_volume - m.initial_volume,
+        )
+        ratio = volume / m.target_volume * 100
+        efficiency = case(
+            (m.final_volume.is_(None), 0.0),
+            (m.target_volume == 0, 0.0),
+            (ratio > 100, 100.0),
+            else_=ratio,
+        )
+        return volume, efficiency
+
+    @staticmethod
+    def _day_start(value) -> datetime:
+        """Inicio del día de DATE() (texto en SQLite, date en PostgreSQL)"""
+        if isinstance(value, str):
+            value = date.fromisoformat(value)
+        return datetime.combine(value, datetime.min.time())
+
     async def get_active_filling(self, device_id: str) -> Optional[Filling]:
         """Obtiene el llenado activo"""
-        async with self.db_manager.get_session() as session:
+        # Decide si se puede iniciar otro llenado: siempre desde el primario
+        async with self.db_manager.get_read_session(primary=True) as session:
             result = await session.execute(
                 select(FillingModel)
                 .where(
@@ -411,14 +1122,22 @@ class SQLAlchemyFillingRepository(FillingRepository):
 
             await session.delete(model)
             await session.commit()
+            changes = [(model.device_id, model.start_time)]
+            self.db_manager.after_commit(lambda: _notify_days(self._listeners, changes))
             return True
 
 
 class SQLAlchemyPumpRepository(PumpRepository):
     """Implementación de repositorio de bombas con SQLAlchemy"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, read_your_writes: bool = False):
+        """
+        Args:
+            read_your_writes: Leer el estado de las bombas del primario en
+                lugar de una réplica, para ver siempre el último cambio
+        """
         self.db_manager = db_manager
+        self.read_your_writes = read_your_writes
 
     async def save(self, pump: Pump) -> Pump:
         """Guarda el estado de la bomba"""
@@ -483,7 +1202,9 @@ class SQLAlchemyPumpRepository(PumpRepository):
 
     async def get_by_id(self, pump_id: str) -> Optional[Pump]:
         """Obtiene una bomba por ID"""
-        async with self.db_manager.get_session() as session:
+        async with self.db_manager.get_read_session(
+            primary=self.read_your_writes
+        ) as session:
             result = await session.execute(
                 select(PumpModel).where(PumpModel.id == pump_id)
             )
@@ -506,7 +1227,9 @@ class SQLAlchemyPumpRepository(PumpRepository):
 
     async def get_by_device_id(self, device_id: str) -> Optional[Pump]:
         """Obtiene la bomba de un dispositivo"""
-        async with self.db_manager.get_session() as session:
+        async with self.db_manager.get_read_session(
+            primary=self.read_your_writes
+        ) as session:
             result = await session.execute(
                 select(PumpModel).where(PumpModel.device_id == device_id)
             )
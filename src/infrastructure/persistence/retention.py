@@ -0,0 +1,381 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import Table, and_, delete, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.infrastructure.persistence.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Cuántos días se conserva cada nivel de detalle (0 = para siempre)
+
+    Los rollups diarios se conservan siempre.
+    """
+
+    raw_days: int = 14
+    minute_days: int = 365
+    hour_days: int = 0
+
+
+@dataclass
+class RetentionReport:
+    """Resultado de una ejecución de la política de retención"""
+
+    started_at: datetime
+    raw_cutoff: Optional[datetime] = None
+    raw_rows_deleted: int = 0
+    raw_rows_archived: int = 0
+    segments_written: int = 0
+    partitions_dropped: List[str] = field(default_factory=list)
+    rollup_rows_deleted: Dict[str, int] = field(default_factory=dict)
+    devices_downsampled: int = 0
+    reclaimed_bytes: int = 0
+    duration_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "raw_cutoff": self.raw_cutoff.isoformat() if self.raw_cutoff else None,
+            "raw_rows_deleted": self.raw_rows_deleted,
+            "raw_rows_archived": self.raw_rows_archived,
+            "segments_written": self.segments_written,
+            "partitions_dropped": self.partitions_dropped,
+            "rollup_rows_deleted": self.rollup_rows_deleted,
+            "devices_downsampled": self.devices_downsampled,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "duration_seconds": round(self.duration_seconds, 3),
+        }
+
+
+class RetentionEngine:
+    """
+    Motor de retención y downsampling de lecturas
+
+    En cada ejecución:
+
+    1. Verifica que los rollups cubran las lecturas que van a expirar y
+       los recalcula si no es así (nunca se borra sin agregar antes).
+       Con archivo columnar, además copia esas lecturas a segmentos en
+       disco antes de borrarlas de la base de datos.
+    2. Elimina las particiones mensuales completas vencidas (DROP TABLE).
+    3. Borra el resto de lecturas vencidas y los rollups por minuto y por
+       hora vencidos en bloques de `chunk_size` filas, cada uno en su propia
+       transacción y con una pausa entre bloques, para no retener bloqueos.
+
+    Los cortes se alinean al inicio del día para que los rollups diarios
+    siempre correspondan a días completos.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        policy: RetentionPolicy,
+        chunk_size: int = 5000,
+        pause_ms: int = 50,
+        interval_seconds: int = 3600,
+    ):
+        self.db_manager = db_manager
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self.pause = pause_ms / 1000
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._runs = 0
+        self._failures = 0
+        self._last_report: Optional[RetentionReport] = None
+
+    @property
+    def is_running(self) -> bool:
+        """Indica si la tarea periódica está activa"""
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Inicia la ejecución periódica en segundo plano"""
+        if self.is_running:
+            return
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """Detiene la ejecución periódica"""
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run_loop(self):
+        """Loop de retención"""
+        while True:
+            try:
+                report = await self.run()
+                logger.info(
+                    "Retención: %d lecturas, %d rollups y %d particiones eliminadas",
+                    report.raw_rows_deleted,
+                    sum(report.rollup_rows_deleted.values()),
+                    len(report.partitions_dropped),
+                )
+            except Exception:
+                self._failures += 1
+                logger.exception("Error aplicando la política de retención")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run(self, now: Optional[datetime] = None) -> RetentionReport:
+        """Aplica la política de retención una vez"""
+        started = time.perf_counter()
+        now = now or datetime.now()
+        today = datetime.combine(now.date(), datetime.min.time())
+        report = RetentionReport(started_at=now)
+        bytes_before = await self._free_bytes()
+
+        rollups = self.db_manager.rollups
+        partitions = self.db_manager.partitions
+
+        if self.policy.raw_days > 0 and rollups.enabled:
+            cutoff = today - timedelta(days=self.policy.raw_days)
+            report.raw_cutoff = cutoff
+            report.devices_downsampled = await self._downsample(cutoff)
+            if self.db_manager.archive is not None:
+                await self._archive(cutoff, report)
+
+            if partitions.enabled:
+                async with self.db_manager.engine.begin() as conn:
+                    await partitions.refresh(conn)
+                    expired = partitions.expired(cutoff)
+                    report.raw_rows_deleted += await self._relation_rows(
+                        conn, expired
+                    )
+                    report.reclaimed_bytes += await self._relation_bytes(
+                        conn, expired
+                    )
+                    report.partitions_dropped = await partitions.drop_before(
+                        conn, cutoff
+                    )
+
+            for table in partitions.tables_before(cutoff):
+                deleted = await self._delete_chunked(
+                    table, table.c.timestamp < cutoff, [table.c.id]
+                )
+                report.raw_rows_deleted += deleted
+                report.reclaimed_bytes += await self._estimated_bytes(table, deleted)
+
+        for resolution, days in (
+            ("minute", self.policy.minute_days),
+            ("hour", self.policy.hour_days),
+        ):
+            if days <= 0:
+                continue
+            table = rollups.table
+            c = table.c
+            deleted = await self._delete_chunked(
+                table,
+                and_(
+                    c.resolution == resolution,
+                    c.bucket_start < today - timedelta(days=days),
+                ),
+                [c.device_id, c.resolution, c.bucket_start],
+            )
+            report.rollup_rows_deleted[resolution] = deleted
+            report.reclaimed_bytes += await self._estimated_bytes(table, deleted)
+
+        bytes_after = await self._free_bytes()
+        if bytes_before is not None:
+            # SQLite: las páginas liberadas quedan disponibles para reutilizar
+            report.reclaimed_bytes = max(0, bytes_after - bytes_before)
+
+        report.duration_seconds = time.perf_counter() - started
+        self._runs += 1
+        self._last_report = report
+        return report
+
+    async def _downsample(self, cutoff: datetime) -> int:
+        """
+        Recalcula los rollups de los dispositivos cuyas lecturas por vencer
+        no estén completamente agregadas
+
+        Returns:
+            Cantidad de dispositivos recalculados
+        """
+        partitions = self.db_manager.partitions
+        rollups = self.db_manager.rollups
+
+        # Lecturas por vencer por dispositivo: (cantidad, primer timestamp)
+        raw: Dict[str, List] = {}
+        async with self.db_manager.engine.connect() as conn:
+            await partitions.refresh(conn)
+            for table in partitions.tables_before(cutoff):
+                result = await conn.execute(
+                    select(
+                        table.c.device_id,
+                        func.count(),
+                        func.min(table.c.timestamp),
+                    )
+                    .where(table.c.timestamp < cutoff)
+                    .group_by(table.c.device_id)
+                )
+                for device_id, count, first in result:
+                    if device_id in raw:
+                        raw[device_id][0] += count
+                        first = min(first, raw[device_id][1])
+                        raw[device_id][1] = first
+                    else:
+                        raw[device_id] = [count, first]
+
+            stale = []
+            c = rollups.table.c
+            for device_id, (count, first) in raw.items():
+                day = datetime.combine(first.date(), datetime.min.time())
+                result = await conn.execute(
+                    select(func.coalesce(func.sum(c.count), 0)).where(
+                        and_(
+                            c.device_id == device_id,
+                            c.resolution == "day",
+                            c.bucket_start >= day,
+                            c.bucket_start < cutoff,
+                        )
+                    )
+                )
+                if result.scalar() != count:
+                    stale.append((device_id, first))
+
+        for device_id, first in stale:
+            async with self.db_manager.engine.begin() as conn:
+                await rollups.rebuild(
+                    conn, device_id, first, cutoff - timedelta(microseconds=1)
+                )
+        return len(stale)
+
+    async def _archive(self, cutoff: datetime, report: RetentionReport):
+        """Copia al archivo columnar las lecturas anteriores a `cutoff`"""
+        partitions = self.db_manager.partitions
+        archive = self.db_manager.archive
+
+        # Días con lecturas por vencer de cada dispositivo
+        days = set()
+        async with self.db_manager.engine.connect() as conn:
+            await partitions.refresh(conn)
+            for table in partitions.tables_before(cutoff):
+                result = await conn.execute(
+                    select(table.c.device_id, func.date(table.c.timestamp))
+                    .where(table.c.timestamp < cutoff)
+                    .distinct()
+                )
+                for device_id, day in result:
+                    # SQLite retorna la fecha como texto
+                    if not isinstance(day, date):
+                        day = date.fromisoformat(day)
+                    days.add((device_id, datetime.combine(day, datetime.min.time())))
+
+        for device_id, day in sorted(days):
+            next_day = day + timedelta(days=1)
+            rows = []
+            async with self.db_manager.engine.connect() as conn:
+                for table in partitions.tables_for_range(day, next_day):
+                    result = await conn.execute(
+                        select(table).where(
+                            and_(
+                                table.c.device_id == device_id,
+                                table.c.timestamp >= day,
+                                table.c.timestamp < min(next_day, cutoff),
+                            )
+                        )
+                    )
+                    rows.extend(result.all())
+            if rows:
+                # Escritura y fsync fuera del event loop
+                archived = await asyncio.to_thread(archive.write, device_id, day, rows)
+                if archived:
+                    report.raw_rows_archived += archived
+                    report.segments_written += 1
+
+    async def _delete_chunked(self, table: Table, condition, key_columns) -> int:
+        """Borra las filas que cumplen `condition` en bloques acotados"""
+        deleted = 0
+        key = tuple_(*key_columns) if len(key_columns) > 1 else key_columns[0]
+        while True:
+            chunk = select(*key_columns).where(condition).limit(self.chunk_size)
+            async with self.db_manager.engine.begin() as conn:
+                result = await conn.execute(delete(table).where(key.in_(chunk)))
+            deleted += result.rowcount
+            if result.rowcount < self.chunk_size:
+                return deleted
+            # Dejar pasar a la ingesta entre bloques
+            await asyncio.sleep(self.pause)
+
+    async def _free_bytes(self) -> Optional[int]:
+        """Bytes libres dentro del archivo (solo SQLite)"""
+        if self.db_manager.engine.dialect.name != "sqlite":
+            return None
+        async with self.db_manager.engine.connect() as conn:
+            page_size = (await conn.execute(text("PRAGMA page_size"))).scalar()
+            free_pages = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+        return page_size * free_pages
+
+    async def _relation_rows(self, conn: AsyncConnection, names: List[str]) -> int:
+        """Filas de las tablas indicadas (estimadas en PostgreSQL)"""
+        total = 0
+        for name in names:
+            if conn.dialect.name == "postgresql":
+                query = text(
+                    "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class "
+                    "WHERE oid = to_regclass(:name)"
+                )
+                result = await conn.execute(query, {"name": name})
+            else:
+                result = await conn.execute(text(f"SELECT COUNT(*) FROM {name}"))
+            total += result.scalar() or 0
+        return total
+
+    async def _relation_bytes(self, conn: AsyncConnection, names: List[str]) -> int:
+        """Tamaño en disco de las tablas indicadas (solo PostgreSQL)"""
+        if conn.dialect.name != "postgresql" or not names:
+            return 0
+        total = 0
+        for name in names:
+            result = await conn.execute(
+                text("SELECT pg_total_relation_size(to_regclass(:name))"),
+                {"name": name},
+            )
+            total += result.scalar() or 0
+        return total
+
+    async def _estimated_bytes(self, table: Table, rows: int) -> int:
+        """
+        Bytes estimados de `rows` filas borradas (solo PostgreSQL, según el
+        tamaño medio de fila; el espacio se recupera tras VACUUM)
+        """
+        if self.db_manager.engine.dialect.name != "postgresql" or not rows:
+            return 0
+        async with self.db_manager.engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT pg_total_relation_size(c.oid) / GREATEST(c.reltuples, 1) "
+                    "FROM pg_class c WHERE c.oid = to_regclass(:name)"
+                ),
+                {"name": table.name},
+            )
+            row_bytes = result.scalar() or 0
+        return int(row_bytes * rows)
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de retención"""
+        return {
+            "running": self.is_running,
+            "policy": {
+                "raw_days": self.policy.raw_days,
+                "minute_days": self.policy.minute_days,
+                "hour_days": self.policy.hour_days,
+            },
+            "runs": self._runs,
+            "failures": self._failures,
+            "last_report": self._last_report.to_dict() if self._last_report else None,
+        }
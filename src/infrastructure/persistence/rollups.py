@@ -0,0 +1,443 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import Table, and_, case, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.domain.value_objects.metrics import FlowAggregate
+from src.infrastructure.persistence.partitions import FlowReadingPartitions
+
+# Resoluciones de los rollups, de la más gruesa a la más fina
+RESOLUTIONS: List[Tuple[str, timedelta]] = [
+    ("day", timedelta(days=1)),
+    ("hour", timedelta(hours=1)),
+    ("minute", timedelta(minutes=1)),
+]
+_WIDTHS = dict(RESOLUTIONS)
+
+RollupKey = Tuple[str, str, datetime]
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    """Inicio del intervalo que contiene a `timestamp`"""
+    timestamp = timestamp.replace(second=0, microsecond=0, tzinfo=None)
+    if resolution == "minute":
+        return timestamp
+    timestamp = timestamp.replace(minute=0)
+    if resolution == "hour":
+        return timestamp
+    return timestamp.replace(hour=0)
+
+
+def _bucket_ceil(timestamp: datetime, resolution: str) -> datetime:
+    """Primer inicio de intervalo mayor o igual a `timestamp`"""
+    start = bucket_start(timestamp, resolution)
+    return start if start == timestamp else start + _WIDTHS[resolution]
+
+
+def plan_range(
+    start: datetime, stop: datetime
+) -> Tuple[List[Tuple[str, datetime, datetime]], List[Tuple[datetime, datetime]]]:
+    """
+    Descompone [start, stop) en intervalos de rollup y bordes sin agregar
+
+    Los días completos se leen de los rollups diarios, las horas completas
+    de los rollups por hora y así sucesivamente; solo los fragmentos de
+    menos de un minuto en los extremos se leen de las lecturas.
+
+    Returns:
+        (rangos de rollup [(resolución, desde, hasta)], rangos de lecturas)
+    """
+    rollup_ranges = []
+    raw_ranges = []
+
+    def cover(lo: datetime, hi: datetime, level: int):
+        if lo >= hi:
+            return
+        if level == len(RESOLUTIONS):
+            raw_ranges.append((lo, hi))
+            return
+        resolution = RESOLUTIONS[level][0]
+        first, last = _bucket_ceil(lo, resolution), bucket_start(hi, resolution)
+        if first >= last:
+            cover(lo, hi, level + 1)
+            return
+        cover(lo, first, level + 1)
+        rollup_ranges.append((resolution, first, last))
+        cover(last, hi, level + 1)
+
+    cover(start, stop, 0)
+    return rollup_ranges, raw_ranges
+
+
+class FlowRollups:
+    """
+    Rollups de lecturas de flujo por dispositivo (minuto, hora y día)
+
+    Cada fila guarda count, suma, suma de cuadrados, mínimo, máximo y el
+    último total_volume del intervalo, lo suficiente para calcular promedio,
+    desviación estándar y volumen final de cualquier rango combinando
+    intervalos. Se actualizan con un UPSERT incremental en la misma
+    transacción que inserta las lecturas, de modo que nunca quedan
+    desfasados respecto a flow_readings.
+
+    Las métricas de un rango leen unos cientos de rollups y, como mucho, un
+    minuto de lecturas en cada extremo.
+    """
+
+    def __init__(
+        self, table: Table, partitions: FlowReadingPartitions, dialect: str
+    ):
+        self.table = table
+        self.partitions = partitions
+        self.dialect = dialect
+        # El UPSERT incremental solo está disponible en estos dialectos
+        self.enabled = dialect in ("postgresql", "sqlite")
+        # Lecturas movidas al archivo columnar (FlowReadingArchive)
+        self.archive = None
+        # Se marca en create_tables cuando los rollups cubren las lecturas;
+        # hasta entonces las métricas se calculan desde las lecturas
+        self.verified = False
+
+    # ============================================
+    # Mantenimiento
+    # ============================================
+
+    @staticmethod
+    def aggregate_readings(readings: Iterable) -> Dict[RollupKey, FlowAggregate]:
+        """Agrupa lecturas (entidades o filas) por dispositivo e intervalo"""
+        aggregates: Dict[RollupKey, FlowAggregate] = {}
+        for reading in readings:
+            timestamp = reading.timestamp.replace(tzinfo=None)
+            for resolution, _ in RESOLUTIONS:
+                key = (
+                    reading.device_id,
+                    resolution,
+                    bucket_start(timestamp, resolution),
+                )
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregate = aggregates[key] = FlowAggregate()
+                aggregate.add(reading.flow_rate, reading.total_volume, timestamp)
+        return aggregates
+
+    async def apply(self, conn: AsyncConnection, readings: Iterable):
+        """Suma lecturas recién insertadas a sus rollups"""
+        if not self.enabled:
+            return
+        aggregates = self.aggregate_readings(readings)
+        if aggregates:
+            await self._upsert(conn, aggregates)
+
+    async def rebuild(
+        self, conn: AsyncConnection, device_id: str, start: datetime, end: datetime
+    ) -> int:
+        """
+        Recalcula desde las lecturas los rollups de los días que abarca el
+        rango (tras cargas masivas, eliminaciones o para datos históricos)
+
+        Returns:
+            Cantidad de lecturas procesadas
+        """
+        if not self.enabled:
+            return 0
+
+        day = bucket_start(start, "day")
+        stop = bucket_start(end, "day") + _WIDTHS["day"]
+        c = self.table.c
+        await conn.execute(
+            delete(self.table).where(
+                and_(
+                    c.device_id == device_id,
+                    c.bucket_start >= day,
+                    c.bucket_start < stop,
+                )
+            )
+        )
+
+        processed = 0
+        # Un día a la vez para acotar la memoria
+        while day < stop:
+            next_day = day + _WIDTHS["day"]
+            readings = await self._read_raw(conn, device_id, day, next_day)
+            if readings:
+                await self._upsert(conn, self.aggregate_readings(readings))
+                processed += len(readings)
+            day = next_day
+        return processed
+
+    async def uncovered_devices(self, conn: AsyncConnection) -> List[str]:
+        """
+        Dispositivos con lecturas que los rollups diarios no cubren
+
+        Compara, por dispositivo, las lecturas de la base de datos con la
+        suma de los rollups diarios desde el día de la primera lectura (la
+        retención corta en días completos y conserva los rollups diarios).
+        """
+        if not self.enabled:
+            return []
+
+        readings: Dict[str, Tuple[int, datetime]] = {}
+        for table in self.partitions.all_tables():
+            result = await conn.execute(
+                select(
+                    table.c.device_id, func.count(), func.min(table.c.timestamp)
+                ).group_by(table.c.device_id)
+            )
+            for device_id, count, first in result:
+                if device_id in readings:
+                    count += readings[device_id][0]
+                    first = min(first, readings[device_id][1])
+                readings[device_id] = (count, first)
+
+        c = self.table.c
+        uncovered = []
+        for device_id, (count, first) in sorted(readings.items()):
+            covered = await conn.execute(
+                select(func.coalesce(func.sum(c.count), 0)).where(
+                    and_(
+                        c.device_id == device_id,
+                        c.resolution == "day",
+                        c.bucket_start >= bucket_start(first, "day"),
+                    )
+                )
+            )
+            if covered.scalar() < count:
+                uncovered.append(device_id)
+        return uncovered
+
+    async def _upsert(
+        self, conn: AsyncConnection, aggregates: Dict[RollupKey, FlowAggregate]
+    ):
+        """Combina los agregados con los rollups existentes"""
+        insert_fn = pg_insert if self.dialect == "postgresql" else sqlite_insert
+        statement = insert_fn(self.table)
+        excluded = statement.excluded
+        c = self.table.c
+        if self.dialect == "postgresql":
+            least, greatest = func.least, func.greatest
+        else:
+            # En SQLite min()/max() con dos argumentos son escalares
+            least, greatest = func.min, func.max
+
+        statement = statement.on_conflict_do_update(
+            index_elements=["device_id", "resolution", "bucket_start"],
+            set_={
+                "count": c.count + excluded.count,
+                "sum_flow": c.sum_flow + excluded.sum_flow,
+                "sum_sq_flow": c.sum_sq_flow + excluded.sum_sq_flow,
+                "min_flow": least(c.min_flow, excluded.min_flow),
+                "max_flow": greatest(c.max_flow, excluded.max_flow),
+                "last_total_volume": case(
+                    (
+                        excluded.last_timestamp >= c.last_timestamp,
+                        excluded.last_total_volume,
+                    ),
+                    else_=c.last_total_volume,
+                ),
+                "last_timestamp": greatest(c.last_timestamp, excluded.last_timestamp),
+            },
+        )
+
+        # Orden estable para que transacciones concurrentes no se bloqueen
+        rows = [
+            {
+                "device_id": device_id,
+                "resolution": resolution,
+                "bucket_start": start,
+                "count": aggregate.count,
+                "sum_flow": aggregate.sum_flow,
+                "sum_sq_flow": aggregate.sum_sq_flow,
+                "min_flow": aggregate.min_flow,
+                "max_flow": aggregate.max_flow,
+                "last_timestamp": aggregate.last_timestamp,
+                "last_total_volume": aggregate.last_total_volume,
+            }
+            for (device_id, resolution, start), aggregate in sorted(
+                aggregates.items(), key=lambda item: item[0]
+            )
+        ]
+        await conn.execute(statement, rows)
+
+    # ============================================
+    # Lectura
+    # ============================================
+
+    async def read(
+        self, conn: AsyncConnection, device_id: str, start: datetime, end: datetime
+    ) -> FlowAggregate:
+        """Agregado de las lecturas de un dispositivo en [start, end]"""
+        start = start.replace(tzinfo=None)
+        # El rango es inclusivo en `end`
+        stop = end.replace(tzinfo=None) + timedelta(microseconds=1)
+
+        if self.enabled and self.verified:
+            rollup_ranges, raw_ranges = plan_range(start, stop)
+        else:
+            rollup_ranges, raw_ranges = [], [(start, stop)]
+
+        aggregate = FlowAggregate()
+        if rollup_ranges:
+            c = self.table.c
+            result = await conn.execute(
+                select(self.table).where(
+                    and_(
+                        c.device_id == device_id,
+                        or_(
+                            *(
+                                and_(
+                                    c.resolution == resolution,
+                                    c.bucket_start >= lo,
+                                    c.bucket_start < hi,
+                                )
+                                for resolution, lo, hi in rollup_ranges
+                            )
+                        ),
+                    )
+                )
+            )
+            for row in result:
+                aggregate.merge(self._to_aggregate(row))
+
+        for lo, hi in raw_ranges:
+            aggregate.merge(await self._aggregate_raw(conn, device_id, lo, hi))
+        return aggregate
+
+    async def _aggregate_raw(
+        self, conn: AsyncConnection, device_id: str, lo: datetime, hi: datetime
+    ) -> FlowAggregate:
+        """
+        Agregado de las lecturas de [lo, hi) calculado en SQL
+
+        Se usa la forma suma / suma de cuadrados en todos los dialectos
+        (SQLite no tiene STDDEV y los agregados parciales se combinan). Si
+        el rango tiene días archivados, las lecturas se combinan en Python
+        para no contar dos veces las que siguen en la base de datos.
+        """
+        if self.archive is not None and self.archive.days(device_id, lo, hi):
+            aggregate = FlowAggregate()
+            for reading in await self._read_raw(conn, device_id, lo, hi):
+                aggregate.add(reading.flow_rate, reading.total_volume, reading.timestamp)
+            return aggregate
+
+        aggregate = FlowAggregate()
+        for table in self.partitions.tables_for_range(lo, hi):
+            c = table.c
+            where = and_(c.device_id == device_id, c.timestamp >= lo, c.timestamp < hi)
+            totals = (
+                await conn.execute(
+                    select(
+                        func.count(),
+                        func.sum(c.flow_rate),
+                        func.sum(c.flow_rate * c.flow_rate),
+                        func.min(c.flow_rate),
+                        func.max(c.flow_rate),
+                    ).where(where)
+                )
+            ).one()
+            if not totals[0]:
+                continue
+            last = (
+                await conn.execute(
+                    select(c.timestamp, c.total_volume)
+                    .where(where)
+                    .order_by(c.timestamp.desc())
+                    .limit(1)
+                )
+            ).one()
+            aggregate.merge(
+                FlowAggregate(
+                    count=totals[0],
+                    sum_flow=totals[1],
+                    sum_sq_flow=totals[2],
+                    min_flow=totals[3],
+                    max_flow=totals[4],
+                    last_timestamp=last.timestamp,
+                    last_total_volume=last.total_volume,
+                )
+            )
+        return aggregate
+
+    async def read_days(
+        self, conn: AsyncConnection, device_id: str, start: datetime, stop: datetime
+    ) -> Dict[datetime, FlowAggregate]:
+        """Agregados por día de los días completos en [start, stop)"""
+        days: Dict[datetime, FlowAggregate] = {}
+        if not (self.enabled and self.verified):
+            readings = await self._read_raw(conn, device_id, start, stop)
+            for (_, resolution, day), aggregate in self.aggregate_readings(
+                readings
+            ).items():
+                if resolution == "day":
+                    days[day] = aggregate
+            return days
+
+        c = self.table.c
+        result = await conn.execute(
+            select(self.table).where(
+                and_(
+                    c.device_id == device_id,
+                    c.resolution == "day",
+                    c.bucket_start >= start,
+                    c.bucket_start < stop,
+                )
+            )
+        )
+        for row in result:
+            days[row.bucket_start] = self._to_aggregate(row)
+        return days
+
+    @staticmethod
+    def _to_aggregate(row) -> FlowAggregate:
+        """Construye el agregado desde una fila de flow_rollups"""
+        return FlowAggregate(
+            count=row.count,
+            sum_flow=row.sum_flow,
+            sum_sq_flow=row.sum_sq_flow,
+            min_flow=row.min_flow,
+            max_flow=row.max_flow,
+            last_timestamp=row.last_timestamp,
+            last_total_volume=row.last_total_volume,
+        )
+
+    async def _read_raw(
+        self, conn: AsyncConnection, device_id: str, lo: datetime, hi: datetime
+    ) -> List:
+        """
+        Lecturas de un dispositivo en [lo, hi), ordenadas por timestamp,
+        incluidas las archivadas
+        """
+        rows = []
+        tables = self.partitions.tables_for_range(lo, hi)
+        for table in tables:
+            result = await conn.execute(
+                select(
+                    table.c.id,
+                    table.c.device_id,
+                    table.c.flow_rate,
+                    table.c.total_volume,
+                    table.c.timestamp,
+                )
+                .where(
+                    and_(
+                        table.c.device_id == device_id,
+                        table.c.timestamp >= lo,
+                        table.c.timestamp < hi,
+                    )
+                )
+                .order_by(table.c.timestamp.asc())
+            )
+            rows.extend(result.all())
+
+        sort = len(tables) > 1
+        if self.archive is not None:
+            archived = self.archive.get_readings(device_id, lo, hi)
+            if archived:
+                # Una lectura archivada cuyo borrado no llegó a confirmarse
+                # sigue en la BD: se cuenta una sola vez
+                ids = {row.id for row in rows}
+                rows.extend(r for r in archived if r.id not in ids)
+                sort = True
+        if sort:
+            rows.sort(key=lambda row: row.timestamp)
+        return rows
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+@dataclass
+class SQLitePragmas:
+    """
+    Perfil de PRAGMAs que se aplica a cada conexión SQLite nueva
+
+    El perfil por defecto es el recomendado para producción: WAL permite
+    leer mientras se escribe y, con synchronous=NORMAL, un commit no espera
+    un fsync (una caída del sistema operativo puede perder las últimas
+    transacciones, nunca corromper la base de datos).
+    """
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size_kb: int = 64 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout_ms: int = 5000
+
+    def __post_init__(self):
+        # Los valores se interpolan en el SQL: solo se aceptan los conocidos
+        self.journal_mode = self.journal_mode.upper()
+        self.synchronous = self.synchronous.upper()
+        self.temp_store = self.temp_store.upper()
+        if self.journal_mode not in _JOURNAL_MODES:
+            raise ValueError(f"journal_mode inválido: {self.journal_mode}")
+        if self.synchronous not in _SYNCHRONOUS:
+            raise ValueError(f"synchronous inválido: {self.synchronous}")
+        if self.temp_store not in _TEMP_STORES:
+            raise ValueError(f"temp_store inválido: {self.temp_store}")
+
+    def statements(self) -> List[str]:
+        """Sentencias PRAGMA del perfil"""
+        return [
+            # Primero el timeout, para que las siguientes esperen un bloqueo
+            f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}",
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA mmap_size={int(self.mmap_size)}",
+            # Un valor negativo se interpreta en KiB en lugar de páginas
+            f"PRAGMA cache_size=-{int(self.cache_size_kb)}",
+            f"PRAGMA temp_store={self.temp_store}",
+        ]
+
+    def install(self, engine: AsyncEngine):
+        """Aplica el perfil a cada conexión que abra el engine"""
+        statements = self.statements()
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _apply_pragmas(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+            finally:
+                cursor.close()
+
+
+class SQLiteMaintenance:
+    """
+    Mantenimiento periódico de una base de datos SQLite
+
+    - `wal_checkpoint(TRUNCATE)`: copia el WAL a la base de datos y lo
+      vacía, para que no crezca sin límite cuando siempre hay lectores.
+    - `PRAGMA optimize`: actualiza las estadísticas del planner de las
+      tablas que lo necesiten.
+    """
+
+    def __init__(self, engine: AsyncEngine, interval_seconds: int = 600):
+        self.engine = engine
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._runs = 0
+        self._failures = 0
+        self._busy_checkpoints = 0
+        self._last_checkpoint: Optional[Dict] = None
+        self._last_duration = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        """Indica si la tarea periódica está activa"""
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Inicia el mantenimiento periódico en segundo plano"""
+        if self.is_running:
+            return
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """Detiene el mantenimiento periódico"""
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run_loop(self):
+        """Loop de mantenimiento"""
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.run()
+            except Exception as e:
+                self._failures += 1
+                print(f"Error en el mantenimiento de SQLite: {e}")
+
+    async def run(self) -> Dict:
+        """Ejecuta el checkpoint y la optimización una vez"""
+        started = time.perf_counter()
+        async with self.engine.connect() as conn:
+            result = await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            busy, wal_pages, checkpointed_pages = result.one()
+            await conn.exec_driver_sql("PRAGMA optimize")
+            await conn.commit()
+
+        if busy:
+            # Un lector impidió completar el checkpoint: se reintenta luego
+            self._busy_checkpoints += 1
+        self._last_checkpoint = {
+            "busy": bool(busy),
+            "wal_pages": wal_pages,
+            "checkpointed_pages": checkpointed_pages,
+        }
+        self._last_duration = time.perf_counter() - started
+        self._runs += 1
+        return self._last_checkpoint
+
+    def _wal_bytes(self) -> Optional[int]:
+        """Tamaño actual del archivo WAL"""
+        database = self.engine.url.database
+        if not database or database == ":memory:":
+            return None
+        try:
+            return os.path.getsize(f"{database}-wal")
+        except OSError:
+            return 0
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas de mantenimiento"""
+        return {
+            "running": self.is_running,
+            "runs": self._runs,
+            "failures": self._failures,
+            "busy_checkpoints": self._busy_checkpoints,
+            "last_checkpoint": self._last_checkpoint,
+            "last_duration_ms": round(self._last_duration * 1000, 2),
+            "wal_bytes": self._wal_bytes(),
+        }
@@ -0,0 +1,150 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Unidad de trabajo de la petición en curso
+_current: ContextVar[Optional["UnitOfWork"]] = ContextVar("unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional["UnitOfWork"]:
+    """Unidad de trabajo activa en el contexto actual, si la hay"""
+    unit_of_work = _current.get()
+    # Una tarea creada durante la petición hereda el contexto: una vez
+    # terminada la unidad de trabajo, sigue con sesiones propias
+    if unit_of_work is None or unit_of_work.closed:
+        return None
+    return unit_of_work
+
+
+class UnitOfWork:
+    """
+    Unidad de trabajo de una petición
+
+    Mientras está activa, `DatabaseManager.get_session` y
+    `get_read_session` entregan a todos los repositorios la misma sesión,
+    abierta recién cuando un repositorio la usa. Los `commit` de los
+    repositorios solo hacen flush: la transacción se confirma una vez al
+    salir, o se revierte si hubo un error, de modo que una operación con
+    varias escrituras es atómica. Los callbacks `after_rollback` permiten
+    descartar estado en memoria derivado de escrituras revertidas.
+
+    Con `read_only` la sesión es de una réplica de lectura; las escrituras
+    y las lecturas que exigen el primario usan entonces su propia sesión.
+    """
+
+    def __init__(self, db_manager, read_only: bool = False):
+        self.db_manager = db_manager
+        self.read_only = read_only
+        self._session: Optional[AsyncSession] = None
+        # Los resolvers de GraphQL corren en paralelo: un uso a la vez
+        self._lock = asyncio.Lock()
+        self._owner: Optional[asyncio.Task] = None
+        self._after_commit: List[Callable[[], None]] = []
+        self._after_rollback: List[Callable[[], None]] = []
+        self._token = None
+        self.closed = False
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self._token = _current.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.closed = True
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.rollback()
+        return False
+
+    def borrow(self) -> "_BorrowedSession":
+        """Sesión compartida para un bloque `async with` de un repositorio"""
+        if self._session is None:
+            self._session = self.db_manager.new_session(read_only=self.read_only)
+        return _BorrowedSession(self)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Ejecuta `callback` cuando la transacción se confirme"""
+        self._after_commit.append(callback)
+
+    def after_rollback(self, callback: Callable[[], None]):
+        """Ejecuta `callback` si la transacción se revierte o falla el commit"""
+        self._after_rollback.append(callback)
+
+    async def commit(self):
+        """Confirma la transacción y ejecuta los callbacks pendientes"""
+        session, self._session = self._session, None
+        if session is not None:
+            try:
+                await session.commit()
+            except BaseException:
+                self._after_commit = []
+                self._run_after_rollback()
+                raise
+            finally:
+                await session.close()
+        self._after_rollback = []
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def rollback(self):
+        """Revierte la transacción y descarta los callbacks de commit"""
+        session, self._session = self._session, None
+        self._after_commit = []
+        try:
+            if session is not None:
+                try:
+                    await session.rollback()
+                finally:
+                    await session.close()
+        finally:
+            self._run_after_rollback()
+
+    def _run_after_rollback(self):
+        """Ejecuta los callbacks de rollback pendientes"""
+        callbacks, self._after_rollback = self._after_rollback, []
+        for callback in callbacks:
+            callback()
+
+
+class _BorrowedSession:
+    """
+    Sesión de la unidad de trabajo prestada a un repositorio
+
+    Se comporta como AsyncSession, pero `commit` solo hace flush y salir
+    del bloque no la cierra.
+    """
+
+    def __init__(self, unit_of_work: UnitOfWork):
+        self._unit_of_work = unit_of_work
+        self._session = unit_of_work._session
+        self._acquired = False
+
+    async def __aenter__(self) -> "_BorrowedSession":
+        unit_of_work = self._unit_of_work
+        task = asyncio.current_task()
+        # Reentrante: un bloque anidado en la misma tarea no se bloquea
+        if unit_of_work._owner is not task:
+            await unit_of_work._lock.acquire()
+            unit_of_work._owner = task
+            self._acquired = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._acquired:
+            self._unit_of_work._owner = None
+            self._unit_of_work._lock.release()
+            self._acquired = False
+        return False
+
+    async def commit(self):
+        # Se confirma una sola vez al terminar la unidad de trabajo
+        await self._session.flush()
+
+    async def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from src.domain.entities.flow_reading import FlowReading
+from src.shared.utils.metrics import RunningStats
+
+logger = logging.getLogger(__name__)
+
+
+class FlowReadingWriteBuffer:
+    """
+    Buffer de escritura diferida (write-behind) para lecturas de flujo
+
+    Las lecturas se encolan en una cola acotada y una tarea en segundo plano
+    las persiste con un único INSERT multi-fila cada `flush_interval_ms`
+    milisegundos o cuando se acumulan `flush_size` lecturas, lo que ocurra
+    primero. Así se paga un solo commit (fsync) por grupo en lugar de uno
+    por lectura.
+
+    Quien encola puede esperar a que su lectura sea durable (group commit)
+    o recibir confirmación inmediata (fire-and-ack). Si la cola está llena,
+    `submit` espera, aplicando contrapresión al productor.
+
+    Un grupo que falla se reintenta `max_retries` veces con espera
+    exponencial antes de descartarse; al descartarlo se avisa a los
+    listeners con cada dispositivo afectado, porque las lecturas
+    fire-and-ack ya fueron confirmadas.
+    """
+
+    def __init__(
+        self,
+        flush_batch: Callable[[List[FlowReading]], Awaitable[List[FlowReading]]],
+        max_queue_size: int = 10000,
+        flush_size: int = 500,
+        flush_interval_ms: int = 50,
+        max_retries: int = 3,
+        retry_backoff_ms: int = 100,
+    ):
+        self.flush_batch = flush_batch
+        self.max_queue_size = max_queue_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._drop_listeners: List[Callable[[str], None]] = []
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        # Última lectura encolada por dispositivo, aún no persistida
+        self._pending_latest: Dict[str, FlowReading] = {}
+
+        # Métricas
+        self._max_queue_depth = 0
+        self._flushes = 0
+        self._rows_flushed = 0
+        self._failed_rows = 0
+        self._retries = 0
+        self._flush_sizes = RunningStats()
+        self._flush_latency_ms = RunningStats()
+
+    @property
+    def is_running(self) -> bool:
+        """Indica si la tarea de vaciado está activa"""
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Inicia la tarea de vaciado en segundo plano"""
+        if self.is_running:
+            return
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Vacía las lecturas pendientes y detiene la tarea de vaciado"""
+        if not self.is_running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(
+        self, reading: FlowReading, durable: bool = True
+    ) -> FlowReading:
+        """
+        Encola una lectura para su escritura
+
+        Args:
+            reading: Lectura a persistir
+            durable: Si es True espera al commit del grupo y retorna la
+                lectura con su ID; si es False retorna inmediatamente la
+                lectura sin ID
+
+        Returns:
+            Lectura guardada (durable) o aceptada (fire-and-ack)
+        """
+        if not durable:
+            await self._put(reading, None)
+            return reading
+        return await (await self.enqueue(reading))
+
+    async def enqueue(self, reading: FlowReading) -> asyncio.Future:
+        """Encola una lectura durable y retorna el future de su commit"""
+        future = asyncio.get_running_loop().create_future()
+        await self._put(reading, future)
+        return future
+
+    async def _put(self, reading: FlowReading, future: Optional[asyncio.Future]):
+        """Agrega una lectura a la cola (espera si está llena)"""
+        self._pending_latest[reading.device_id] = reading
+        await self._queue.put((reading, future))
+
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+
+    def add_drop_listener(self, listener: Callable[[str], None]):
+        """
+        Registra una función que se llama con el device_id de cada
+        dispositivo con lecturas descartadas tras agotar los reintentos
+        """
+        self._drop_listeners.append(listener)
+
+    def get_pending_latest(self, device_id: str) -> Optional[FlowReading]:
+        """Obtiene la última lectura encolada y aún no persistida"""
+        return self._pending_latest.get(device_id)
+
+    async def _flush_loop(self):
+        """Loop de vaciado: agrupa lecturas por tamaño o por tiempo"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.flush_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[FlowReading, Optional[asyncio.Future]]]):
+        """Persiste un grupo de lecturas y resuelve a quienes esperan"""
+        readings = [reading for reading, _ in batch]
+        started = time.perf_counter()
+
+        try:
+            saved = await self._flush_with_retries(readings)
+        except Exception as e:
+            self._failed_rows += len(batch)
+            logger.exception(
+                "Error en escritura diferida de lecturas, se descartan %d", len(batch)
+            )
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            # El estado derivado de estas lecturas ya no es válido
+            for device_id in {reading.device_id for reading in readings}:
+                for listener in self._drop_listeners:
+                    listener(device_id)
+        else:
+            self._flushes += 1
+            self._rows_flushed += len(saved)
+            for (_, future), saved_reading in zip(batch, saved):
+                if future is not None and not future.done():
+                    future.set_result(saved_reading)
+        finally:
+            self._flush_sizes.record(len(batch))
+            self._flush_latency_ms.record((time.perf_counter() - started) * 1000)
+
+            # Las lecturas ya no están pendientes si no llegó otra más nueva
+            for reading in readings:
+                if self._pending_latest.get(reading.device_id) is reading:
+                    del self._pending_latest[reading.device_id]
+
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush_with_retries(
+        self, readings: List[FlowReading]
+    ) -> List[FlowReading]:
+        """Persiste un grupo, reintentando con espera exponencial si falla"""
+        for attempt in range(self.max_retries):
+            try:
+                return await self.flush_batch(readings)
+            except Exception as e:
+                self._retries += 1
+                delay = self.retry_backoff * 2**attempt
+                logger.warning(
+                    "Error en escritura diferida de lecturas (reintento en %.1f s): %s",
+                    delay,
+                    e,
+                )
+                await asyncio.sleep(delay)
+        return await self.flush_batch(readings)
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas del buffer"""
+        return {
+            "running": self.is_running,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self._max_queue_depth,
+            "queue_capacity": self.max_queue_size,
+            "flushes": self._flushes,
+            "rows_flushed": self._rows_flushed,
+            "failed_rows": self._failed_rows,
+            "retries": self._retries,
+            "flush_size": self._flush_sizes.to_dict(),
+            "flush_latency_ms": self._flush_latency_ms.to_dict(),
+        }
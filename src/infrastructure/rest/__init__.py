@@ -1,4 +1,15 @@
 """REST API module"""
-from src.infrastructure.rest.routes import create_sensor_router
+from src.infrastructure.rest.routes import (
+    create_sensor_router,
+    create_export_router,
+    create_monitoring_router,
+)
+from src.infrastructure.rest.stream import DeviceConnectionRegistry, create_stream_router
 
-__all__ = ["create_sensor_router"]
+__all__ = [
+    "create_sensor_router",
+    "create_export_router",
+    "create_monitoring_router",
+    "create_stream_router",
+    "DeviceConnectionRegistry",
+]
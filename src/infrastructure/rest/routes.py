@@ -1,13 +1,23 @@
 """
 Rutas REST API para el sistema de dispensador de agua
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional
+from collections import Counter
+from contextlib import nullcontext
 from datetime import datetime
+import json
+import time
 
 from src.application.use_cases.record_flow_reading import RecordFlowReadingUseCase
 from src.application.dto.flow_reading_dto import CreateFlowReadingDTO
+from src.domain.repositories.flow_reading_repository import FlowReadingRepository
+from src.infrastructure.ingestion.binary_codec import decode_frames
+from src.infrastructure.ingestion.ndjson_stream import ImportStats, iter_reading_batches
+from src.infrastructure.ingestion.admission import AdmissionController
+from src.shared.exceptions.exceptions import AdmissionRejectedException
 
 
 class SensorDataInput(BaseModel):
@@ -36,7 +46,7 @@ class SensorDataInput(BaseModel):
 class FlowReadingResponse(BaseModel):
     """Modelo de respuesta para lectura de flujo"""
 
-    id: int
+    id: Optional[int]  # None si la lectura fue aceptada sin esperar persistencia
     device_id: str
     flow_rate: float
     total_volume: float
@@ -45,9 +55,40 @@ class FlowReadingResponse(BaseModel):
     unit: Optional[str] = None
     temperature: Optional[float] = None
     pressure: Optional[float] = None
+    duplicate: bool = False
     message: str = "Lectura registrada exitosamente"
 
 
+class BatchReadingResponse(BaseModel):
+    """Modelo de respuesta para un lote de lecturas"""
+
+    accepted: int
+    duplicates: int = 0
+    readings: List[FlowReadingResponse]
+    message: str = "Lote registrado exitosamente"
+
+
+class IngestSummaryResponse(BaseModel):
+    """Respuesta compacta para ingesta binaria"""
+
+    accepted: int
+    duplicates: int = 0
+    last_total_volume: Optional[float] = None
+
+
+class ImportSummaryResponse(BaseModel):
+    """Resumen de una importación masiva NDJSON"""
+
+    accepted: int
+    duplicates: int
+    rejected: int
+    lines: int
+    bytes_received: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[str] = []
+
+
 class HealthResponse(BaseModel):
     """Respuesta para el health check"""
 
@@ -56,28 +97,94 @@ class HealthResponse(BaseModel):
     service: str
 
 
-def create_sensor_router(record_flow_reading_use_case: RecordFlowReadingUseCase) -> APIRouter:
+def _to_dto(data: SensorDataInput) -> CreateFlowReadingDTO:
+    """Convierte el input del sensor al DTO interno"""
+    return CreateFlowReadingDTO(
+        device_id=data.device_id,
+        flow_rate=data.flow_rate,
+        pulse_count=data.pulse_count,
+        unit=data.unit,
+        temperature=data.temperature,
+        pressure=data.pressure,
+        timestamp=data.timestamp,
+        total_volume=None,  # Se calculará automáticamente
+    )
+
+
+def _to_response(result) -> FlowReadingResponse:
+    """Convierte el DTO de respuesta al modelo REST"""
+    return FlowReadingResponse(
+        id=result.id,
+        device_id=result.device_id,
+        flow_rate=result.flow_rate,
+        total_volume=result.total_volume,
+        timestamp=result.timestamp,
+        pulse_count=result.pulse_count,
+        unit=result.unit,
+        temperature=result.temperature,
+        pressure=result.pressure,
+        duplicate=result.duplicate,
+    )
+
+
+def _rejected(e: AdmissionRejectedException) -> HTTPException:
+    """Convierte un rechazo de admisión en 429/503 con Retry-After"""
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def create_sensor_router(
+    record_flow_reading_use_case: RecordFlowReadingUseCase,
+    admission: Optional[AdmissionController] = None,
+    unit_of_work: Optional[Callable[[], Any]] = None,
+) -> APIRouter:
     """
     Crea el router para los endpoints del sensor
 
     Args:
-        record_flow_reading_use_case: Caso de uso para registrar lecturas
+        record_flow_reading_use_case: Caso de uso para registrar lecturas, o
+            un IngestionDispatcher con la misma interfaz
+        admission: Control de admisión de la ingesta (opcional)
+        unit_of_work: Fábrica de unidades de trabajo (ej.
+            `DatabaseManager.unit_of_work`): cada petición usa una sesión y
+            confirma una sola transacción (opcional)
 
     Returns:
         APIRouter configurado
     """
     router = APIRouter(prefix="/api/v1", tags=["sensor"])
 
+    def _admit(devices: Optional[Dict[str, int]] = None):
+        """Aplica el control de admisión si está configurado"""
+        if admission is None:
+            return nullcontext()
+        return admission.admit(devices)
+
+    def _unit_of_work():
+        """Unidad de trabajo de la petición si está configurada"""
+        if unit_of_work is None:
+            return nullcontext()
+        return unit_of_work()
+
     @router.post("/sensor/readings", response_model=FlowReadingResponse, status_code=201)
-    async def create_flow_reading(data: SensorDataInput):
+    async def create_flow_reading(
+        data: SensorDataInput, response: Response, durable: bool = True
+    ):
         """
         Endpoint POST para recibir datos del sensor de flujo (ESP32)
 
         Este endpoint recibe datos directamente del ESP32 en formato JSON
-        y los registra en el sistema.
+        y los registra en el sistema. Reenviar una lectura ya registrada
+        (mismo device_id, timestamp y pulse_count) responde 200 sin
+        duplicarla.
 
         Args:
             data: Datos del sensor en formato JSON
+            durable: Si es False y la escritura diferida está activa, se
+                responde 202 sin esperar a que la lectura se persista
 
         Returns:
             Confirmación con los datos registrados
@@ -87,33 +194,67 @@ def create_sensor_router(record_flow_reading_use_case: RecordFlowReadingUseCase)
         """
         try:
             # Convertir el input del sensor al DTO interno
-            dto = CreateFlowReadingDTO(
-                device_id=data.device_id,
-                flow_rate=data.flow_rate,
-                pulse_count=data.pulse_count,
-                unit=data.unit,
-                temperature=data.temperature,
-                pressure=data.pressure,
-                timestamp=data.timestamp,
-                total_volume=None,  # Se calculará automáticamente
-            )
+            dto = _to_dto(data)
 
             # Ejecutar el caso de uso
-            result = await record_flow_reading_use_case.execute(dto)
+            async with _admit({dto.device_id: 1}), _unit_of_work():
+                result = await record_flow_reading_use_case.execute(dto, durable)
 
             # Retornar la respuesta
-            return FlowReadingResponse(
-                id=result.id,
-                device_id=result.device_id,
-                flow_rate=result.flow_rate,
-                total_volume=result.total_volume,
-                timestamp=result.timestamp,
-                pulse_count=result.pulse_count,
-                unit=result.unit,
-                temperature=result.temperature,
-                pressure=result.pressure,
+            if result.duplicate:
+                response.status_code = 200
+                duplicate = _to_response(result)
+                duplicate.message = "Lectura duplicada (ya registrada)"
+                return duplicate
+            if result.id is None:
+                response.status_code = 202
+                accepted = _to_response(result)
+                accepted.message = "Lectura aceptada (escritura diferida)"
+                return accepted
+            return _to_response(result)
+
+        except AdmissionRejectedException as e:
+            raise _rejected(e)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error interno del servidor: {str(e)}"
             )
 
+    @router.post(
+        "/sensor/readings/batch", response_model=BatchReadingResponse, status_code=201
+    )
+    async def create_flow_readings_batch(data: List[SensorDataInput]):
+        """
+        Endpoint POST para recibir un lote de lecturas del sensor (ESP32)
+
+        Permite que el dispositivo acumule varias muestras y las envíe en una
+        sola petición. Todas las lecturas se guardan en una única transacción.
+
+        Args:
+            data: Lista de lecturas en formato JSON, en orden cronológico
+
+        Returns:
+            Cantidad de lecturas aceptadas y los datos registrados
+
+        Raises:
+            HTTPException: Si hay un error al procesar los datos
+        """
+        try:
+            dtos = [_to_dto(item) for item in data]
+            async with _admit(Counter(dto.device_id for dto in dtos)), _unit_of_work():
+                results = await record_flow_reading_use_case.execute_batch(dtos)
+            duplicates = sum(1 for r in results if r.duplicate)
+
+            return BatchReadingResponse(
+                accepted=len(results) - duplicates,
+                duplicates=duplicates,
+                readings=[_to_response(r) for r in results],
+            )
+
+        except AdmissionRejectedException as e:
+            raise _rejected(e)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
@@ -121,6 +262,120 @@ def create_sensor_router(record_flow_reading_use_case: RecordFlowReadingUseCase)
                 status_code=500, detail=f"Error interno del servidor: {str(e)}"
             )
 
+    @router.post(
+        "/sensor/readings/binary",
+        response_model=IngestSummaryResponse,
+        status_code=201,
+    )
+    async def create_flow_readings_binary(request: Request):
+        """
+        Endpoint POST para recibir lecturas en formato binario compacto
+
+        El cuerpo (application/octet-stream) contiene uno o más frames
+        little-endian con varias muestras cada uno (ver
+        `src/infrastructure/ingestion/binary_codec.py`). Se decodifica con
+        `struct` sin pasar por Pydantic y se registra como un lote.
+
+        Returns:
+            Cantidad de lecturas aceptadas y el último volumen acumulado
+
+        Raises:
+            HTTPException: Si el frame está mal formado o hay un error interno
+        """
+        try:
+            dtos = decode_frames(await request.body())
+            async with _admit(Counter(dto.device_id for dto in dtos)), _unit_of_work():
+                results = await record_flow_reading_use_case.execute_batch(dtos)
+            duplicates = sum(1 for r in results if r.duplicate)
+
+            return IngestSummaryResponse(
+                accepted=len(results) - duplicates,
+                duplicates=duplicates,
+                last_total_volume=results[-1].total_volume,
+            )
+
+        except AdmissionRejectedException as e:
+            raise _rejected(e)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error interno del servidor: {str(e)}"
+            )
+
+    @router.post("/sensor/readings/import", response_model=ImportSummaryResponse)
+    async def import_flow_readings(
+        request: Request,
+        batch_size: int = Query(default=500, ge=1, le=5000),
+    ):
+        """
+        Endpoint POST para importar masivamente lecturas en NDJSON
+
+        Pensado para gateways que se reconectan tras una caída y envían
+        horas de lecturas acumuladas. El cuerpo (una lectura JSON por línea,
+        opcionalmente comprimido con gzip) se parsea a medida que llega y se
+        guarda en lotes de `batch_size` sin cargarlo completo en memoria.
+
+        Las líneas inválidas se rechazan sin detener la importación, y las
+        lecturas ya registradas se cuentan como duplicadas, por lo que
+        reintentar una importación interrumpida es seguro.
+
+        Returns:
+            Lecturas aceptadas y rechazadas, y el throughput obtenido
+
+        Raises:
+            HTTPException: Si el cuerpo está corrupto o hay un error interno
+        """
+        stats = ImportStats()
+        started = time.perf_counter()
+        compressed = request.headers.get("content-encoding", "").lower() == "gzip"
+
+        try:
+            async for batch in iter_reading_batches(
+                request.stream(), stats, batch_size, compressed
+            ):
+                try:
+                    # Importación masiva: solo se limita la concurrencia
+                    async with _admit():
+                        results = await record_flow_reading_use_case.execute_batch(
+                            batch
+                        )
+                    duplicates = sum(1 for r in results if r.duplicate)
+                    stats.accepted += len(results) - duplicates
+                    stats.duplicates += duplicates
+                except ValueError as e:
+                    stats.reject(stats.lines, f"lote rechazado: {e}", len(batch))
+
+        except AdmissionRejectedException as e:
+            rejected = _rejected(e)
+            rejected.detail = f"{e} (aceptadas hasta ahora: {stats.accepted})"
+            raise rejected
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{e} (aceptadas hasta ahora: {stats.accepted})",
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=(
+                    f"Error interno del servidor: {str(e)} "
+                    f"(aceptadas hasta ahora: {stats.accepted})"
+                ),
+            )
+
+        elapsed = time.perf_counter() - started
+        return ImportSummaryResponse(
+            accepted=stats.accepted,
+            duplicates=stats.duplicates,
+            rejected=stats.rejected,
+            lines=stats.lines,
+            bytes_received=stats.bytes_received,
+            elapsed_seconds=round(elapsed, 3),
+            rows_per_second=round(stats.accepted / elapsed, 1) if elapsed > 0 else 0.0,
+            errors=stats.errors,
+        )
+
     @router.get("/health", response_model=HealthResponse)
     async def health_check():
         """
@@ -150,3 +405,106 @@ def create_sensor_router(record_flow_reading_use_case: RecordFlowReadingUseCase)
         return {"message": "Use GraphQL endpoint for queries"}
 
     return router
+
+
+def create_export_router(flow_reading_repository: FlowReadingRepository) -> APIRouter:
+    """
+    Crea el router de exportación de lecturas
+
+    Args:
+        flow_reading_repository: Repositorio de lecturas de flujo
+
+    Returns:
+        APIRouter configurado
+    """
+    router = APIRouter(prefix="/api/v1", tags=["export"])
+
+    @router.get("/sensor/readings/export")
+    async def export_flow_readings(
+        device_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        chunk_size: int = Query(default=1000, ge=1, le=10000),
+    ):
+        """
+        Exporta las lecturas de un rango en NDJSON (una lectura por línea)
+
+        La respuesta se genera a medida que se leen bloques de `chunk_size`
+        lecturas, así que exportar meses de datos no los carga en memoria.
+        Incluye las lecturas archivadas.
+
+        Args:
+            device_id: ID del dispositivo
+            start_date: Inicio del rango
+            end_date: Fin del rango (inclusive)
+
+        Returns:
+            Lecturas en formato application/x-ndjson
+        """
+        # Los timestamps se guardan sin zona: un extremo con zona y otro sin
+        # ella no se pueden comparar
+        start_date = start_date.replace(tzinfo=None)
+        end_date = end_date.replace(tzinfo=None)
+        if end_date < start_date:
+            raise HTTPException(
+                status_code=400, detail="end_date debe ser posterior a start_date"
+            )
+
+        async def lines():
+            async for chunk in flow_reading_repository.iter_by_date_range(
+                device_id, start_date, end_date, chunk_size
+            ):
+                yield "".join(
+                    json.dumps(
+                        {
+                            "id": r.id,
+                            "device_id": r.device_id,
+                            "timestamp": r.timestamp.isoformat(),
+                            "flow_rate": r.flow_rate,
+                            "total_volume": r.total_volume,
+                            "pulse_count": r.pulse_count,
+                            "unit": r.unit,
+                            "temperature": r.temperature,
+                            "pressure": r.pressure,
+                        }
+                    )
+                    + "\n"
+                    for r in chunk
+                )
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return router
+
+
+def create_monitoring_router(
+    metrics_providers: Dict[str, Callable[[], Dict[str, Any]]]
+) -> APIRouter:
+    """
+    Crea el router de monitoreo
+
+    Args:
+        metrics_providers: Funciones que retornan las métricas de cada
+            componente, indexadas por nombre
+
+    Returns:
+        APIRouter configurado
+    """
+    router = APIRouter(prefix="/api/v1", tags=["monitoring"])
+
+    @router.get("/monitoring/metrics")
+    async def get_metrics():
+        """
+        Obtiene las métricas internas de los componentes del servidor
+
+        Returns:
+            Métricas agrupadas por componente
+        """
+        return {
+            "timestamp": datetime.now(),
+            "components": {
+                name: provider() for name, provider in metrics_providers.items()
+            },
+        }
+
+    return router
@@ -0,0 +1,333 @@
+"""
+Canal WebSocket persistente para la ingesta de lecturas
+
+El dispositivo abre una sola conexión a /api/v1/sensor/stream y envía
+lecturas como frames:
+
+    texto    un objeto JSON (formato de POST /sensor/readings) o un arreglo
+    binario  uno o más frames del formato compacto (binary_codec)
+
+El servidor agrupa los frames recibidos, los registra como un lote y
+responde con un único ack por grupo:
+
+    {"type": "ack", "frame": <último frame procesado>, "accepted": n,
+     "duplicates": n, "last_total_volume": ...}
+
+Los frames inválidos se informan con {"type": "error", "frame": n, ...}; si
+el control de admisión rechaza un grupo, el error incluye "status" (429 o
+503) y "retry_after" en segundos.
+Por la misma conexión el servidor envía los comandos de bomba
+({"type": "pump_command", ...}) de los dispositivos que atiende.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from fastapi import APIRouter, WebSocket
+from src.application.use_cases.record_flow_reading import RecordFlowReadingUseCase
+from src.application.dto.flow_reading_dto import CreateFlowReadingDTO
+from src.application.dto.pump_dto import PumpResponseDTO
+from src.infrastructure.ingestion.binary_codec import decode_frames
+from src.infrastructure.ingestion.ndjson_stream import record_to_dto
+from src.infrastructure.ingestion.admission import AdmissionController
+from src.shared.exceptions.exceptions import AdmissionRejectedException
+from src.shared.utils.metrics import RateMeter, RunningStats
+
+# Frame recibido: (número de frame, instante de recepción, contenido)
+_Frame = Tuple[int, float, Any]
+
+
+class DeviceConnection:
+    """Conexión WebSocket de un dispositivo (envíos serializados)"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.device_ids: Set[str] = set()
+        self._send_lock = asyncio.Lock()
+
+    async def send_json(self, message: Dict[str, Any]) -> bool:
+        """Envía un mensaje; retorna False si la conexión ya no está activa"""
+        try:
+            async with self._send_lock:
+                await self.websocket.send_text(json.dumps(message, default=str))
+            return True
+        except Exception:
+            return False
+
+
+class DeviceConnectionRegistry:
+    """
+    Registro de las conexiones WebSocket activas por dispositivo
+
+    Permite enviar comandos a un dispositivo conectado y concentra las
+    métricas del canal (conexiones, frames por segundo y latencia de ack).
+    """
+
+    def __init__(self):
+        self._connections: Dict[str, Set[DeviceConnection]] = defaultdict(set)
+        self._active: Set[DeviceConnection] = set()
+        self.total_connections = 0
+        self.frames = RateMeter()
+        self.readings = RateMeter()
+        self.ack_latency_ms = RunningStats()
+        self.rejected_frames = 0
+        self.commands_sent = 0
+
+    def connect(self, connection: DeviceConnection):
+        """Registra una conexión nueva"""
+        self._active.add(connection)
+        self.total_connections += 1
+
+    def bind(self, connection: DeviceConnection, device_id: str):
+        """Asocia un dispositivo a la conexión por la que envía lecturas"""
+        if device_id not in connection.device_ids:
+            connection.device_ids.add(device_id)
+            self._connections[device_id].add(connection)
+
+    def disconnect(self, connection: DeviceConnection):
+        """Elimina una conexión y sus dispositivos asociados"""
+        self._active.discard(connection)
+        for device_id in connection.device_ids:
+            connections = self._connections.get(device_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self._connections[device_id]
+
+    def is_connected(self, device_id: str) -> bool:
+        """Indica si el dispositivo tiene una conexión activa"""
+        return device_id in self._connections
+
+    async def send_to_device(self, device_id: str, message: Dict[str, Any]) -> int:
+        """
+        Envía un mensaje a todas las conexiones de un dispositivo
+
+        Returns:
+            Cantidad de conexiones que recibieron el mensaje
+        """
+        delivered = 0
+        for connection in list(self._connections.get(device_id, ())):
+            if await connection.send_json(message):
+                delivered += 1
+        return delivered
+
+    async def push_pump_command(self, pump: PumpResponseDTO) -> int:
+        """Envía al dispositivo el nuevo estado de su bomba"""
+        delivered = await self.send_to_device(
+            pump.device_id,
+            {
+                "type": "pump_command",
+                "device_id": pump.device_id,
+                "action": pump.status,
+                "current_level": pump.current_level,
+                "timestamp": datetime.now().isoformat(),
+            },
+        )
+        self.commands_sent += delivered
+        return delivered
+
+    def get_metrics(self) -> Dict:
+        """Obtiene las métricas del canal WebSocket"""
+        return {
+            "connections": len(self._active),
+            "connected_devices": len(self._connections),
+            "total_connections": self.total_connections,
+            "frames_total": self.frames.total,
+            "frames_per_second": round(self.frames.rate, 2),
+            "readings_total": self.readings.total,
+            "readings_per_second": round(self.readings.rate, 2),
+            "rejected_frames": self.rejected_frames,
+            "ack_latency_ms": self.ack_latency_ms.to_dict(),
+            "commands_sent": self.commands_sent,
+        }
+
+
+def _decode_frame(content: Any) -> List[CreateFlowReadingDTO]:
+    """
+    Decodifica un frame de texto (JSON) o binario a DTOs
+
+    Raises:
+        ValueError: Si el frame no es válido
+    """
+    if isinstance(content, bytes):
+        return decode_frames(content)
+
+    payload = json.loads(content)
+    if isinstance(payload, list):
+        if not payload:
+            raise ValueError("El arreglo de lecturas está vacío")
+        return [record_to_dto(record) for record in payload]
+    return [record_to_dto(payload)]
+
+
+def create_stream_router(
+    record_flow_reading_use_case: RecordFlowReadingUseCase,
+    registry: DeviceConnectionRegistry,
+    ack_max_frames: int = 50,
+    ack_interval_ms: int = 100,
+    admission: Optional[AdmissionController] = None,
+) -> APIRouter:
+    """
+    Crea el router del canal WebSocket de ingesta
+
+    Args:
+        record_flow_reading_use_case: Caso de uso para registrar lecturas, o
+            un IngestionDispatcher con la misma interfaz
+        registry: Registro de conexiones activas
+        ack_max_frames: Frames agrupados como máximo en un ack
+        ack_interval_ms: Espera máxima para completar un grupo
+        admission: Control de admisión de la ingesta (opcional)
+
+    Returns:
+        APIRouter configurado
+    """
+    router = APIRouter(prefix="/api/v1", tags=["sensor"])
+    ack_interval = ack_interval_ms / 1000
+
+    @router.websocket("/sensor/stream")
+    async def sensor_stream(websocket: WebSocket, device_id: Optional[str] = None):
+        """
+        Canal persistente de lecturas para dispositivos (ESP32)
+
+        Args:
+            device_id: Dispositivo que abre la conexión (opcional; también
+                se asocia al recibir sus lecturas)
+        """
+        await websocket.accept()
+        connection = DeviceConnection(websocket)
+        registry.connect(connection)
+        if device_id:
+            registry.bind(connection, device_id)
+
+        # La cola acotada aplica contrapresión: si el procesamiento se
+        # atrasa, se deja de leer del socket
+        frames: asyncio.Queue = asyncio.Queue(maxsize=ack_max_frames * 2)
+        processor = asyncio.create_task(_process_frames(connection, frames))
+
+        try:
+            frame_number = 0
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                content = message.get("bytes")
+                if content is None:
+                    content = message.get("text")
+                if content is None:
+                    continue
+                frame_number += 1
+                registry.frames.mark()
+                await frames.put((frame_number, time.perf_counter(), content))
+        finally:
+            # Procesar lo recibido antes de cerrar. Con la cola llena no se
+            # espera a que se libere: se cancela el procesamiento y el
+            # dispositivo reenvía los frames sin ack al reconectar
+            try:
+                frames.put_nowait(None)
+            except asyncio.QueueFull:
+                processor.cancel()
+            try:
+                await processor
+            except asyncio.CancelledError:
+                pass
+            finally:
+                registry.disconnect(connection)
+
+    async def _process_frames(connection: DeviceConnection, frames: asyncio.Queue):
+        """Agrupa los frames recibidos, los registra y envía un ack por grupo"""
+        closed = False
+        while not closed:
+            item = await frames.get()
+            if item is None:
+                return
+
+            group: List[_Frame] = [item]
+            deadline = time.perf_counter() + ack_interval
+            while len(group) < ack_max_frames:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(frames.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closed = True
+                    break
+                group.append(item)
+
+            await _ingest_group(connection, group)
+
+    async def _ingest_group(connection: DeviceConnection, group: List[_Frame]):
+        """Registra un grupo de frames como un lote y envía el ack"""
+        dtos: List[CreateFlowReadingDTO] = []
+        valid_frames = 0
+        for frame_number, _, content in group:
+            try:
+                frame_dtos = _decode_frame(content)
+            except (ValueError, UnicodeDecodeError) as e:
+                registry.rejected_frames += 1
+                await connection.send_json(
+                    {"type": "error", "frame": frame_number, "detail": str(e)}
+                )
+                continue
+            for dto in frame_dtos:
+                registry.bind(connection, dto.device_id)
+            dtos.extend(frame_dtos)
+            valid_frames += 1
+
+        last_frame = group[-1][0]
+        if not dtos:
+            return
+
+        admit = (
+            admission.admit(Counter(dto.device_id for dto in dtos))
+            if admission is not None
+            else nullcontext()
+        )
+        try:
+            async with admit:
+                results = await record_flow_reading_use_case.execute_batch(dtos)
+        except AdmissionRejectedException as e:
+            registry.rejected_frames += valid_frames
+            await connection.send_json(
+                {
+                    "type": "error",
+                    "frame": last_frame,
+                    "frames": valid_frames,
+                    "status": e.status_code,
+                    "retry_after": e.retry_after,
+                    "detail": str(e),
+                }
+            )
+            return
+        except Exception as e:
+            registry.rejected_frames += valid_frames
+            await connection.send_json(
+                {
+                    "type": "error",
+                    "frame": last_frame,
+                    "frames": valid_frames,
+                    "detail": str(e),
+                }
+            )
+            return
+
+        duplicates = sum(1 for r in results if r.duplicate)
+        registry.readings.mark(len(results) - duplicates)
+        await connection.send_json(
+            {
+                "type": "ack",
+                "frame": last_frame,
+                "accepted": len(results) - duplicates,
+                "duplicates": duplicates,
+                "last_total_volume": results[-1].total_volume,
+            }
+        )
+        # Latencia desde que llegó el frame más antiguo del grupo
+        registry.ack_latency_ms.record((time.perf_counter() - group[0][1]) * 1000)
+
+    return router
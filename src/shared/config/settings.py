@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -8,6 +8,28 @@ class Settings(BaseSettings):
     # Base de datos
     DATABASE_URL: str = "sqlite+aiosqlite:///./water_dispenser.db"
 
+    # Réplicas de lectura: URLs separadas por coma (vacío = leer del primario)
+    DATABASE_READ_URLS: str = ""
+    DATABASE_POOL_SIZE: int = 5  # conexiones del primario (escrituras)
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_READ_POOL_SIZE: int = 5  # conexiones por réplica
+    DATABASE_READ_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0  # segundos esperando una conexión libre
+    DATABASE_POOL_PRE_PING: bool = False  # verificar la conexión en cada checkout
+    DATABASE_POOL_RECYCLE: int = 1800  # vida máxima de una conexión (-1 = sin límite)
+    PUMP_READ_YOUR_WRITES: bool = True  # estado de bombas siempre del primario
+    UNIT_OF_WORK_ENABLED: bool = True  # una sesión y una transacción por petición
+
+    # Perfil de producción de SQLite (se ignora con PostgreSQL)
+    SQLITE_TUNING_ENABLED: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456  # bytes (256 MB)
+    SQLITE_CACHE_SIZE_KB: int = 65536  # caché de páginas por conexión (64 MB)
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # espera ante bloqueos antes de fallar
+    SQLITE_MAINTENANCE_INTERVAL_SECONDS: int = 600  # wal_checkpoint y optimize
+
     # Servidor
     HOST: str = "0.0.0.0"
     PORT: int = 8000
@@ -26,10 +48,57 @@ class Settings(BaseSettings):
 
     # Métricas
     PRICE_PER_LITER: float = 2.0  # precio por litro para cálculos de ingresos
+    METRICS_DAILY_CACHE_MAX_ENTRIES: int = 100000  # agregados (dispositivo, día)
+    METRICS_DAILY_CACHE_TTL_SECONDS: int = 300  # para escrituras de otros procesos
+    METRICS_RESULT_CACHE_ENABLED: bool = True  # resultados de consultas de métricas
+    METRICS_RESULT_CACHE_MAX_ENTRIES: int = 10000
+    METRICS_RESULT_CACHE_TTL_SECONDS: int = 30
 
     # ESP32
     ESP32_DEVICE_ID: str = "flowsensor_001"
 
+    # Particionado mensual de flow_readings (por timestamp)
+    FLOW_PARTITIONING_ENABLED: bool = False
+    FLOW_PARTITION_MONTHS_AHEAD: int = 2  # meses futuros creados por adelantado
+
+    # Retención y downsampling (días; 0 = conservar para siempre)
+    RETENTION_ENABLED: bool = False  # ejecutar periódicamente en el servidor
+    RETENTION_RAW_DAYS: int = 14  # lecturas originales
+    RETENTION_MINUTE_DAYS: int = 365  # rollups por minuto
+    RETENTION_HOUR_DAYS: int = 0  # rollups por hora (los diarios no expiran)
+    RETENTION_INTERVAL_SECONDS: int = 3600
+    RETENTION_CHUNK_SIZE: int = 5000  # filas borradas por transacción
+
+    # Archivo columnar: las lecturas vencidas se mueven a disco en lugar de borrarse
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "./archive"
+
+    # Escritura diferida (write-behind) de lecturas
+    FLOW_WRITE_BEHIND_ENABLED: bool = False
+    FLOW_WRITE_BEHIND_MAX_QUEUE: int = 10000  # lecturas en cola como máximo
+    FLOW_WRITE_BEHIND_FLUSH_SIZE: int = 500  # lecturas por INSERT
+    FLOW_WRITE_BEHIND_FLUSH_INTERVAL_MS: int = 50  # espera máxima por grupo
+    FLOW_WRITE_BEHIND_MAX_RETRIES: int = 3  # reintentos antes de descartar un grupo
+    FLOW_WRITE_BEHIND_RETRY_BACKOFF_MS: int = 100  # espera inicial (se duplica)
+
+    # Caché de estado por dispositivo (última lectura) en la ingesta
+    DEVICE_STATE_CACHE_MAX_DEVICES: int = 50000
+    DEVICE_RECENT_KEYS: int = 16  # claves recientes para descartar reintentos
+
+    # Workers de ingesta por shard (0 = procesar en la petición)
+    INGEST_SHARDS: int = 8
+    INGEST_SHARD_QUEUE_SIZE: int = 1000  # trabajos en cola por shard
+
+    # Admisión de la ingesta (0 = sin límite; desactivada por defecto)
+    INGEST_MAX_IN_FLIGHT: int = 0  # peticiones de ingesta simultáneas
+    INGEST_MAX_WAIT_MS: int = 250  # espera por cupo antes de responder 503
+    INGEST_DEVICE_RATE: float = 0.0  # lecturas/s sostenidas por dispositivo
+    INGEST_DEVICE_BURST: int = 0  # ráfaga máxima por dispositivo (429)
+
+    # Canal WebSocket de ingesta (/api/v1/sensor/stream)
+    STREAM_ACK_MAX_FRAMES: int = 50  # frames confirmados por ack como máximo
+    STREAM_ACK_INTERVAL_MS: int = 100  # espera máxima para agrupar frames
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -59,5 +128,19 @@ class Settings(BaseSettings):
             )
             print(f"✅ DATABASE_URL convertida desde postgres:// a asyncpg")
 
+    @property
+    def database_read_urls(self) -> List[str]:
+        """URLs de las réplicas de lectura, convertidas para asyncpg"""
+        urls = []
+        for url in self.DATABASE_READ_URLS.split(","):
+            url = url.strip()
+            if url.startswith("postgresql://"):
+                url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+            elif url.startswith("postgres://"):
+                url = url.replace("postgres://", "postgresql+asyncpg://", 1)
+            if url:
+                urls.append(url)
+        return urls
+
 
 settings = Settings()
@@ -32,3 +32,12 @@ class NotificationException(WaterDispenserException):
     """Excepción relacionada con notificaciones"""
 
     pass
+
+
+class AdmissionRejectedException(WaterDispenserException):
+    """Excepción cuando la ingesta rechaza una petición por sobrecarga"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code  # 429 (límite por dispositivo) o 503
+        self.retry_after = retry_after  # segundos sugeridos antes de reintentar
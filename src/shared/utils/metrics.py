@@ -0,0 +1,111 @@
+import bisect
+import time
+from typing import Dict, Sequence
+
+
+class RunningStats:
+    """Acumulador simple de estadísticas (conteo, promedio, máximo, último)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, value: float):
+        """Registra un nuevo valor"""
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def avg(self) -> float:
+        """Promedio de los valores registrados"""
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": round(self.avg, 3),
+            "max": round(self.max, 3),
+            "last": round(self.last, 3),
+        }
+
+
+class RateMeter:
+    """Medidor de eventos por segundo en ventanas fijas"""
+
+    def __init__(self, window_seconds: float = 10.0):
+        self.window_seconds = window_seconds
+        self.total = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._last_rate = 0.0
+
+    def mark(self, count: int = 1):
+        """Registra `count` eventos"""
+        self._roll()
+        self.total += count
+        self._window_count += count
+
+    @property
+    def rate(self) -> float:
+        """Eventos por segundo de la última ventana completa"""
+        self._roll()
+        return self._last_rate
+
+    def _roll(self):
+        """Cierra la ventana actual si ya transcurrió"""
+        elapsed = time.monotonic() - self._window_start
+        if elapsed < self.window_seconds:
+            return
+        # Si pasó más de una ventana sin eventos, la tasa es cero
+        if elapsed < 2 * self.window_seconds:
+            self._last_rate = self._window_count / elapsed
+        else:
+            self._last_rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+
+class Histogram:
+    """Histograma de buckets fijos con percentiles aproximados"""
+
+    DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.stats = RunningStats()
+
+    def record(self, value: float):
+        """Registra un nuevo valor"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.stats.record(value)
+
+    def percentile(self, fraction: float) -> float:
+        """Límite superior del bucket que contiene el percentil"""
+        if self.stats.count == 0:
+            return 0.0
+        target = fraction * self.stats.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                if index < len(self.buckets):
+                    return float(self.buckets[index])
+                break
+        return self.stats.max
+
+    def to_dict(self) -> Dict:
+        labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+        return {
+            **self.stats.to_dict(),
+            "p50": self.percentile(0.50),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }